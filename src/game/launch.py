@@ -1,52 +1,145 @@
+import argparse
 import os
-from datetime import datetime
+import sys
+import time
 
-import matplotlib.pyplot as plt
-import arcade
-
-from src.reinforcement.agent import Agent, clear_console
+from src.reinforcement.agent import Agent, AGENT_PARAMETERS, MICRO_STEP_MODE, PLACEMENT_MODE
 from src.reinforcement.environment import TetrisEnvironment
+from src.reinforcement.hogwild import train_hogwild
+from src.reinforcement.neural_agent import NeuralAgent
+from src.reinforcement.replay import EpisodeRecorder
 from src.game.tetrominos.tetrominos_factory import TetrominosFactory
-from src.game.window import TetrisWindow, SAVE_FILES, get_filename, WANTS_NEW_SAVE_FILE, SAVE_FOLDER
+from src.game.save_files import get_filename, WANTS_NEW_SAVE_FILE, SAVE_FOLDER
 
 LINE_COUNT = 20
 COLUMN_COUNT = 10
 
 PIECES = TetrominosFactory.create_tetrominos()
 
+# Training stops after this many episodes or seconds, whichever comes first (0 means no limit)
+EPISODES = 0
+BUDGET = 0
+SAVE_INTERVAL = 100
+LOG_INTERVAL = 100
+
+
+def train(agent, filename, episodes=EPISODES, budget=BUDGET, save_interval=SAVE_INTERVAL, log_interval=LOG_INTERVAL,
+          should_display_board=False):
+    """Trains the agent until the episode count or the wall-clock budget (in seconds) is reached
+
+    The checkpoint is saved every save_interval episodes and a line is printed every log_interval episodes,
+    the last checkpoint is written when the training ends.
+    """
+    start = time.monotonic()
+    log_start = start
+    iteration = 0
+    while (episodes <= 0 or iteration < episodes) and (budget <= 0 or time.monotonic() - start < budget):
+        while not agent.is_over:
+            agent.step()
+            agent.print_board_if_needed(should_display_board)
+        iteration += 1
+        score = agent.score
+        agent.reset()
+
+        if save_interval > 0 and iteration % save_interval == 0:
+            agent.save(filename)
+        if log_interval > 0 and iteration % log_interval == 0:
+            now = time.monotonic()
+            scores = agent.history[-log_interval:]
+            print(f"#{iteration:04d} Score : {score:.2f} Mean : {sum(scores) / len(scores):.2f} "
+                  f"T°C : {agent.exploration * 100:.2f} ({log_interval / (now - log_start):.1f} episodes/s)")
+            if isinstance(agent, Agent) and agent.qtables[0].max_states is not None:
+                stats = agent.eviction_stats
+                print(f"      States : {sum(len(qtable) for qtable in agent.qtables)} "
+                      f"Evicted : {stats['evicted_states']} ({stats['evicted_non_zero']} non-zero) "
+                      f"in {stats['evictions']} evictions")
+            log_start = now
+
+    agent.save(filename, wait=True)
+    agent.close_checkpoint()
+    print(f"{iteration} episodes in {time.monotonic() - start:.1f}s, saved in {filename}")
+    return iteration
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Train the Tetris agent")
+    parser.add_argument('--episodes', type=int, default=EPISODES, help="number of episodes, 0 for no limit")
+    parser.add_argument('--budget', type=float, default=BUDGET, help="wall-clock budget in seconds, 0 for no limit")
+    parser.add_argument('--save-interval', type=int, default=SAVE_INTERVAL, help="episodes between two saves")
+    parser.add_argument('--log-interval', type=int, default=LOG_INTERVAL, help="episodes between two log lines")
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--output-dir', default=SAVE_FOLDER, help="folder of the save files")
+    parser.add_argument('--new-save-file', action='store_true', default=WANTS_NEW_SAVE_FILE,
+                        help="start from scratch instead of the most recent save of the folder")
+    parser.add_argument('--mode', choices=(MICRO_STEP_MODE, PLACEMENT_MODE), default=MICRO_STEP_MODE)
+    parser.add_argument('--hard-drop', action='store_true', help="the piece falls to rest after the movements of a "
+                                                                 "step instead of one row")
+    parser.add_argument('--mirror', action='store_true', help="learn the mirrored board in the same states")
+    parser.add_argument('--neural', action='store_true', help="place the pieces with a NumPy value network instead "
+                                                              "of the Q-tables")
+    parser.add_argument('--gui', action='store_true', help="watch the agent play in a window")
+    parser.add_argument('--display-board', action='store_true', help="print the board after every step")
+    parser.add_argument('--plot', action='store_true', help="plot the score history of the loaded save")
+    parser.add_argument('--max-states', type=int, default=None, help="maximum number of states of each Q-table, "
+                                                                     "the least useful states are evicted")
+    parser.add_argument('--max-bytes', type=int, default=None, help="maximum memory of each Q-table, in bytes")
+    parser.add_argument('--workers', type=int, default=1, help="number of processes learning in shared Q-tables")
+    parser.add_argument('--record', default=None, help="file where the seed and the actions of every episode are "
+                                                       "appended, to replay them")
+    arguments = parser.parse_args()
+    # The workers learn in fixed-size shared tables, without evictions, and their episodes are not recorded
+    if arguments.workers > 1 and (arguments.neural or arguments.max_states is not None
+                                  or arguments.max_bytes is not None or arguments.record is not None):
+        parser.error("--workers can not be used with --neural, --max-states, --max-bytes or --record")
+    if arguments.neural and arguments.mirror:
+        parser.error("--mirror can not be used with --neural")
+    return arguments
+
+
 if __name__ == '__main__':
-    iteration_wanted = 1
-    wants_graphic_interface = False
-    wants_to_display_board = False
-    wants_plt_graph = False
+    arguments = parse_arguments()
 
-    env = TetrisEnvironment(LINE_COUNT, COLUMN_COUNT, PIECES)
-    agent = Agent(env, alpha=0.5, gamma=0.9, exploration=0.1, cooling_rate=0.99)
+    env = TetrisEnvironment(LINE_COUNT, COLUMN_COUNT, PIECES, seed=arguments.seed)
+    if arguments.neural:
+        agent = NeuralAgent(env, gamma=AGENT_PARAMETERS['gamma'], exploration=AGENT_PARAMETERS['exploration'],
+                            cooling_rate=AGENT_PARAMETERS['cooling_rate'], seed=arguments.seed)
+    else:
+        agent = Agent(env, mode=arguments.mode, seed=arguments.seed, max_states=arguments.max_states,
+                      max_bytes=arguments.max_bytes, hard_drop=arguments.hard_drop, mirror=arguments.mirror,
+                      **AGENT_PARAMETERS)
 
-    filename = get_filename(SAVE_FILES, WANTS_NEW_SAVE_FILE)
+    os.makedirs(arguments.output_dir, exist_ok=True)
+    filename = get_filename(os.path.join(arguments.output_dir, '*'), arguments.new_save_file, arguments.neural)
 
-    if os.listdir(SAVE_FOLDER) != 0 and os.path.exists(filename):
+    if os.path.exists(filename):
         print('Load file.')
-        agent.load(filename)
-        if wants_plt_graph:
+        if not agent.load(filename):
+            # Training would overwrite the checkpoint
+            sys.exit("/!\\ {0} could not be loaded, it is left untouched".format(filename))
+        if arguments.plot:
+            # The graphics libraries are only loaded when asked for, training runs without them
+            import matplotlib.pyplot as plt
             plt.plot(agent.history)
             plt.show()
 
-    if wants_graphic_interface:
-        window = TetrisWindow(agent, wants_to_display_board, WANTS_NEW_SAVE_FILE)
+    if arguments.gui:
+        import arcade
+        from src.game.window import TetrisWindow
+
+        window = TetrisWindow(agent, arguments.display_board, arguments.new_save_file, filename)
         window.setup()
         arcade.run()
 
+    elif arguments.workers > 1:
+        train_hogwild(agent, filename, arguments.workers, AGENT_PARAMETERS, arguments.episodes, arguments.budget,
+                      arguments.save_interval, arguments.log_interval, arguments.seed)
+
     else:
-        iteration = 0
-
-        # for i in range(iteration_wanted):
-        while datetime.now().strftime("%Y-%m-%d_%H-%M-%S") < "2022-11-15_01-56-50":
-            while not agent.is_over:
-                agent.step()
-                agent.print_board_if_needed(wants_to_display_board)
-            iteration += 1
-            agent.save(filename)
-            clear_console()
-            print(f"#{iteration:04d} Score : {agent.score:.2f} T°C : {agent.exploration * 100:.2f}")
-            agent.reset()
+        recorder = None
+        if arguments.record is not None:
+            recorder = EpisodeRecorder(arguments.record, agent)
+            recorder.attach()
+        train(agent, filename, arguments.episodes, arguments.budget, arguments.save_interval, arguments.log_interval,
+              arguments.display_board)
+        if recorder is not None:
+            recorder.close()
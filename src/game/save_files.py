@@ -0,0 +1,41 @@
+import glob
+import os
+from datetime import datetime
+
+from src.reinforcement.checkpoint import is_checkpoint_part
+
+SAVE_FOLDER = '../save/'
+SAVE_FILES = SAVE_FOLDER + '*'
+
+WANTS_NEW_SAVE_FILE = False
+
+# The checkpoints of the neural agent have their own prefix, so that each agent only picks its own checkpoints
+TRAINING_PREFIX = 'training_'
+NEURAL_PREFIX = 'neural_'
+
+
+def new_save_filename(folder=SAVE_FOLDER, neural=False):
+    prefix = NEURAL_PREFIX if neural else TRAINING_PREFIX
+    return os.path.join(folder, prefix + datetime.now().strftime("%Y-%m-%d_%H-%M-%S"))
+
+
+def is_neural_save(filename):
+    return os.path.basename(filename).startswith(NEURAL_PREFIX)
+
+
+def most_recent_save(files_path, neural=False):
+    files = [file for file in glob.glob(files_path)
+             if not is_checkpoint_part(file) and is_neural_save(file) == neural]
+    if len(files) != 0:
+        latest_save_file = max(files, key=os.path.getctime)
+        return latest_save_file
+    return new_save_filename(os.path.dirname(files_path), neural)
+
+
+def get_filename(files_path, is_new_save_file, neural=False):
+    file = most_recent_save(files_path, neural)
+    if not is_new_save_file:
+        if os.path.exists(file) and os.stat(file).st_size != 0:
+            return file
+
+    return new_save_filename(os.path.dirname(files_path), neural)
@@ -0,0 +1,9 @@
+# Colors of the pieces, by name, so that the game runs without a graphics library.
+# The renderer resolves a name to its RGB value (the arcade.color constant of the same name).
+ELECTRIC_CYAN = 'ELECTRIC_CYAN'
+ELECTRIC_VIOLET = 'ELECTRIC_VIOLET'
+FLAME = 'FLAME'
+INTERNATIONAL_KLEIN_BLUE = 'INTERNATIONAL_KLEIN_BLUE'
+MEDIUM_CANDY_APPLE_RED = 'MEDIUM_CANDY_APPLE_RED'
+MALACHITE = 'MALACHITE'
+MELLOW_YELLOW = 'MELLOW_YELLOW'
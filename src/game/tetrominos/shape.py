@@ -0,0 +1,71 @@
+from typing import NamedTuple
+
+
+class Shape(NamedTuple):
+    """Immutable description of a tetromino in one rotation, relative to the top left corner of its matrix"""
+    index: int
+    rotation: int
+    offsets: tuple  # (row, column) of every block, in the order of the piece definition
+    row_masks: tuple  # (row, mask) of every row of the shape, the mask starts at the column min_dy
+    bottom_profile: tuple  # (column, row) of the lowest block of every column of the shape
+    min_dx: int
+    max_dx: int
+    min_dy: int
+    max_dy: int
+    spawn_position: tuple  # (row, column) of the matrix when the piece appears
+    next_rotation: int
+    color: object
+
+
+class ShapeTable:
+    """Shapes of every piece and rotation, built once by the TetrominosFactory"""
+
+    def __init__(self, shapes):
+        # shapes[piece index][rotation // 90]
+        self.__shapes = shapes
+
+    def __len__(self):
+        return sum(1 for rotations in self.__shapes if rotations is not None)
+
+    @property
+    def indexes(self):
+        return [index for index, rotations in enumerate(self.__shapes) if rotations is not None]
+
+    def get(self, index, rotation) -> Shape:
+        return self.__shapes[index][rotation // 90]
+
+    def get_rotations(self, index):
+        return self.__shapes[index]
+
+    def get_next_rotation(self, shape: Shape) -> Shape:
+        return self.__shapes[shape.index][shape.next_rotation // 90]
+
+
+class ActivePiece:
+    """The falling piece : its index, its rotation and the (row, column) of its matrix in the board"""
+    __slots__ = ('index', 'rotation', 'row', 'col', 'shape')
+
+    def __init__(self, shape: Shape, row=0, col=0):
+        self.index = shape.index
+        self.rotation = shape.rotation
+        self.row = row
+        self.col = col
+        self.shape = shape
+
+    @property
+    def grid_representation(self):
+        return self.index
+
+    @property
+    def cells(self):
+        """Returns the (row, column) cells of the piece in the board"""
+        row = self.row
+        col = self.col
+        return [(row + dx, col + dy) for dx, dy in self.shape.offsets]
+
+    def set_shape(self, shape: Shape):
+        self.shape = shape
+        self.rotation = shape.rotation
+
+    def __repr__(self):
+        return "ActivePiece({0}, {1}, {2}, {3})".format(self.index, self.rotation, self.row, self.col)
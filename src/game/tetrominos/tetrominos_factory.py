@@ -1,7 +1,11 @@
-import arcade
+import math
 
+from src.game.tetrominos import palette
 from src.game.tetrominos.block import Block
 from src.game.tetrominos.piece import Piece
+from src.game.tetrominos.shape import Shape, ShapeTable
+
+MATRIX_WIDTH = 4
 
 
 class TetrominosFactory:
@@ -18,45 +22,81 @@ class TetrominosFactory:
             7: TetrominosFactory.create_O_tetrominos(7),
         }
 
+    @staticmethod
+    def create_shape_table(pieces, board_width) -> ShapeTable:
+        """Compile the pieces into immutable shapes, so that spawning and rotating a piece copies nothing"""
+        spawn_position = (0, math.floor(board_width / 2) - math.floor(MATRIX_WIDTH / 2) + 1)
+        shapes = [None] * (max(pieces) + 1)
+        for index, rotations in pieces.items():
+            shapes[index] = tuple(
+                TetrominosFactory.create_shape(index, rotations[rotation], spawn_position, len(rotations))
+                for rotation in sorted(rotations)
+            )
+        return ShapeTable(tuple(shapes))
+
+    @staticmethod
+    def create_shape(index, piece: Piece, spawn_position, rotation_count) -> Shape:
+        offsets = tuple((block.x, block.y) for block in piece.blocks)
+        min_dy = min(dy for _, dy in offsets)
+        row_masks = {}
+        bottom_profile = {}
+        for dx, dy in offsets:
+            row_masks[dx] = row_masks.get(dx, 0) | 1 << (dy - min_dy)
+            bottom_profile[dy] = max(bottom_profile.get(dy, dx), dx)
+        return Shape(
+            index=index,
+            rotation=piece.rotation,
+            offsets=offsets,
+            row_masks=tuple(sorted(row_masks.items())),
+            bottom_profile=tuple(sorted(bottom_profile.items())),
+            min_dx=min(dx for dx, _ in offsets),
+            max_dx=max(dx for dx, _ in offsets),
+            min_dy=min_dy,
+            max_dy=max(dy for _, dy in offsets),
+            spawn_position=spawn_position,
+            next_rotation=(piece.rotation + 90) % (rotation_count * 90),
+            color=piece.blocks[0].color,
+        )
+
     @staticmethod
     def create_I_tetrominos(grid_representation):
         return {
             0: Piece(
                 [
-                    Block(0, 0, arcade.color.ELECTRIC_CYAN),
-                    Block(1, 0, arcade.color.ELECTRIC_CYAN),
-                    Block(2, 0, arcade.color.ELECTRIC_CYAN),
-                    Block(3, 0, arcade.color.ELECTRIC_CYAN),
+                    Block(0, 0, palette.ELECTRIC_CYAN),
+                    Block(1, 0, palette.ELECTRIC_CYAN),
+                    Block(2, 0, palette.ELECTRIC_CYAN),
+                    Block(3, 0, palette.ELECTRIC_CYAN),
                 ],
                 0,
                 grid_representation
             ),
             90: Piece(
                 [
-                    Block(1, 0, arcade.color.ELECTRIC_CYAN),
-                    Block(1, 1, arcade.color.ELECTRIC_CYAN),
-                    Block(1, 2, arcade.color.ELECTRIC_CYAN),
-                    Block(1, 3, arcade.color.ELECTRIC_CYAN),
+                    Block(1, 0, palette.ELECTRIC_CYAN),
+                    Block(1, 1, palette.ELECTRIC_CYAN),
+                    Block(1, 2, palette.ELECTRIC_CYAN),
+                    Block(1, 3, palette.ELECTRIC_CYAN),
                 ],
                 90,
                 grid_representation
             ),
             180: Piece(
                 [
-                    Block(3, 0, arcade.color.ELECTRIC_CYAN),
-                    Block(2, 0, arcade.color.ELECTRIC_CYAN),
-                    Block(1, 0, arcade.color.ELECTRIC_CYAN),
-                    Block(0, 0, arcade.color.ELECTRIC_CYAN),
+                    Block(3, 0, palette.ELECTRIC_CYAN),
+                    Block(2, 0, palette.ELECTRIC_CYAN),
+                    Block(1, 0, palette.ELECTRIC_CYAN),
+                    Block(0, 0, palette.ELECTRIC_CYAN),
                 ],
                 180,
                 grid_representation
             ),
             270: Piece(
                 [
-                    Block(1, 3, arcade.color.ELECTRIC_CYAN),
-                    Block(1, 2, arcade.color.ELECTRIC_CYAN),
-                    Block(1, 1, arcade.color.ELECTRIC_CYAN),
-                    Block(1, 0, arcade.color.ELECTRIC_CYAN),
+                    Block(1, 3, palette.ELECTRIC_CYAN),
+                    Block(1, 2, palette.ELECTRIC_CYAN),
+                    Block(1, 1, palette.ELECTRIC_CYAN),
+                    Block(1, 0, palette.ELECTRIC_CYAN),
                 ],
                 270,
                 grid_representation
@@ -68,40 +108,40 @@ class TetrominosFactory:
         return {
             0: Piece(
                 [
-                    Block(1, 0, arcade.color.ELECTRIC_VIOLET),
-                    Block(0, 1, arcade.color.ELECTRIC_VIOLET),
-                    Block(1, 1, arcade.color.ELECTRIC_VIOLET),
-                    Block(2, 1, arcade.color.ELECTRIC_VIOLET),
+                    Block(1, 0, palette.ELECTRIC_VIOLET),
+                    Block(0, 1, palette.ELECTRIC_VIOLET),
+                    Block(1, 1, palette.ELECTRIC_VIOLET),
+                    Block(2, 1, palette.ELECTRIC_VIOLET),
                 ],
                 0,
                 grid_representation
             ),
             90: Piece(
                 [
-                    Block(1, 0, arcade.color.ELECTRIC_VIOLET),
-                    Block(1, 1, arcade.color.ELECTRIC_VIOLET),
-                    Block(2, 1, arcade.color.ELECTRIC_VIOLET),
-                    Block(1, 2, arcade.color.ELECTRIC_VIOLET),
+                    Block(1, 0, palette.ELECTRIC_VIOLET),
+                    Block(1, 1, palette.ELECTRIC_VIOLET),
+                    Block(2, 1, palette.ELECTRIC_VIOLET),
+                    Block(1, 2, palette.ELECTRIC_VIOLET),
                 ],
                 90,
                 grid_representation
             ),
             180: Piece(
                 [
-                    Block(0, 1, arcade.color.ELECTRIC_VIOLET),
-                    Block(1, 1, arcade.color.ELECTRIC_VIOLET),
-                    Block(2, 1, arcade.color.ELECTRIC_VIOLET),
-                    Block(1, 2, arcade.color.ELECTRIC_VIOLET),
+                    Block(0, 1, palette.ELECTRIC_VIOLET),
+                    Block(1, 1, palette.ELECTRIC_VIOLET),
+                    Block(2, 1, palette.ELECTRIC_VIOLET),
+                    Block(1, 2, palette.ELECTRIC_VIOLET),
                 ],
                 180,
                 grid_representation
             ),
             270: Piece(
                 [
-                    Block(1, 0, arcade.color.ELECTRIC_VIOLET),
-                    Block(0, 1, arcade.color.ELECTRIC_VIOLET),
-                    Block(1, 1, arcade.color.ELECTRIC_VIOLET),
-                    Block(1, 2, arcade.color.ELECTRIC_VIOLET),
+                    Block(1, 0, palette.ELECTRIC_VIOLET),
+                    Block(0, 1, palette.ELECTRIC_VIOLET),
+                    Block(1, 1, palette.ELECTRIC_VIOLET),
+                    Block(1, 2, palette.ELECTRIC_VIOLET),
                 ],
                 270,
                 grid_representation
@@ -113,40 +153,40 @@ class TetrominosFactory:
         return {
             0: Piece(
                 [
-                    Block(0, 0, arcade.color.FLAME),
-                    Block(0, 1, arcade.color.FLAME),
-                    Block(1, 1, arcade.color.FLAME),
-                    Block(2, 1, arcade.color.FLAME),
+                    Block(0, 0, palette.FLAME),
+                    Block(0, 1, palette.FLAME),
+                    Block(1, 1, palette.FLAME),
+                    Block(2, 1, palette.FLAME),
                 ],
                 0,
                 grid_representation
             ),
             90: Piece(
                 [
-                    Block(1, 0, arcade.color.FLAME),
-                    Block(2, 0, arcade.color.FLAME),
-                    Block(1, 1, arcade.color.FLAME),
-                    Block(1, 2, arcade.color.FLAME),
+                    Block(1, 0, palette.FLAME),
+                    Block(2, 0, palette.FLAME),
+                    Block(1, 1, palette.FLAME),
+                    Block(1, 2, palette.FLAME),
                 ],
                 90,
                 grid_representation
             ),
             180: Piece(
                 [
-                    Block(0, 1, arcade.color.FLAME),
-                    Block(1, 1, arcade.color.FLAME),
-                    Block(2, 1, arcade.color.FLAME),
-                    Block(2, 2, arcade.color.FLAME),
+                    Block(0, 1, palette.FLAME),
+                    Block(1, 1, palette.FLAME),
+                    Block(2, 1, palette.FLAME),
+                    Block(2, 2, palette.FLAME),
                 ],
                 180,
                 grid_representation
             ),
             270: Piece(
                 [
-                    Block(1, 0, arcade.color.FLAME),
-                    Block(1, 1, arcade.color.FLAME),
-                    Block(1, 2, arcade.color.FLAME),
-                    Block(0, 2, arcade.color.FLAME),
+                    Block(1, 0, palette.FLAME),
+                    Block(1, 1, palette.FLAME),
+                    Block(1, 2, palette.FLAME),
+                    Block(0, 2, palette.FLAME),
                 ],
                 270,
                 grid_representation
@@ -158,30 +198,30 @@ class TetrominosFactory:
         return {
             0: Piece(
                 [
-                    Block(2, 0, arcade.color.INTERNATIONAL_KLEIN_BLUE),
-                    Block(0, 1, arcade.color.INTERNATIONAL_KLEIN_BLUE),
-                    Block(1, 1, arcade.color.INTERNATIONAL_KLEIN_BLUE),
-                    Block(2, 1, arcade.color.INTERNATIONAL_KLEIN_BLUE),
+                    Block(2, 0, palette.INTERNATIONAL_KLEIN_BLUE),
+                    Block(0, 1, palette.INTERNATIONAL_KLEIN_BLUE),
+                    Block(1, 1, palette.INTERNATIONAL_KLEIN_BLUE),
+                    Block(2, 1, palette.INTERNATIONAL_KLEIN_BLUE),
                 ],
                 0,
                 grid_representation
             ),
             90: Piece(
                 [
-                    Block(1, 0, arcade.color.INTERNATIONAL_KLEIN_BLUE),
-                    Block(1, 1, arcade.color.INTERNATIONAL_KLEIN_BLUE),
-                    Block(1, 2, arcade.color.INTERNATIONAL_KLEIN_BLUE),
-                    Block(2, 2, arcade.color.INTERNATIONAL_KLEIN_BLUE),
+                    Block(1, 0, palette.INTERNATIONAL_KLEIN_BLUE),
+                    Block(1, 1, palette.INTERNATIONAL_KLEIN_BLUE),
+                    Block(1, 2, palette.INTERNATIONAL_KLEIN_BLUE),
+                    Block(2, 2, palette.INTERNATIONAL_KLEIN_BLUE),
                 ],
                 90,
                 grid_representation
             ),
             180: Piece(
                 [
-                    Block(0, 1, arcade.color.INTERNATIONAL_KLEIN_BLUE),
-                    Block(1, 1, arcade.color.INTERNATIONAL_KLEIN_BLUE),
-                    Block(2, 1, arcade.color.INTERNATIONAL_KLEIN_BLUE),
-                    Block(0, 2, arcade.color.INTERNATIONAL_KLEIN_BLUE),
+                    Block(0, 1, palette.INTERNATIONAL_KLEIN_BLUE),
+                    Block(1, 1, palette.INTERNATIONAL_KLEIN_BLUE),
+                    Block(2, 1, palette.INTERNATIONAL_KLEIN_BLUE),
+                    Block(0, 2, palette.INTERNATIONAL_KLEIN_BLUE),
                 ],
                 180,
                 grid_representation
@@ -189,10 +229,10 @@ class TetrominosFactory:
             270: Piece(
                 [
 
-                    Block(1, 1, arcade.color.INTERNATIONAL_KLEIN_BLUE),
-                    Block(2, 1, arcade.color.INTERNATIONAL_KLEIN_BLUE),
-                    Block(2, 2, arcade.color.INTERNATIONAL_KLEIN_BLUE),
-                    Block(2, 3, arcade.color.INTERNATIONAL_KLEIN_BLUE),
+                    Block(1, 1, palette.INTERNATIONAL_KLEIN_BLUE),
+                    Block(2, 1, palette.INTERNATIONAL_KLEIN_BLUE),
+                    Block(2, 2, palette.INTERNATIONAL_KLEIN_BLUE),
+                    Block(2, 3, palette.INTERNATIONAL_KLEIN_BLUE),
                 ],
                 270,
                 grid_representation
@@ -204,40 +244,40 @@ class TetrominosFactory:
         return {
             0: Piece(
                 [
-                    Block(0, 0, arcade.color.MEDIUM_CANDY_APPLE_RED),
-                    Block(1, 0, arcade.color.MEDIUM_CANDY_APPLE_RED),
-                    Block(1, 1, arcade.color.MEDIUM_CANDY_APPLE_RED),
-                    Block(2, 1, arcade.color.MEDIUM_CANDY_APPLE_RED),
+                    Block(0, 0, palette.MEDIUM_CANDY_APPLE_RED),
+                    Block(1, 0, palette.MEDIUM_CANDY_APPLE_RED),
+                    Block(1, 1, palette.MEDIUM_CANDY_APPLE_RED),
+                    Block(2, 1, palette.MEDIUM_CANDY_APPLE_RED),
                 ],
                 0,
                 grid_representation
             ),
             90: Piece(
                 [
-                    Block(1, 0, arcade.color.MEDIUM_CANDY_APPLE_RED),
-                    Block(1, 1, arcade.color.MEDIUM_CANDY_APPLE_RED),
-                    Block(0, 1, arcade.color.MEDIUM_CANDY_APPLE_RED),
-                    Block(0, 2, arcade.color.MEDIUM_CANDY_APPLE_RED),
+                    Block(1, 0, palette.MEDIUM_CANDY_APPLE_RED),
+                    Block(1, 1, palette.MEDIUM_CANDY_APPLE_RED),
+                    Block(0, 1, palette.MEDIUM_CANDY_APPLE_RED),
+                    Block(0, 2, palette.MEDIUM_CANDY_APPLE_RED),
                 ],
                 90,
                 grid_representation
             ),
             180: Piece(
                 [
-                    Block(0, 0, arcade.color.MEDIUM_CANDY_APPLE_RED),
-                    Block(1, 0, arcade.color.MEDIUM_CANDY_APPLE_RED),
-                    Block(1, 1, arcade.color.MEDIUM_CANDY_APPLE_RED),
-                    Block(2, 1, arcade.color.MEDIUM_CANDY_APPLE_RED),
+                    Block(0, 0, palette.MEDIUM_CANDY_APPLE_RED),
+                    Block(1, 0, palette.MEDIUM_CANDY_APPLE_RED),
+                    Block(1, 1, palette.MEDIUM_CANDY_APPLE_RED),
+                    Block(2, 1, palette.MEDIUM_CANDY_APPLE_RED),
                 ],
                 180,
                 grid_representation
             ),
             270: Piece(
                 [
-                    Block(1, 0, arcade.color.MEDIUM_CANDY_APPLE_RED),
-                    Block(1, 1, arcade.color.MEDIUM_CANDY_APPLE_RED),
-                    Block(0, 1, arcade.color.MEDIUM_CANDY_APPLE_RED),
-                    Block(0, 2, arcade.color.MEDIUM_CANDY_APPLE_RED),
+                    Block(1, 0, palette.MEDIUM_CANDY_APPLE_RED),
+                    Block(1, 1, palette.MEDIUM_CANDY_APPLE_RED),
+                    Block(0, 1, palette.MEDIUM_CANDY_APPLE_RED),
+                    Block(0, 2, palette.MEDIUM_CANDY_APPLE_RED),
                 ],
                 270,
                 grid_representation
@@ -249,40 +289,40 @@ class TetrominosFactory:
         return {
             0: Piece(
                 [
-                    Block(1, 0, arcade.color.MALACHITE),
-                    Block(2, 0, arcade.color.MALACHITE),
-                    Block(0, 1, arcade.color.MALACHITE),
-                    Block(1, 1, arcade.color.MALACHITE),
+                    Block(1, 0, palette.MALACHITE),
+                    Block(2, 0, palette.MALACHITE),
+                    Block(0, 1, palette.MALACHITE),
+                    Block(1, 1, palette.MALACHITE),
                 ],
                 0,
                 grid_representation
             ),
             90: Piece(
                 [
-                    Block(0, 0, arcade.color.MALACHITE),
-                    Block(0, 1, arcade.color.MALACHITE),
-                    Block(1, 1, arcade.color.MALACHITE),
-                    Block(1, 2, arcade.color.MALACHITE),
+                    Block(0, 0, palette.MALACHITE),
+                    Block(0, 1, palette.MALACHITE),
+                    Block(1, 1, palette.MALACHITE),
+                    Block(1, 2, palette.MALACHITE),
                 ],
                 90,
                 grid_representation
             ),
             180: Piece(
                 [
-                    Block(1, 0, arcade.color.MALACHITE),
-                    Block(2, 0, arcade.color.MALACHITE),
-                    Block(0, 1, arcade.color.MALACHITE),
-                    Block(1, 1, arcade.color.MALACHITE),
+                    Block(1, 0, palette.MALACHITE),
+                    Block(2, 0, palette.MALACHITE),
+                    Block(0, 1, palette.MALACHITE),
+                    Block(1, 1, palette.MALACHITE),
                 ],
                 180,
                 grid_representation
             ),
             270: Piece(
                 [
-                    Block(0, 0, arcade.color.MALACHITE),
-                    Block(0, 1, arcade.color.MALACHITE),
-                    Block(1, 1, arcade.color.MALACHITE),
-                    Block(1, 2, arcade.color.MALACHITE),
+                    Block(0, 0, palette.MALACHITE),
+                    Block(0, 1, palette.MALACHITE),
+                    Block(1, 1, palette.MALACHITE),
+                    Block(1, 2, palette.MALACHITE),
                 ],
                 270,
                 grid_representation
@@ -294,40 +334,40 @@ class TetrominosFactory:
         return {
             0: Piece(
                 [
-                    Block(0, 0, arcade.color.MELLOW_YELLOW),
-                    Block(1, 0, arcade.color.MELLOW_YELLOW),
-                    Block(0, 1, arcade.color.MELLOW_YELLOW),
-                    Block(1, 1, arcade.color.MELLOW_YELLOW),
+                    Block(0, 0, palette.MELLOW_YELLOW),
+                    Block(1, 0, palette.MELLOW_YELLOW),
+                    Block(0, 1, palette.MELLOW_YELLOW),
+                    Block(1, 1, palette.MELLOW_YELLOW),
                 ],
                 0,
                 grid_representation
             ),
             90: Piece(
                 [
-                    Block(0, 0, arcade.color.MELLOW_YELLOW),
-                    Block(1, 0, arcade.color.MELLOW_YELLOW),
-                    Block(0, 1, arcade.color.MELLOW_YELLOW),
-                    Block(1, 1, arcade.color.MELLOW_YELLOW),
+                    Block(0, 0, palette.MELLOW_YELLOW),
+                    Block(1, 0, palette.MELLOW_YELLOW),
+                    Block(0, 1, palette.MELLOW_YELLOW),
+                    Block(1, 1, palette.MELLOW_YELLOW),
                 ],
                 90,
                 grid_representation
             ),
             180: Piece(
                 [
-                    Block(0, 0, arcade.color.MELLOW_YELLOW),
-                    Block(1, 0, arcade.color.MELLOW_YELLOW),
-                    Block(0, 1, arcade.color.MELLOW_YELLOW),
-                    Block(1, 1, arcade.color.MELLOW_YELLOW),
+                    Block(0, 0, palette.MELLOW_YELLOW),
+                    Block(1, 0, palette.MELLOW_YELLOW),
+                    Block(0, 1, palette.MELLOW_YELLOW),
+                    Block(1, 1, palette.MELLOW_YELLOW),
                 ],
                 180,
                 grid_representation
             ),
             270: Piece(
                 [
-                    Block(0, 0, arcade.color.MELLOW_YELLOW),
-                    Block(1, 0, arcade.color.MELLOW_YELLOW),
-                    Block(0, 1, arcade.color.MELLOW_YELLOW),
-                    Block(1, 1, arcade.color.MELLOW_YELLOW),
+                    Block(0, 0, palette.MELLOW_YELLOW),
+                    Block(1, 0, palette.MELLOW_YELLOW),
+                    Block(0, 1, palette.MELLOW_YELLOW),
+                    Block(1, 1, palette.MELLOW_YELLOW),
                 ],
                 270,
                 grid_representation
@@ -1,40 +1,20 @@
-import glob
-import os
 import time
-from datetime import datetime
 
 import arcade
 
-from src.reinforcement.environment import EMPTY_BLOCK
-
-# Using datetime
-SAVE_FOLDER = '../save/'
-SAVE_FILES = SAVE_FOLDER + '*'
+from src.game.save_files import SAVE_FILES, get_filename
+from src.reinforcement.bitboard import EMPTY_BLOCK
 
 SPRITE_SIZE = 40
 
-WANTS_NEW_SAVE_FILE = False
-
-
-def most_recent_save(files_path):
-    if len(os.listdir(SAVE_FOLDER)) != 0:
-        files = glob.glob(files_path)
-        latest_save_file = max(files, key=os.path.getctime)
-        return latest_save_file
-    return '../save/training_{}'.format(datetime.now().strftime("%Y-%m-%d_%H-%M-%S"))
-
-
-def get_filename(files_path, is_new_save_file):
-    file = most_recent_save(files_path)
-    if not is_new_save_file:
-        if os.path.exists(file) and os.stat(file).st_size != 0:
-            return file
 
-    return '../save/training_{}'.format(datetime.now().strftime("%Y-%m-%d_%H-%M-%S"))
+def resolve_color(name):
+    """Returns the RGB value of a color of the palette"""
+    return getattr(arcade.color, name)
 
 
 class TetrisWindow(arcade.Window):
-    def __init__(self, agent, should_display_board=False, want_to_save_training_in_new_file=False):
+    def __init__(self, agent, should_display_board=False, want_to_save_training_in_new_file=False, filename=None):
         super().__init__(agent.environment.width * (SPRITE_SIZE * 1.25), agent.environment.height * (SPRITE_SIZE * 1.1),
                          'Tetris')
 
@@ -42,8 +22,11 @@ class TetrisWindow(arcade.Window):
         self.__iteration = 1
 
         self.__board = None
+        self.__cells = []
+        self.__drawn_grid = []
+        self.__colors = {EMPTY_BLOCK: arcade.color.BLUE_GRAY}
         self.__should_display_board = should_display_board
-        self.__filename = get_filename(SAVE_FILES, want_to_save_training_in_new_file)
+        self.__filename = filename or get_filename(SAVE_FILES, want_to_save_training_in_new_file)
 
         self.set_update_rate(1 / 10)
 
@@ -51,18 +34,25 @@ class TetrisWindow(arcade.Window):
         # Set background color
         arcade.set_background_color(arcade.color.BLACK)
 
+        # The sprites are created once, then only the cells that changed are recolored
         self.__board = arcade.SpriteList()
-
-        for rows in range(len(self.__agent.environment.board)):
-            for columns in range(len(self.__agent.environment.board[rows])):
-                # Create block sprite using its color
-                # Create rounded border blocks
-                sprite_border = arcade.SpriteSolidColor(SPRITE_SIZE, SPRITE_SIZE, arcade.color.BLACK)
-                sprite = arcade.SpriteSolidColor(SPRITE_SIZE - 1, SPRITE_SIZE - 1, arcade.color.COBALT)
+        self.__cells = []
+        self.__drawn_grid = []
+
+        for rows in range(self.__agent.environment.height):
+            cells = []
+            for columns in range(self.__agent.environment.width):
+                # Create rounded border blocks, the white block is tinted with the color of the cell
+                sprite_border = arcade.SpriteSolidColor(SPRITE_SIZE, SPRITE_SIZE, color=arcade.color.BLACK)
+                sprite = arcade.SpriteSolidColor(SPRITE_SIZE - 1, SPRITE_SIZE - 1, color=arcade.color.WHITE)
                 sprite_border.center_x, sprite_border.center_y = self.state_to_xy((rows, columns))
                 sprite.center_x, sprite.center_y = self.state_to_xy((rows, columns))
+                sprite.color = self.get_color_from_grid_representation(EMPTY_BLOCK)
                 self.__board.append(sprite_border)
                 self.__board.append(sprite)
+                cells.append(sprite)
+            self.__cells.append(cells)
+            self.__drawn_grid.append([EMPTY_BLOCK] * self.__agent.environment.width)
 
         self.__agent.reset()
 
@@ -77,8 +67,8 @@ class TetrisWindow(arcade.Window):
     def on_draw(self):
         arcade.start_render()
 
-        self.__board.draw()
         self.draw_grid(self.__agent.environment.board)
+        self.__board.draw()
 
         arcade.draw_text(
             f"#{self.__iteration:04d} Score : {self.__agent.score:.2f} T°C : {self.__agent.exploration * 100:.2f}",
@@ -97,23 +87,21 @@ class TetrisWindow(arcade.Window):
 
     def get_color_from_grid_representation(self, grid_representation):
         """ Get the color of a grid representation. """
-        if grid_representation == EMPTY_BLOCK:
-            return arcade.color.BLUE_GRAY
-        return self.__agent.environment.pieces[grid_representation][0].blocks[0].color
+        color = self.__colors.get(grid_representation)
+        if color is None:
+            color = resolve_color(self.__agent.environment.shapes.get(grid_representation, 0).color)
+            self.__colors[grid_representation] = color
+        return color
 
     def draw_grid(self, grid):
-        """ Draw the grid. Used to draw the falling stones. The board is drawn by the sprite list. """
-        for row in range(len(grid)):
-            for column in range(len(grid[0])):
-                # Figure out what color to draw the box
-                color = self.get_color_from_grid_representation(grid[row][column])
-
-                sprite_border = arcade.SpriteSolidColor(SPRITE_SIZE, SPRITE_SIZE, arcade.color.BLACK)
-                sprite = arcade.SpriteSolidColor(SPRITE_SIZE - 1, SPRITE_SIZE - 1, color)
-                sprite_border.center_x, sprite_border.center_y = self.state_to_xy((row, column))
-                sprite.center_x, sprite.center_y = self.state_to_xy((row, column))
-                self.__board.append(sprite_border)
-                self.__board.append(sprite)
+        """ Recolor the cells that changed since the last frame. The board is drawn by the sprite list. """
+        for row, (values, drawn_values) in enumerate(zip(grid, self.__drawn_grid)):
+            if values == drawn_values:
+                continue
+            for column, (value, drawn_value) in enumerate(zip(values, drawn_values)):
+                if value != drawn_value:
+                    self.__cells[row][column].color = self.get_color_from_grid_representation(value)
+            self.__drawn_grid[row] = list(values)
 
     def on_key_press(self, key, modifiers):
         if key == arcade.key.H:
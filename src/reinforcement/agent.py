@@ -1,8 +1,13 @@
 import os
 import pickle
-from random import choice, random
+from random import Random
 
-from src.game.tetrominos.piece import Piece
+from src.game.tetrominos.shape import ActivePiece
+from src.reinforcement.checkpoint import CheckpointWriter
+from src.reinforcement.experience_replay import ExperienceReplay, BATCH_SIZE, UPDATE_INTERVAL
+from src.reinforcement.mirror import MirrorCanonicalizer
+from src.reinforcement.qtable import QTableStore
+from src.reinforcement.state_encoder import StateEncoder
 
 LEFT = 'L'
 RIGHT = 'R'
@@ -14,6 +19,33 @@ ACTIONS = {
     ROTATE: 'U',
     NONE: 'N',
 }
+# Column of every action in the Q-table stores
+ACTION_LIST = list(ACTIONS.values())
+ACTION_INDEXES = {action: index for index, action in enumerate(ACTION_LIST)}
+# Action with the same effect on the left/right mirror of the board
+MIRRORED_ACTIONS = {
+    LEFT: RIGHT,
+    RIGHT: LEFT,
+    ROTATE: ROTATE,
+    NONE: NONE,
+}
+# Action when no table knows the current states (evaluation mode or full shared tables) : the piece falls
+FALLBACK_ACTION = NONE
+# Q-values of a state that a full table could not add
+UNKNOWN_VALUES = [0.0] * len(ACTION_LIST)
+
+# Hyperparameters of the training scripts
+AGENT_PARAMETERS = {'alpha': 0.5, 'gamma': 0.9, 'exploration': 0.1, 'cooling_rate': 0.99}
+
+# The agent either chooses every movement of the piece, or directly where the piece lands
+MICRO_STEP_MODE = 'micro'
+PLACEMENT_MODE = 'placement'
+
+# Afterstates are keyed by the clipped height differences of adjacent columns, the height and the holes
+CONTOUR_LIMIT = 3
+HEIGHT_BUCKET_SIZE = 4
+HEIGHT_BUCKET_LIMIT = 4
+HOLES_LIMIT = 3
 
 
 def clear_console():
@@ -22,70 +54,146 @@ def clear_console():
 
 
 class Agent:
-    def __init__(self, environment, alpha=1, gamma=1, exploration=0, cooling_rate=0.99):
+    def __init__(self, environment, alpha=1, gamma=1, exploration=0, cooling_rate=0.99, mode=MICRO_STEP_MODE,
+                 seed=None, replay_size=0, replay_batch_size=BATCH_SIZE, replay_interval=UPDATE_INTERVAL,
+                 mirror=False, max_states=None, max_bytes=None, evaluation=False, hard_drop=False):
         self.__environment = environment
+        # Exploration has its own generator, so that a seeded training is reproducible
+        self.__random = Random(seed)
+        self.__encoder = StateEncoder(environment.shapes, environment.width, environment.radar_cells_count)
         self.reset(False)
-        self.__qtable_1 = {}
-        self.__qtable_2 = {}
-        self.__qtable_3 = {}
+        # One Q-table per radar of the environment, every table (and the afterstate values) is bounded by the limits
+        self.__max_states = max_states
+        self.__max_bytes = max_bytes
+        self.__is_bounded = max_states is not None or max_bytes is not None
+        self.__qtables = [QTableStore(len(ACTION_LIST), max_states=max_states, max_bytes=max_bytes)
+                          for _ in range(environment.radar.count)]
+        self.__afterstate_values = QTableStore(1, max_states=max_states, max_bytes=max_bytes)
+        self.__mode = mode
         self.__alpha = alpha
         self.__gamma = gamma
         self.__exploration = exploration
         self.__cooling_rate = cooling_rate
+        # An evaluating agent plays greedily and never writes to its tables
+        self.__evaluation = evaluation
+        # With hard drop, the piece falls to rest after the movements of a step instead of falling one row
+        self.__hard_drop = hard_drop
 
         self.__history = []
-        self.__state_1 = None
-        self.__state_2 = None
-        self.__state_3 = None
+        self.__states = [None] * len(self.__qtables)
+        self.__state_ids = [None] * len(self.__qtables)
+        self.__state_values = [None] * len(self.__qtables)
+        self.__transition = None
+        self.__afterstate = None
         self.__score = 0
+        self.__checkpoint_writer = None
 
-        self.is_over = False
+        # With mirror, a situation and its left/right mirror share the same radar states (LEFT and RIGHT swapped)
+        self.__mirror = None
+        self.__is_mirrored = False
+        if mirror:
+            radar = environment.radar
+            self.__mirror = MirrorCanonicalizer(environment.shapes, environment.width, self.__encoder, radar.count,
+                                                radar.width, radar.height)
 
-    @staticmethod
-    def create_qtable_value_by_state_if_needed(found_qvalue, qtable, state):
-        if found_qvalue is None:
-            qtable[state] = {}
-            for action in ACTIONS.values():
-                if qtable[state].get(action, None) is None:
-                    qtable[state][action] = 0.0
-            return qtable[state]
-        return found_qvalue
-
-    def get_qtable_value_by_state(self, qtable, state):
-        qtable_value_by_state = qtable.get(state, None)
-        return self.create_qtable_value_by_state_if_needed(qtable_value_by_state, qtable, state)
+        # With a replay size, the micro-step transitions are stored and replayed in minibatches
+        self.__replay = None
+        if replay_size > 0:
+            self.__replay = ExperienceReplay(len(self.__qtables), replay_size, replay_batch_size, replay_interval, seed)
+
+        self.is_over = False
 
     def best_action(self):
-        qtable_value_by_state_1 = self.get_qtable_value_by_state(self.__qtable_1, self.__state_1)
-        qtable_value_by_state_2 = self.get_qtable_value_by_state(self.__qtable_2, self.__state_2)
-        qtable_value_by_state_3 = self.get_qtable_value_by_state(self.__qtable_3, self.__state_3)
+        # The Q-values of the radar states are read once, they also give the next state value of the previous update
+        # A full shared table gives the id -1 to a new state, which is then only read as zeros and not learned
+        self.__state_ids = [qtable.get_id(state) for qtable, state in zip(self.__qtables, self.__states)]
+        self.__state_values = [UNKNOWN_VALUES if state_id == -1 else qtable.get_row(state_id)
+                               for qtable, state_id in zip(self.__qtables, self.__state_ids)]
 
-        if random() < self.__exploration:
+        if self.__random.random() < self.__exploration:
             self.__exploration *= self.__cooling_rate
-            return choice(list(ACTIONS.values()))
-
-        # Get the key of max q values of the two q tables
-        max_q_value_1 = max(qtable_value_by_state_1, key=qtable_value_by_state_1.get)
-        max_q_value_2 = max(qtable_value_by_state_2, key=qtable_value_by_state_2.get)
-        max_q_value_3 = max(qtable_value_by_state_3, key=qtable_value_by_state_3.get)
-
-        max_q_values = {
-            max_q_value_1: qtable_value_by_state_1[max_q_value_1],
-            max_q_value_2: qtable_value_by_state_2[max_q_value_2],
-            max_q_value_3: qtable_value_by_state_3[max_q_value_3],
-        }
-        return max(max_q_values, key=max_q_values.get)
+            return self.__random.choice(ACTION_LIST)
+
+        # Get the key of max q values of the q tables
+        max_q_values = {}
+        for state_id, values in zip(self.__state_ids, self.__state_values):
+            if state_id != -1:
+                max_q_value = max(values)
+                max_q_values[values.index(max_q_value)] = max_q_value
+        if not max_q_values:
+            return FALLBACK_ACTION
+        action = ACTION_LIST[max(max_q_values, key=max_q_values.get)]
+        return MIRRORED_ACTIONS[action] if self.__is_mirrored else action
+
+    def greedy_action(self):
+        """Same choice as best_action without exploration, the unknown states are not added to the tables"""
+        max_q_values = {}
+        for qtable, state in zip(self.__qtables, self.__states):
+            state_id = qtable.find_id(state)
+            if state_id != -1:
+                values = qtable.get_row(state_id)
+                max_q_value = max(values)
+                max_q_values[values.index(max_q_value)] = max_q_value
+        if not max_q_values:
+            return FALLBACK_ACTION
+        action = ACTION_LIST[max(max_q_values, key=max_q_values.get)]
+        return MIRRORED_ACTIONS[action] if self.__is_mirrored else action
+
+    def get_action_index(self, action):
+        """Returns the column of the action in the tables, for the orientation of the current states"""
+        return ACTION_INDEXES[MIRRORED_ACTIONS[action] if self.__is_mirrored else action]
 
     def reset(self, append_score=True):
         if append_score:
             self.__history.append(self.__score)
-        self.__state_1 = None
-        self.__state_2 = None
-        self.__state_3 = None
+            if not self.__evaluation:
+                self.evict_states()
+        self.__states = [None] * self.__environment.radar.count
+        self.__state_ids = [None] * self.__environment.radar.count
+        self.__state_values = [None] * self.__environment.radar.count
+        self.__transition = None
+        self.__afterstate = None
         self.__score = 0
         self.is_over = False
         self.__environment.reset(self.__environment.height, self.__environment.width)
 
+    def evict_states(self):
+        """Evicts states from the tables over their limit, the state ids in use are renumbered
+
+        It runs before every step and between two episodes. A state of the previous transition that is evicted gets
+        the id -1, and its update is skipped like the one of a state that a full table could not add.
+        """
+        for table_index, qtable in enumerate(self.__qtables):
+            new_ids = qtable.evict()
+            if new_ids is None:
+                continue
+            if self.__replay is not None:
+                self.__replay.remap(table_index, new_ids)
+            self.__state_ids = self.remap_state_ids(self.__state_ids, table_index, new_ids)
+            if self.__transition is not None:
+                state_ids, action_index, rewards = self.__transition
+                self.__transition = (self.remap_state_ids(state_ids, table_index, new_ids), action_index, rewards)
+        self.__afterstate_values.evict()
+
+    @staticmethod
+    def remap_state_ids(state_ids, table_index, new_ids):
+        """Returns a copy of the state ids with the id of the table renumbered by an eviction"""
+        state_id = state_ids[table_index]
+        if state_id is None or state_id == -1:
+            return state_ids
+        state_ids = list(state_ids)
+        state_ids[table_index] = int(new_ids[state_id])
+        return state_ids
+
+    @property
+    def eviction_stats(self):
+        """Eviction counters summed over the Q-tables and the afterstate values"""
+        stats = {}
+        for qtable in self.__qtables + [self.__afterstate_values]:
+            for name, value in qtable.eviction_stats.items():
+                stats[name] = stats.get(name, 0) + value
+        return stats
+
     def heat(self):
         self.__exploration = 1
 
@@ -101,60 +209,170 @@ class Agent:
     def exploration(self):
         return self.__exploration
 
+    @property
+    def qtables(self):
+        return self.__qtables
+
+    @property
+    def afterstate_values(self):
+        return self.__afterstate_values
+
     @property
     def history(self):
         return self.__history
 
-    def load(self, filename):
+    @property
+    def mode(self):
+        return self.__mode
+
+    @property
+    def evaluation(self):
+        return self.__evaluation
+
+    @property
+    def hard_drop(self):
+        return self.__hard_drop
+
+    @property
+    def mirror(self):
+        """Whether the states are canonicalized between the board and its mirror"""
+        return self.__mirror is not None
+
+    @property
+    def is_mirrored(self):
+        """Whether the current states are the ones of the mirrored board"""
+        return self.__is_mirrored
+
+    def use_tables(self, qtables, afterstate_values):
+        """Learns in the given tables (for instance tables shared with other processes) instead of its own"""
+        self.__qtables = list(qtables)
+        self.__afterstate_values = afterstate_values
+        if self.__replay is not None:
+            self.__replay.clear()
+
+    def load(self, filename) -> bool:
+        """Loads the checkpoint, returns False if it could not be loaded"""
+        # Pending checkpoints are written first, and the next save writes a full base of the loaded tables
+        self.close_checkpoint()
         with open(filename, 'rb') as file:
             try:
-                self.__qtable_1, self.__qtable_2, self.__qtable_3, self.__history = pickle.load(file)
+                saved = pickle.load(file)
+                if isinstance(saved, dict) and 'qtables' not in saved:
+                    raise ValueError("{0} is not the checkpoint of a Q-table agent".format(os.path.basename(filename)))
+                if isinstance(saved, dict) and saved.get('mirror', self.mirror) != self.mirror:
+                    raise ValueError("{0} was trained {1} mirrored states".format(
+                        os.path.basename(filename), 'with' if saved['mirror'] else 'without'))
+                if isinstance(saved, tuple):
+                    # Older saves hold the three radar tables, the history and maybe the afterstate values
+                    saved = {'qtables': list(saved[:3]), 'history': saved[3],
+                             'afterstate_values': saved[4] if len(saved) > 4 else self.__afterstate_values}
+                # Even older saves hold dicts of {state: {action: Q-value}}
+                self.__qtables = [
+                    QTableStore.from_dict(qtable, ACTION_LIST) if isinstance(qtable, dict) else qtable
+                    for qtable in saved['qtables']
+                ]
+                self.__afterstate_values = saved['afterstate_values']
+                self.__history = CheckpointWriter.apply_deltas(filename, self.__qtables, self.__afterstate_values,
+                                                               saved['history'], saved.get('generation'))
+                for qtable in self.__qtables + [self.__afterstate_values]:
+                    qtable.forget_changes()
+                    qtable.set_limits(self.__max_states, self.__max_bytes)
+                if self.__replay is not None:
+                    self.__replay.clear()
             except EOFError:
                 print("/!\\ The file is empty")
+                return False
             except Exception as e:
                 print(f"/!\\ Error while loading the file : {e}")
+                return False
 
             file.close()
-
-    def save(self, filename):
-        with open(filename, 'wb') as file:
-            pickle.dump((self.__qtable_1, self.__qtable_2, self.__qtable_3, self.__history), file)
-            file.close()
-
-    def safe_move_down(self, current_piece: Piece) -> bool:
+        return True
+
+    def save(self, filename, wait=False):
+        """Queues a checkpoint of the Q-tables and the history, written by a background thread"""
+        if self.__evaluation:
+            return
+        if self.__checkpoint_writer is None or self.__checkpoint_writer.filename != filename:
+            self.close_checkpoint()
+            self.__checkpoint_writer = CheckpointWriter(filename, mirror=self.mirror)
+        self.__checkpoint_writer.save(self.__qtables, self.__afterstate_values, self.__history)
+        if wait:
+            self.__checkpoint_writer.flush()
+
+    def close_checkpoint(self):
+        """Waits for the queued checkpoints to be written"""
+        if self.__checkpoint_writer is not None:
+            self.__checkpoint_writer.close()
+            self.__checkpoint_writer = None
+
+    def safe_move_down(self, current_piece: ActivePiece) -> bool:
         """Move down if possible"""
         if self.__environment.entering_in_collision(current_piece, True, False, False) is False:
             self.__environment.move_down(current_piece)
             return True
         return False
 
+    def fall(self, current_piece: ActivePiece) -> bool:
+        """Move down one row, or down to rest with hard drop, returns False if the piece can not move down"""
+        if self.__hard_drop:
+            return self.__environment.drop(current_piece) > 0
+        return self.safe_move_down(current_piece)
+
     def print_board_if_needed(self, should_display_board):
         if should_display_board:
             self.__environment.print_board()
 
     def update_current_states(self):
-        # The current state is the hash of :
+        # The current state of each radar packs :
         #   - The current piece (piece and rotation)
-        #   - The radar of the piece (witch are 3 and are 3height x 3width)
-        #   - The y position of the current piece on the board
-        current_piece_blocks = [(block.x - self.__environment.get_current_piece().current_matrix_position_in_board[0],
-                                 block.y - self.__environment.get_current_piece().current_matrix_position_in_board[1])
-                                for block in self.__environment.get_current_piece().blocks]
-        radar_1 = [value for value in self.__environment.states_1.values()]
-        radar_2 = [value for value in self.__environment.states_2.values()]
-        radar_3 = [value for value in self.__environment.states_3.values()]
-
-        ys = [block.y for block in self.__environment.get_current_piece().blocks]
-
-        self.__state_1 = hash((tuple(current_piece_blocks), tuple(radar_1), tuple(ys)))
-        self.__state_2 = hash((tuple(current_piece_blocks), tuple(radar_2), tuple(ys)))
-        self.__state_3 = hash((tuple(current_piece_blocks), tuple(radar_3), tuple(ys)))
-
-    def update_qtable(self, action, rewards, qtable, state):
-        # 𝑄(𝑠t,𝑎t) ⟵ 𝑄(𝑠t,𝑎t) + 𝛼[𝑟+1 + 𝛾𝑄(𝑠t+1, 𝑎t+1) − 𝑄(𝑠t,𝑎t)]
-        maxQ = max(qtable[state].values())
-        delta = self.__alpha * (rewards + self.__gamma * maxQ - qtable[state][action])
-        qtable[state][action] += delta
+        #   - The column of the current piece on the board
+        #   - The cells of the radar (one key per radar of the environment)
+        piece = self.__environment.get_current_piece()
+        piece_bits = self.__encoder.encode_piece(piece)
+        radar_bits = self.__environment.radar_bits
+
+        for radar_index, bits in enumerate(radar_bits):
+            self.__states[radar_index] = self.__encoder.encode(piece_bits, bits)
+
+        if self.__mirror is not None:
+            # The canonical orientation is the one with the smallest states
+            mirrored_states = self.__mirror.get_mirrored_states(self.__environment.bitboard.rows, piece)
+            self.__is_mirrored = mirrored_states < self.__states
+            if self.__is_mirrored:
+                self.__states = mirrored_states
+
+    def update_qtables(self, next_state_values):
+        """Applies the TD update of the previous transition to every table, from the Q-values of the next states"""
+        # 𝑄(𝑠t,𝑎t) ⟵ 𝑄(𝑠t,𝑎t) + 𝛼[𝑟+1 + 𝛾 max 𝑄(𝑠t+1, 𝑎) − 𝑄(𝑠t,𝑎t)], the value after the last action is 0
+        state_ids, action_index, rewards = self.__transition
+        for index, (qtable, state_id) in enumerate(zip(self.__qtables, state_ids)):
+            if state_id == -1:
+                continue
+            max_q = 0.0 if next_state_values is None else max(next_state_values[index])
+            value = qtable.get_value(state_id, action_index)
+            qtable.set_value(state_id, action_index, value + self.__alpha * (rewards + self.__gamma * max_q - value))
+
+    def learn_previous_transition(self):
+        """Learns the previous transition, now that its next state is the current one"""
+        if self.__transition is None:
+            return
+        if self.__replay is None:
+            self.update_qtables(self.__state_values)
+        elif -1 not in self.__transition[0] and -1 not in self.__state_ids:
+            self.__replay.add(*self.__transition, self.__state_ids, False)
+            if self.__replay.is_update_due():
+                self.__replay.update(self.__qtables, self.__alpha, self.__gamma)
+
+    def learn_last_transition(self):
+        """Learns the last transition of the episode, there is no next state"""
+        if self.__transition is None:
+            return
+        if self.__replay is None:
+            self.update_qtables(None)
+        elif -1 not in self.__transition[0]:
+            self.__replay.add(*self.__transition, self.__transition[0], True)
+        self.__transition = None
 
     def set_current_piece(self, current_piece):
         self.__environment.set_current_piece(current_piece)
@@ -162,37 +380,97 @@ class Agent:
     def get_current_piece(self):
         return self.__environment.get_current_piece()
 
+    def get_afterstate(self, placement):
+        """Returns the rewards and the key of the board if the current piece landed at the placement"""
+        rewards, heights, holes_count = self.__environment.preview_placement(placement)
+        afterstate = 0
+        for col in range(len(heights) - 1):
+            difference = max(-CONTOUR_LIMIT, min(CONTOUR_LIMIT, heights[col + 1] - heights[col]))
+            afterstate = afterstate << 3 | (difference + CONTOUR_LIMIT)
+        afterstate = afterstate << 3 | min(max(heights) // HEIGHT_BUCKET_SIZE, HEIGHT_BUCKET_LIMIT)
+        afterstate = afterstate << 2 | min(holes_count, HOLES_LIMIT)
+        return rewards, afterstate
+
+    def get_afterstate_value(self, afterstate):
+        afterstate_id = self.__afterstate_values.find_id(afterstate)
+        return 0.0 if afterstate_id == -1 else self.__afterstate_values.get_value(afterstate_id, 0)
+
+    def update_afterstate_value(self, rewards, afterstate):
+        # V(a t-1) <- V(a t-1) + alpha [r t + gamma V(a t) - V(a t-1)], the value after the last piece is 0
+        if self.__afterstate is not None:
+            next_value = 0.0 if afterstate is None else self.get_afterstate_value(afterstate)
+            afterstate_id = self.__afterstate_values.get_id(self.__afterstate)
+            if afterstate_id != -1:
+                value = self.__afterstate_values.get_value(afterstate_id, 0)
+                self.__afterstate_values.set_value(afterstate_id, 0, value + self.__alpha * (
+                        rewards + self.__gamma * next_value - value))
+        self.__afterstate = afterstate
+
+    def best_placement(self, afterstates):
+        if not self.__evaluation and self.__random.random() < self.__exploration:
+            self.__exploration *= self.__cooling_rate
+            return self.__random.randrange(len(afterstates))
+
+        return max(range(len(afterstates)),
+                   key=lambda index: afterstates[index][0] + self.__gamma * self.get_afterstate_value(
+                       afterstates[index][1]))
+
+    def placement_step(self):
+        """Land the current piece on the best of the placements it can reach"""
+        placements = self.__environment.get_placements()
+        afterstates = [self.get_afterstate(placement) for placement in placements]
+        chosen = self.best_placement(afterstates)
+        rewards, afterstate = afterstates[chosen]
+
+        if not self.__evaluation:
+            self.update_afterstate_value(rewards, afterstate)
+        self.__environment.move_current_piece_to(placements[chosen])
+        self.__score += rewards
+
+        if self.__environment.lock_and_next_piece() is False:
+            if not self.__evaluation:
+                self.update_afterstate_value(0, None)
+            self.is_over = True
+
     def step(self):
         """Do a step"""
-        action = None
-        rewards = 0
+        if self.__is_bounded and not self.__evaluation:
+            # An episode can last long enough for the tables to outgrow their limit
+            self.evict_states()
+        if self.__mode == PLACEMENT_MODE:
+            self.placement_step()
+            return
+        if self.__evaluation:
+            self.greedy_step()
+            return
 
         for movement in range(10):
             self.update_current_states()
             action = self.best_action()
+            self.learn_previous_transition()
             current_piece, rewards = self.__environment.do(action)
-
-            self.update_qtable(action, rewards, self.__qtable_1, self.__state_1)
-            self.update_qtable(action, rewards, self.__qtable_2, self.__state_2)
-            self.update_qtable(action, rewards, self.__qtable_3, self.__state_3)
+            self.__transition = (self.__state_ids, self.get_action_index(action), rewards)
 
             self.__score += rewards
             self.set_current_piece(current_piece)
             if self.__environment.entering_in_collision(current_piece, True, False, False) is True:
                 break
 
-        if self.safe_move_down(self.get_current_piece()) is False:
-            # print("Q-table value : ", self.__qtable[self.__state])
-            self.update_qtable(action, rewards, self.__qtable_1, self.__state_1)
-            self.update_qtable(action, rewards, self.__qtable_2, self.__state_2)
-            self.update_qtable(action, rewards, self.__qtable_3, self.__state_3)
-            self.__environment.clear_lines()
+        if self.fall(self.get_current_piece()) is False:
+            if self.__environment.lock_and_next_piece() is False:
+                self.is_over = True
+                self.learn_last_transition()
 
-            self.__environment.next_piece()
-            self.__environment.place_piece_at_base_position(self.get_current_piece())
+    def greedy_step(self):
+        """Same as step with the greedy actions and without learning"""
+        for movement in range(10):
+            self.update_current_states()
+            current_piece, rewards = self.__environment.do(self.greedy_action())
+            self.__score += rewards
+            self.set_current_piece(current_piece)
+            if self.__environment.entering_in_collision(current_piece, True, False, False) is True:
+                break
 
-            if self.__environment.entering_in_collision(self.get_current_piece(), down=False, left=False, right=False,
-                                                        without_current_piece=False) is True:
+        if self.fall(self.get_current_piece()) is False:
+            if self.__environment.lock_and_next_piece() is False:
                 self.is_over = True
-                return
-            self.__environment.place_piece_in_board(self.get_current_piece())
@@ -0,0 +1,333 @@
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from src.game.tetrominos.tetrominos_factory import TetrominosFactory
+from src.reinforcement.agent import Agent, ACTION_LIST, MICRO_STEP_MODE, PLACEMENT_MODE
+from src.reinforcement.environment import TetrisEnvironment
+from src.reinforcement.qtable import QTableStore
+
+LINE_COUNT = 20
+COLUMN_COUNT = 10
+
+SEED = 1234
+# Number of states of the Q-tables for the size dependent benchmarks, spread over the tables of the agent
+TABLE_SIZES = (10_000, 1_000_000, 10_000_000)
+# Height of the random blocks of the fixed boards, every row keeps at least one hole so that none is full
+FIXED_BOARD_HEIGHT = 8
+# A benchmark fails when its speed is below (1 - tolerance) times the baseline
+TOLERANCE = 0.2
+# Seconds that the fastest run of a benchmark lasts at least, shorter runs are mostly timer and scheduler noise
+MIN_RUN_TIME = 0.2
+
+
+def create_environment():
+    environment = TetrisEnvironment(LINE_COUNT, COLUMN_COUNT, TetrominosFactory.create_tetrominos(), seed=SEED)
+    environment.reset(LINE_COUNT, COLUMN_COUNT)
+    return environment
+
+
+def fill_fixed_board(environment, seed=SEED):
+    """Fills the bottom rows of the board with random blocks, the same ones for a given seed"""
+    generator = random.Random(seed)
+    board = environment.bitboard
+    cells = []
+    for row in range(board.height - FIXED_BOARD_HEIGHT, board.height):
+        holes = set(generator.sample(range(board.width), generator.randint(1, 3)))
+        cells += [(row, col) for col in range(board.width) if col not in holes]
+    board.place(cells, 1)
+
+
+def fill_full_rows(environment, seed=SEED):
+    """Fills the bottom rows with full rows mixed with the rows of fill_fixed_board"""
+    fill_fixed_board(environment, seed)
+    board = environment.bitboard
+    generator = random.Random(seed)
+    full_rows = generator.sample(range(board.height - FIXED_BOARD_HEIGHT, board.height), 4)
+    board.place([(row, col) for row in full_rows for col in range(board.width) if not board.rows[row] >> col & 1], 1)
+
+
+def fill_qtables(agent, size, seed=SEED):
+    """Replaces the Q-tables of the agent by tables holding size random states in total"""
+    generator = np.random.default_rng(seed)
+    qtables = agent.qtables
+    for table_index in range(len(qtables)):
+        count = size // len(qtables)
+        keys = generator.integers(0, 1 << 62, count, dtype=np.int64).tolist()
+        values = generator.standard_normal((count, len(ACTION_LIST))).astype(np.float32)
+        qtables[table_index] = QTableStore.from_arrays(keys, values)
+
+
+def best_run(run, count, repeat=3):
+    """Returns the count and the fastest of repeat results of run(count), which start with the elapsed time
+
+    The count is doubled until the fastest run lasts MIN_RUN_TIME, so that a small scale does not time noise.
+    """
+    while True:
+        best = min((run(count) for _ in range(repeat)), key=lambda result: result[0])
+        if best[0] >= MIN_RUN_TIME:
+            return count, best
+        count *= 2
+
+
+def measure(operation, count, repeat=3):
+    """Returns the best number of calls per second of the operation over repeat runs of count calls"""
+    def run(count):
+        start = time.perf_counter()
+        for _ in range(count):
+            operation()
+        return time.perf_counter() - start,
+
+    count, (elapsed,) = best_run(run, count, repeat)
+    return count / elapsed
+
+
+def measure_each(setup, operation, count, repeat=3):
+    """Same as measure, but only the operation is timed, after a setup that is not timed"""
+    def run(count):
+        elapsed = 0
+        for _ in range(count):
+            argument = setup()
+            start = time.perf_counter()
+            operation(argument)
+            elapsed += time.perf_counter() - start
+        return elapsed,
+
+    count, (elapsed,) = best_run(run, count, repeat)
+    return count / elapsed
+
+
+def benchmark_entering_in_collision(count):
+    environment = create_environment()
+    fill_fixed_board(environment)
+    piece = environment.get_current_piece()
+    moves = [(True, False, False), (False, True, False), (False, False, True), (False, False, False)]
+    index = [0]
+
+    def operation():
+        index[0] = (index[0] + 1) % len(moves)
+        environment.entering_in_collision(piece, *moves[index[0]])
+
+    return {'ops_per_sec': measure(operation, count)}
+
+
+def benchmark_do(count):
+    environment = create_environment()
+    fill_fixed_board(environment)
+    generator = random.Random(SEED)
+    actions = [generator.choice(ACTION_LIST) for _ in range(1024)]
+    index = [0]
+
+    def operation():
+        index[0] = (index[0] + 1) % len(actions)
+        environment.do(actions[index[0]])
+
+    return {'ops_per_sec': measure(operation, count)}
+
+
+def benchmark_compute_rewards(count):
+    environment = create_environment()
+    fill_fixed_board(environment)
+    piece = environment.get_current_piece()
+    while not environment.entering_in_collision(piece, True, False, False):
+        environment.move_down(piece)
+    return {'ops_per_sec': measure(environment.compute_rewards, count)}
+
+
+def benchmark_clear_lines(count):
+    environment = create_environment()
+
+    def setup():
+        environment.reset(LINE_COUNT, COLUMN_COUNT)
+        fill_full_rows(environment)
+
+    return {'ops_per_sec': measure_each(setup, lambda _: environment.clear_lines(), count)}
+
+
+def benchmark_update_current_states(count):
+    """The radar states do not depend on the Q-tables, so the size of the tables does not matter"""
+    agent = Agent(create_environment(), seed=SEED)
+    fill_fixed_board(agent.environment)
+    return {'ops_per_sec': measure(agent.update_current_states, count)}
+
+
+def benchmark_agent_step(count, mode=MICRO_STEP_MODE, size=0, repeat=3):
+    """Trains an agent from a fixed seed, the pieces are counted when the current piece changes
+
+    Every run starts from a new agent with the same tables, the fastest of the repeat runs is kept.
+    """
+    def run(count):
+        agent = Agent(create_environment(), alpha=0.5, gamma=0.9, exploration=0.1, mode=mode, seed=SEED)
+        fill_qtables(agent, size)
+        environment = agent.environment
+        pieces = 0
+        start = time.perf_counter()
+        for _ in range(count):
+            piece = environment.get_current_piece()
+            agent.step()
+            if agent.is_over:
+                agent.reset()
+                pieces += 1
+            elif environment.get_current_piece() is not piece:
+                pieces += 1
+        return time.perf_counter() - start, pieces
+
+    count, (elapsed, pieces) = best_run(run, count, repeat)
+    return {'ops_per_sec': count / elapsed, 'pieces_per_sec': pieces / elapsed}
+
+
+def benchmark_persistence(size, directory, repeat=3):
+    """Times a full save, a delta save of 1% of the states and a load of the base and the delta
+
+    Each of them is timed at least repeat times and until its runs last MIN_RUN_TIME in total, the fastest time is
+    kept. The delta speed is counted in changed states.
+    """
+    agent = Agent(create_environment())
+    fill_qtables(agent, size)
+    filename = os.path.join(directory, 'benchmark_{0}'.format(size))
+    times = {'save_base': [], 'save_delta': [], 'load': []}
+    changed = 0
+
+    while len(times['load']) < repeat or min(sum(phase_times) for phase_times in times.values()) < MIN_RUN_TIME:
+        generator = np.random.default_rng(SEED)
+        # A new checkpoint writer always starts with a full base
+        agent.close_checkpoint()
+        start = time.perf_counter()
+        agent.save(filename, wait=True)
+        times['save_base'].append(time.perf_counter() - start)
+
+        for qtable in agent.qtables:
+            for state_id in generator.integers(0, max(len(qtable), 1), max(len(qtable) // 100, 1)).tolist():
+                qtable.set_value(state_id, 0, 1.0)
+        changed = sum(qtable.changed_count for qtable in agent.qtables)
+        start = time.perf_counter()
+        agent.save(filename, wait=True)
+        times['save_delta'].append(time.perf_counter() - start)
+        agent.close_checkpoint()
+
+        loaded = Agent(create_environment())
+        start = time.perf_counter()
+        loaded.load(filename)
+        times['load'].append(time.perf_counter() - start)
+        del loaded
+
+    save_base, save_delta, load = (min(times[phase]) for phase in ('save_base', 'save_delta', 'load'))
+    return {
+        'save_base': {'ops_per_sec': 1 / save_base, 'states_per_sec': size / save_base},
+        'save_delta': {'ops_per_sec': 1 / save_delta, 'states_per_sec': changed / save_delta},
+        'load': {'ops_per_sec': 1 / load, 'states_per_sec': size / load},
+    }
+
+
+def run_benchmarks(sizes=TABLE_SIZES, scale=1.0):
+    """Runs every benchmark and returns {name: {metric: value}}"""
+    def scaled(count):
+        return max(int(count * scale), 1)
+
+    results = {
+        'entering_in_collision': benchmark_entering_in_collision(scaled(200_000)),
+        'do': benchmark_do(scaled(50_000)),
+        'compute_rewards': benchmark_compute_rewards(scaled(50_000)),
+        'clear_lines': benchmark_clear_lines(scaled(5_000)),
+        'update_current_states': benchmark_update_current_states(scaled(50_000)),
+        'agent_step[placement]': benchmark_agent_step(scaled(1_000), PLACEMENT_MODE),
+    }
+    with tempfile.TemporaryDirectory() as directory:
+        for size in sizes:
+            results['agent_step[{0}]'.format(size)] = benchmark_agent_step(scaled(5_000), MICRO_STEP_MODE, size)
+            for name, result in benchmark_persistence(size, directory).items():
+                results['{0}[{1}]'.format(name, size)] = result
+    return results
+
+
+def compare(results, baseline, tolerance=TOLERANCE):
+    """Returns the (benchmark, metric, baseline, result) below (1 - tolerance) times their baseline
+
+    A benchmark or a metric of the baseline that is missing from the results is returned with a None result.
+    """
+    regressions = []
+    for name, metrics in baseline.items():
+        for metric, expected in metrics.items():
+            value = results.get(name, {}).get(metric)
+            if value is None or value < expected * (1 - tolerance):
+                regressions.append((name, metric, expected, value))
+    return regressions
+
+
+def missing_baselines(results, baseline):
+    """Returns the (benchmark, metric) of the results that the baseline does not have"""
+    return [(name, metric) for name, metrics in results.items() for metric in metrics
+            if metric not in baseline.get(name, {})]
+
+
+def print_results(results, baseline=None):
+    baseline = baseline or {}
+    print(f"{'benchmark':<32}{'metric':<16}{'result':>14}{'baseline':>14}{'ratio':>8}")
+    for name, metrics in results.items():
+        for metric, value in metrics.items():
+            expected = baseline.get(name, {}).get(metric)
+            if expected is None:
+                print(f"{name:<32}{metric:<16}{value:>14.1f}")
+            else:
+                print(f"{name:<32}{metric:<16}{value:>14.1f}{expected:>14.1f}{value / expected:>8.2f}")
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Benchmark the environment, the agent and the checkpoints")
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(TABLE_SIZES),
+                        help="number of Q-table states of the size dependent benchmarks")
+    parser.add_argument('--scale', type=float, default=1.0, help="multiplies the number of calls of each benchmark")
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--baseline', default=None, help="results to compare with, the run fails on regressions")
+    parser.add_argument('--save-baseline', action='store_true', help="write the results to the baseline file")
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE)
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    arguments = parse_arguments()
+    if arguments.baseline is not None and not arguments.save_baseline and not os.path.exists(arguments.baseline):
+        sys.exit("/!\\ The baseline {0} does not exist, --save-baseline writes it".format(arguments.baseline))
+    results = run_benchmarks(arguments.sizes, arguments.scale)
+    report = {
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'seed': SEED,
+        'results': results,
+    }
+    with open(arguments.output, 'w') as file:
+        json.dump(report, file, indent=2)
+
+    baseline = None
+    if arguments.baseline is not None and not arguments.save_baseline:
+        with open(arguments.baseline) as file:
+            baseline = json.load(file)['results']
+    print_results(results, baseline)
+
+    if arguments.save_baseline:
+        with open(arguments.baseline or 'benchmark_baseline.json', 'w') as file:
+            json.dump(report, file, indent=2)
+    elif baseline is not None:
+        for name, metric in missing_baselines(results, baseline):
+            print(f"/!\\ {name} {metric} has no baseline")
+        regressions = compare(results, baseline, arguments.tolerance)
+        if regressions:
+            print("/!\\ PERFORMANCE REGRESSION")
+            for name, metric, expected, value in regressions:
+                if value is None:
+                    print(f"/!\\ {name} {metric} : missing from the results")
+                else:
+                    print(f"/!\\ {name} {metric} : {value:.1f} instead of {expected:.1f} "
+                          f"({value / expected - 1:+.0%})")
+            sys.exit(1)
+        print("No regression")
+    else:
+        print("No baseline, the results are not compared")
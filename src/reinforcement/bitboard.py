@@ -0,0 +1,203 @@
+EMPTY_BLOCK = 0
+
+
+class BitBoard:
+    """Tetris board where each row is an integer bitmask (bit y is set when column y is filled)"""
+
+    def __init__(self, height, width):
+        self.__height = height
+        self.__width = width
+        self.__full_row = (1 << width) - 1
+        self.__rows = [0] * height
+        self.__cells = [[EMPTY_BLOCK] * width for _ in range(height)]
+
+        # Kept up to date when cells are placed and lines are cleared
+        self.__heights = [0] * width
+        self.__filled = [0] * width
+        self.__holes = [0] * width
+        self.__holes_count = 0
+        self.__bumpiness = 0
+
+    @property
+    def height(self):
+        return self.__height
+
+    @property
+    def width(self):
+        return self.__width
+
+    @property
+    def full_row(self):
+        return self.__full_row
+
+    @property
+    def rows(self):
+        return self.__rows
+
+    @property
+    def cells(self):
+        return self.__cells
+
+    @property
+    def heights(self):
+        return self.__heights
+
+    @property
+    def holes(self):
+        return self.__holes
+
+    @property
+    def holes_count(self):
+        return self.__holes_count
+
+    @property
+    def bumpiness(self):
+        return self.__bumpiness
+
+    def collides(self, cells, dx=0, dy=0) -> bool:
+        """Checks if the cells, shifted by (dx, dy), go out of the board or overlap a filled cell"""
+        rows = self.__rows
+        for x, y in cells:
+            x += dx
+            y += dy
+            if x >= self.__height or y >= self.__width or y < 0:
+                return True
+            if rows[x] >> y & 1:
+                return True
+        return False
+
+    def collides_shape(self, shape, row, col) -> bool:
+        """Checks if the shape, with its matrix at (row, col), goes out of the board or overlaps a filled cell"""
+        left = col + shape.min_dy
+        if left < 0 or col + shape.max_dy >= self.__width or row + shape.max_dx >= self.__height:
+            return True
+        rows = self.__rows
+        for dx, mask in shape.row_masks:
+            if rows[row + dx] & mask << left:
+                return True
+        return False
+
+    def get_adjacent_columns(self, columns):
+        """Returns the left columns of the adjacent column pairs that contain one of the columns"""
+        last_pair = self.__width - 2
+        return {pair for col in columns for pair in (col - 1, col) if 0 <= pair <= last_pair}
+
+    def place(self, cells, value):
+        """Fill the empty cells with the given grid representation"""
+        heights = self.__heights
+        columns = {y for _, y in cells}
+        pairs = self.get_adjacent_columns(columns)
+        self.__bumpiness -= sum(abs(heights[pair] - heights[pair + 1]) for pair in pairs)
+
+        for x, y in cells:
+            self.__rows[x] |= 1 << y
+            self.__cells[x][y] = value
+            self.__filled[y] += 1
+            if self.__height - x > heights[y]:
+                heights[y] = self.__height - x
+
+        self.__bumpiness += sum(abs(heights[pair] - heights[pair + 1]) for pair in pairs)
+        for col in columns:
+            holes = heights[col] - self.__filled[col]
+            self.__holes_count += holes - self.__holes[col]
+            self.__holes[col] = holes
+
+    def preview(self, cells):
+        """Returns the (full rows, holes, bumpiness) the board would have with the empty cells filled"""
+        heights = self.__heights
+        new_heights = {}
+        added = {}
+        added_rows = {}
+        for x, y in cells:
+            if self.__height - x > new_heights.get(y, heights[y]):
+                new_heights[y] = self.__height - x
+            added[y] = added.get(y, 0) + 1
+            added_rows[x] = added_rows.get(x, 0) | 1 << y
+
+        full_rows_count = self.__rows.count(self.__full_row)
+        for x, row in added_rows.items():
+            if self.__rows[x] | row == self.__full_row:
+                full_rows_count += 1
+
+        holes_count = self.__holes_count
+        for col, count in added.items():
+            holes_count += new_heights.get(col, heights[col]) - self.__filled[col] - count - self.__holes[col]
+
+        bumpiness = self.__bumpiness
+        for pair in self.get_adjacent_columns(new_heights):
+            bumpiness += abs(new_heights.get(pair, heights[pair]) - new_heights.get(pair + 1, heights[pair + 1])) \
+                         - abs(heights[pair] - heights[pair + 1])
+
+        return full_rows_count, holes_count, bumpiness
+
+    def to_grid(self, cells=(), value=EMPTY_BLOCK):
+        """Returns the board as a list of rows of grid representations, with the given cells drawn on it"""
+        grid = [list(row) for row in self.__cells]
+        for x, y in cells:
+            if 0 <= x < self.__height and 0 <= y < self.__width:
+                grid[x][y] = value
+        return grid
+
+    def clear_lines(self) -> int:
+        """Removes the full rows, shifts the rows above down and returns the number of cleared rows"""
+        full_row = self.__full_row
+        if full_row not in self.__rows:
+            return 0
+
+        kept = [index for index, row in enumerate(self.__rows) if row != full_row]
+        line_clear_count = self.__height - len(kept)
+        self.__rows = [0] * line_clear_count + [self.__rows[index] for index in kept]
+        self.__cells = [[EMPTY_BLOCK] * self.__width for _ in range(line_clear_count)] + \
+                       [self.__cells[index] for index in kept]
+
+        # Every cleared row was full, so each column lost one block per cleared row
+        self.__heights = self.get_column_heights(self.__rows)
+        self.__filled = [filled - line_clear_count for filled in self.__filled]
+        self.__holes = [height - filled for height, filled in zip(self.__heights, self.__filled)]
+        self.__holes_count = sum(self.__holes)
+        self.__bumpiness = sum(abs(self.__heights[col] - self.__heights[col + 1]) for col in range(self.__width - 1))
+        return line_clear_count
+
+    def get_column_heights(self, rows=None):
+        """Returns the height of every column (0 for an empty column)"""
+        if rows is None:
+            return list(self.__heights)
+        heights = [0] * self.__width
+        seen = 0
+        for x, row in enumerate(rows):
+            new = row & ~seen
+            if new:
+                seen |= new
+                while new:
+                    lowest = new & -new
+                    heights[lowest.bit_length() - 1] = self.__height - x
+                    new ^= lowest
+                if seen == self.__full_row:
+                    break
+        return heights
+
+    def get_column_heights_with(self, cells):
+        """Returns the height of every column if the cells were filled"""
+        heights = list(self.__heights)
+        for x, y in cells:
+            if self.__height - x > heights[y]:
+                heights[y] = self.__height - x
+        return heights
+
+    def get_holes_count(self, rows=None) -> int:
+        """Returns the number of empty cells that are underneath at least one filled cell"""
+        if rows is None:
+            return self.__holes_count
+        holes = 0
+        seen = 0
+        for row in rows:
+            holes += (seen & ~row).bit_count()
+            seen |= row
+        return holes
+
+    def get_bumpiness(self, rows=None) -> int:
+        """Sum of the absolute differences between the heights of adjacent columns"""
+        if rows is None:
+            return self.__bumpiness
+        heights = self.get_column_heights(rows)
+        return sum(abs(heights[col] - heights[col + 1]) for col in range(self.__width - 1))
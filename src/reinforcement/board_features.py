@@ -0,0 +1,69 @@
+from typing import NamedTuple
+
+import numpy as np
+
+# Number of values of a feature vector besides the column heights
+FEATURE_COUNT = 7
+
+
+class BoardFeatures(NamedTuple):
+    """Heuristics of one board (ints and a heights array) or of a batch of boards (one array entry per board)"""
+    heights: np.ndarray
+    aggregate_height: np.ndarray
+    holes: np.ndarray
+    bumpiness: np.ndarray
+    wells: np.ndarray
+    row_transitions: np.ndarray
+    column_transitions: np.ndarray
+    full_lines: np.ndarray
+
+
+def rows_to_filled(rows, width):
+    """Returns the boolean (..., height, width) array of the bitmask rows of a board (or of a batch of boards)"""
+    return (np.asarray(rows, dtype=np.int64)[..., np.newaxis] >> np.arange(width)) & 1 == 1
+
+
+def extract_features(filled) -> BoardFeatures:
+    """Computes every feature of a (height, width) board or of a (boards, height, width) batch in one pass
+
+    The board holds True (or any non-zero value) for the filled cells. The holes are the empty cells under a filled
+    cell of their column, a well is a column lower than both its neighbours (the walls are as high as the board),
+    the transitions count the filled/empty changes along the rows (the walls are filled, only the rows up to the
+    highest column count) and along the columns (the floor is filled), and the full lines would be cleared.
+    """
+    filled = np.asarray(filled) != 0
+    is_single = filled.ndim == 2
+    if is_single:
+        filled = filled[np.newaxis]
+    count, height, width = filled.shape
+
+    covered = np.logical_or.accumulate(filled, axis=1)
+    heights = covered.sum(axis=1)
+    holes = np.sum(covered & ~filled, axis=(1, 2))
+    bumpiness = np.abs(np.diff(heights, axis=1)).sum(axis=1)
+
+    walls = np.full((count, 1), height)
+    neighbours = np.minimum(np.concatenate((walls, heights[:, :-1]), axis=1),
+                            np.concatenate((heights[:, 1:], walls), axis=1))
+    wells = np.maximum(neighbours - heights, 0).sum(axis=1)
+
+    side = np.ones((count, height, 1), dtype=bool)
+    row_changes = np.diff(np.concatenate((side, filled, side), axis=2), axis=2).sum(axis=2)
+    rows_used = np.arange(height) >= height - heights.max(axis=1, keepdims=True)
+    row_transitions = np.sum(row_changes * rows_used, axis=1)
+    top = np.zeros((count, 1, width), dtype=bool)
+    floor = np.ones((count, 1, width), dtype=bool)
+    column_transitions = np.diff(np.concatenate((top, filled, floor), axis=1), axis=1).sum(axis=(1, 2))
+
+    features = BoardFeatures(heights, heights.sum(axis=1), holes, bumpiness, wells, row_transitions,
+                             column_transitions, filled.all(axis=2).sum(axis=1))
+    if is_single:
+        return BoardFeatures(*(feature[0] if feature.ndim > 1 else int(feature[0]) for feature in features))
+    return features
+
+
+def to_vectors(features: BoardFeatures, height):
+    """Returns the (boards, width + FEATURE_COUNT) float32 inputs of a learned evaluator, scaled by the height"""
+    heights = np.atleast_2d(features.heights)
+    others = np.stack([np.atleast_1d(feature) for feature in features[1:]], axis=1)
+    return np.concatenate((heights, others), axis=1).astype(np.float32) / height
@@ -0,0 +1,168 @@
+import atexit
+import os
+import pickle
+import queue
+import threading
+import uuid
+
+DELTAS_SUFFIX = '.deltas'
+TEMPORARY_SUFFIX = '.tmp'
+
+# The deltas are merged back into the base file every this many saves
+COMPACTION_INTERVAL = 100
+
+
+def is_checkpoint_part(filename):
+    """Checks if the file is the deltas or the temporary file of a checkpoint rather than a checkpoint"""
+    return filename.endswith((DELTAS_SUFFIX, TEMPORARY_SUFFIX))
+
+
+def write_atomically(filename, data):
+    """Pickles the data to a temporary file then renames it, so the file is either the old one or the new one"""
+    temporary = filename + TEMPORARY_SUFFIX
+    with open(temporary, 'wb') as file:
+        pickle.dump(data, file, protocol=pickle.HIGHEST_PROTOCOL)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temporary, filename)
+
+
+def read_deltas(filename):
+    """Yields the deltas appended after the base file, a half-written last delta is ignored"""
+    if not os.path.exists(filename + DELTAS_SUFFIX):
+        return
+    with open(filename + DELTAS_SUFFIX, 'rb') as file:
+        while True:
+            try:
+                yield pickle.load(file)
+            except (EOFError, pickle.UnpicklingError, ValueError):
+                return
+
+
+class CheckpointWriter:
+    """Writes the checkpoints of an agent from a background thread
+
+    A checkpoint is a base file (a full save) followed by append-only deltas holding the Q-values of the states
+    changed since the previous save and the keys of the states evicted since then. Every base has a new generation
+    id, which its deltas hold too: the base is replaced atomically before the previous deltas are removed, so if the
+    writing stops in between, the deltas of the previous base are skipped rather than applied to the newer one.
+    """
+
+    def __init__(self, filename, compaction_interval=COMPACTION_INTERVAL, mirror=False):
+        self.__filename = filename
+        self.__compaction_interval = compaction_interval
+        # Stored in the base, the states of the tables depend on it
+        self.__mirror = mirror
+        self.__saves_since_compaction = None
+        self.__saved_history_length = 0
+        self.__generation = None
+        self.__error = None
+
+        self.__queue = queue.Queue()
+        self.__thread = threading.Thread(target=self.__write_loop, name='checkpoint-writer', daemon=True)
+        self.__thread.start()
+        atexit.register(self.close)
+
+    @property
+    def filename(self):
+        return self.__filename
+
+    def save(self, qtables, afterstate_values, history):
+        """Snapshots the changes of the tables and queues their writing, the first save writes a full base"""
+        self.raise_error()
+        if self.__saves_since_compaction is None or self.__saves_since_compaction >= self.__compaction_interval:
+            self.compact(qtables, afterstate_values, history)
+            return
+
+        self.__queue.put((self.append_delta, {
+            'generation': self.__generation,
+            'qtables': [qtable.pop_changes() for qtable in qtables],
+            'afterstate_values': afterstate_values.pop_changes(),
+            # Keys of the states evicted from bounded tables, removed before the changes are applied
+            'evicted': [qtable.pop_evictions() for qtable in qtables],
+            'afterstate_evicted': afterstate_values.pop_evictions(),
+            'history_start': self.__saved_history_length,
+            'history': history[self.__saved_history_length:],
+        }))
+        self.__saved_history_length = len(history)
+        self.__saves_since_compaction += 1
+
+    def compact(self, qtables, afterstate_values, history):
+        """Queues the writing of a full base, which replaces the previous base and its deltas"""
+        for qtable in qtables:
+            qtable.forget_changes()
+        afterstate_values.forget_changes()
+        self.__generation = uuid.uuid4().hex
+        self.__queue.put((self.write_base, {
+            'generation': self.__generation,
+            'qtables': [qtable.copy() for qtable in qtables],
+            'history': list(history),
+            'afterstate_values': afterstate_values.copy(),
+            'mirror': self.__mirror,
+        }))
+        self.__saved_history_length = len(history)
+        self.__saves_since_compaction = 0
+
+    def write_base(self, saved):
+        write_atomically(self.__filename, saved)
+        if os.path.exists(self.__filename + DELTAS_SUFFIX):
+            os.remove(self.__filename + DELTAS_SUFFIX)
+
+    def append_delta(self, delta):
+        with open(self.__filename + DELTAS_SUFFIX, 'ab') as file:
+            pickle.dump(delta, file, protocol=pickle.HIGHEST_PROTOCOL)
+            file.flush()
+            os.fsync(file.fileno())
+
+    def __write_loop(self):
+        while True:
+            task = self.__queue.get()
+            try:
+                if task is None:
+                    return
+                write, data = task
+                if self.__error is None:
+                    write(data)
+            except Exception as e:
+                self.__error = e
+            finally:
+                self.__queue.task_done()
+
+    def raise_error(self):
+        if self.__error is not None:
+            # Some changes may be lost, the next save writes a full base again
+            error, self.__error = self.__error, None
+            self.__saves_since_compaction = None
+            raise error
+
+    def flush(self):
+        """Waits until every queued checkpoint is written"""
+        self.__queue.join()
+        self.raise_error()
+
+    def close(self):
+        if self.__thread.is_alive():
+            self.__queue.put(None)
+            self.__thread.join()
+        atexit.unregister(self.close)
+        self.raise_error()
+
+    @staticmethod
+    def apply_deltas(filename, qtables, afterstate_values, history, generation=None):
+        """Applies the deltas of the checkpoint to the tables loaded from its base, returns the full history
+
+        Only the deltas of the generation of the base are applied, the others were left by a previous base.
+        """
+        for delta in read_deltas(filename):
+            if delta.get('generation') != generation:
+                continue
+            for qtable, keys in zip(qtables, delta.get('evicted', ())):
+                qtable.remove(keys)
+            afterstate_values.remove(delta.get('afterstate_evicted', ()))
+            for qtable, (keys, values) in zip(qtables, delta['qtables']):
+                for key, state_values in zip(keys, values):
+                    qtable.set_values(key, state_values)
+            for key, state_values in zip(*delta['afterstate_values']):
+                afterstate_values.set_values(key, state_values)
+            history = history[:delta['history_start']] + delta['history']
+        return history
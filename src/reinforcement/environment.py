@@ -1,97 +1,75 @@
-import copy
 import math
+import random
 
-from src.game.tetrominos.piece import Piece
+import numpy as np
+
+from src.game.tetrominos.shape import ActivePiece, Shape
+from src.game.tetrominos.tetrominos_factory import TetrominosFactory
 from src.reinforcement.agent import clear_console, ACTIONS, LEFT, RIGHT, ROTATE, NONE
+from src.reinforcement.bitboard import BitBoard
+from src.reinforcement.board_features import extract_features, rows_to_filled
+from src.reinforcement.radar import Radar, RADAR_COUNT, RADAR_WIDTH, RADAR_HEIGHT
 
-EMPTY_BLOCK = 0
 CURRENT_PIECE_BLOCK = 1
 WALL = 2
 
+REWARD_PIECE_HEIGHT = 1
+REWARD_CLEAR_LINE = 5000
+REWARD_BUMPINESS = -5
+REWARD_NEW_HOLES = -30
+
 
 class TetrisEnvironment:
-    def __init__(self, height, width, pieces):
+    def __init__(self, height, width, pieces, radar_count=RADAR_COUNT, radar_width=RADAR_WIDTH,
+                 radar_height=RADAR_HEIGHT, reward_piece_height=REWARD_PIECE_HEIGHT,
+                 reward_clear_line=REWARD_CLEAR_LINE, reward_bumpiness=REWARD_BUMPINESS,
+                 reward_new_holes=REWARD_NEW_HOLES, seed=None):
         self.__height = height
         self.__width = width
         self.__pieces = pieces
-        self.__board = [[EMPTY_BLOCK for _ in range(width)] for _ in range(height)]
-        self.__radar_states_1 = {}
-        self.__radar_states_2 = {}
-        self.__radar_states_3 = {}
+        self.__shapes = TetrominosFactory.create_shape_table(pieces, width)
+        self.__board = BitBoard(height, width)
+        self.__radar = Radar(width, radar_count, radar_width, radar_height)
 
         self.__current_bag_piece_index = list()
-        self.__current_piece_index = None
         self.__current_piece = None
-        self.__current_rotation = None
-        self.__reward_piece_height = 1
-        self.__reward_clear_line = 5000
-        self.__reward_bumpiness = -5
-        self.__reward_new_holes = -30
-
-    def get_lowest_x_for_states_by_current_piece(self):
-        x = 0
-        for block in self.get_current_piece().blocks:
-            if x > block.x:
-                x = block.x
-        return x
-
-    def fill_radar_states_with_board(self, radar_states, current_x, radar_y_start, radar_y_end):
-        """Fill the radar states with the current board"""
-        """Update the radar with the current board"""
-        for y in range(radar_y_start, radar_y_end):
-            if y < 0 or y >= len(self.__board[current_x]):
-                radar_states[current_x, y] = WALL
-            else:
-                radar_states[current_x, y] = WALL if self.__board[current_x][y] != EMPTY_BLOCK else EMPTY_BLOCK
+        self.__lines_cleared = 0
+        self.__pieces_placed = 0
+
+        # Every episode draws its own seed, so that an episode is replayed from its seed and its actions only
+        self.__seeds = random.Random(seed)
+        self.__episode_seed = None
+        self.__bag_random = random.Random()
+
+        self.__reward_piece_height = reward_piece_height
+        self.__reward_clear_line = reward_clear_line
+        self.__reward_bumpiness = reward_bumpiness
+        self.__reward_new_holes = reward_new_holes
 
     def update_states_for_current_board(self, current_piece=None):
         """Update the radar for the current board"""
         if current_piece is None:
             return
-
-        radar_width = 3
-        radar_height = 3
-
-        left_overflow = radar_width
-
-        states_first_line_x_coordinate = self.get_lowest_x_for_states_by_current_piece()
-        for x in range(states_first_line_x_coordinate, states_first_line_x_coordinate + radar_height):
-            # 10 * 28 * 2^(3*3) * 3
-            if x > len(self.__board):
-                self.__radar_states_1[x] = [WALL for _ in range(radar_width)]
-                self.__radar_states_2[x] = [WALL for _ in range(radar_width)]
-                self.__radar_states_3[x] = [WALL for _ in range(radar_width)]
-                continue
-
-            radar_1_y_start = current_piece.current_matrix_position_in_board[1] - left_overflow
-            radar_1_y_end = radar_1_y_start + (radar_width - 1)
-            radar_2_y_start = radar_1_y_end + 1
-            radar_2_y_end = radar_2_y_start + (radar_width - 1)
-            radar_3_y_start = radar_2_y_end + 1
-            radar_3_y_end = radar_3_y_start + (radar_width - 1)
-
-            self.fill_radar_states_with_board(self.__radar_states_1, x, radar_1_y_start, radar_1_y_end)
-            self.fill_radar_states_with_board(self.__radar_states_2, x, radar_2_y_start, radar_2_y_end)
-            self.fill_radar_states_with_board(self.__radar_states_3, x, radar_3_y_start, radar_3_y_end)
-
-    def reset(self, height, width):
-        """Resets the game and returns the current state"""
+        self.__radar.update(self.__board.rows, current_piece)
+
+    def reset(self, height, width, episode_seed=None):
+        """Resets the game and returns the current state, the pieces come from the episode seed (drawn if None)"""
+        self.__episode_seed = self.__seeds.getrandbits(63) if episode_seed is None else episode_seed
+        self.__bag_random.seed(self.__episode_seed)
+        self.__lines_cleared = 0
+        self.__pieces_placed = 0
         self.__height = height
+        if width != self.__width:
+            self.__shapes = TetrominosFactory.create_shape_table(self.__pieces, width)
+            self.__radar = Radar(width, self.__radar.count, self.__radar.width, self.__radar.height)
         self.__width = width
-        self.__board = [[EMPTY_BLOCK for _ in range(width)] for _ in range(height)]
+        self.__board = BitBoard(height, width)
 
         self.__current_bag_piece_index = list()
-        self.__current_piece_index = None
         self.__current_piece = None
-        self.__current_rotation = 0
 
         self.new_round()
 
-        self.__radar_states_1 = {}
-        self.__radar_states_2 = {}
-        self.__radar_states_3 = {}
-        self.update_states_for_current_board()
-
     def new_round(self):
         """Starts a new round with a new piece and renew the bag of pieces if needed"""
         self.create_shuffled_bag()
@@ -102,24 +80,48 @@ class TetrisEnvironment:
     def print_board(self):
         clear_console()
         print("Board state is : ")
-        for row in self.__board:
+        for row in self.board:
             print(row)
 
     @property
     def board(self):
+        """The board as rows of grid representations, with the current piece drawn on it"""
+        current_piece = self.get_current_piece()
+        if current_piece is None:
+            return self.__board.to_grid()
+        return self.__board.to_grid(current_piece.cells, current_piece.index)
+
+    @property
+    def bitboard(self):
+        """The locked blocks of the board, without the current piece"""
         return self.__board
 
     @property
-    def states_1(self):
-        return self.__radar_states_1
+    def radar(self):
+        return self.__radar
 
     @property
-    def states_2(self):
-        return self.__radar_states_2
+    def radar_bits(self):
+        """Bits of every radar, a bit is set when its cell is a block or a wall"""
+        return self.__radar.bits
 
     @property
-    def states_3(self):
-        return self.__radar_states_3
+    def radar_cells_count(self):
+        return self.__radar.cells_count
+
+    @property
+    def episode_seed(self):
+        return self.__episode_seed
+
+    @property
+    def lines_cleared(self):
+        """Number of lines cleared since the last reset"""
+        return self.__lines_cleared
+
+    @property
+    def pieces_placed(self):
+        """Number of pieces locked since the last reset"""
+        return self.__pieces_placed
 
     @property
     def height(self):
@@ -133,15 +135,19 @@ class TetrisEnvironment:
     def pieces(self):
         return self.__pieces
 
+    @property
+    def shapes(self):
+        return self.__shapes
+
     @property
     def current_piece_index(self):
-        return self.__current_piece_index
+        return self.__current_piece.index
 
     @property
     def current_rotation(self):
-        return self.__current_rotation
+        return self.__current_piece.rotation
 
-    def get_current_piece(self) -> Piece:
+    def get_current_piece(self) -> ActivePiece:
         return self.__current_piece
 
     def set_current_piece(self, piece):
@@ -151,232 +157,265 @@ class TetrisEnvironment:
         """Get the next piece"""
         if len(self.__current_bag_piece_index) == 0:
             self.create_shuffled_bag()
-        self.__current_piece_index = self.__current_bag_piece_index.pop()
-        current_piece = copy.deepcopy(self.__pieces[self.current_piece_index][0])
-        self.set_current_piece(current_piece)
+        current_piece_index = self.__current_bag_piece_index.pop()
+        self.set_current_piece(ActivePiece(self.__shapes.get(current_piece_index, 0)))
         return self.get_current_piece()
 
     def create_shuffled_bag(self):
         """Create a queue of shuffled pieces"""
         piece_indexes_bag = list(range(1, len(self.__pieces) + 1))
-        # self.__current_bag_piece_index = random.sample(piece_indexes_bag, len(piece_indexes_bag))
-        self.__current_bag_piece_index = piece_indexes_bag
+        self.__current_bag_piece_index = self.__bag_random.sample(piece_indexes_bag, len(piece_indexes_bag))
 
-    def place_piece_in_board(self, piece: Piece):
-        """Place the piece in the board"""
-        for block in piece.blocks:
-            self.__board[block.x][block.y] = piece.grid_representation
+    def place_piece_in_board(self, piece: ActivePiece):
+        """Place the piece in the board (the current piece is drawn over the locked blocks)"""
         self.update_states_for_current_board(piece)
 
-    def place_piece_at_base_position(self, piece: Piece):
+    def lock_piece(self, piece: ActivePiece):
+        """Lock the piece in the board once it can not move down anymore"""
+        self.__board.place(piece.cells, piece.index)
+        self.__pieces_placed += 1
+
+    def lock_and_next_piece(self) -> bool:
+        """Lock the current piece, clear the full lines and bring the next piece, returns False if it does not fit"""
+        self.lock_piece(self.get_current_piece())
+        self.clear_lines()
+        self.next_piece()
+        self.place_piece_at_base_position(self.get_current_piece())
+        if self.entering_in_collision(self.get_current_piece(), down=False, left=False, right=False) is True:
+            return False
+        self.place_piece_in_board(self.get_current_piece())
+        return True
+
+    @staticmethod
+    def place_piece_at_base_position(piece: ActivePiece):
         """Place a piece on the board"""
-        piece.init_matrix_position(self.width)
-        for block in piece.blocks:
-            block.x = block.x
-            block.y = block.y + piece.current_matrix_position_in_board[1]
+        piece.row, piece.col = piece.shape.spawn_position
 
     @staticmethod
     def is_touching_itself(piece, x, y) -> bool:
         """Checks if the piece collides with itself"""
-        next_piece_position = (x, y)
-        piece_block_positions = map(lambda block: (block.x, block.y), piece.blocks)
-        if next_piece_position in piece_block_positions:
-            return True
-
-        return False
+        return (x, y) in piece.cells
 
-    def get_board_without_current_piece(self, current_piece):
-        """Returns a copy of the board without the current piece"""
-        board_without_current_piece = copy.deepcopy(self.__board)
-        for block in current_piece.blocks:
-            if 0 <= block.x < len(board_without_current_piece):
-                if 0 <= block.y < len(board_without_current_piece[block.x]):
-                    board_without_current_piece[block.x][block.y] = EMPTY_BLOCK
-        return board_without_current_piece
-
-    def entering_in_collision(self, next_piece_position, down, left, right,
-                              previous_rotated_piece: Piece = None, without_current_piece: bool = True) -> bool:
+    def entering_in_collision(self, next_piece_position: ActivePiece, down, left, right) -> bool:
         """Checks if the piece collides with pieces in current board"""
-        for block in next_piece_position.blocks:  # y => row, x => column
-            x = block.x + 1 if down else block.x
-            y = block.y + 1 if right else (block.y - 1 if left else block.y)
-
-            if x >= self.__height:
-                # print("Collision detected -> down -> touched the bottom")
-                return True
-
-            if y >= self.__width:
-                # print("Collision detected -> right -> touched the right wall")
-                return True
-
-            if y < 0:
-                # print("Collision detected -> left -> touched the left wall")
-                return True
-
-            if without_current_piece:
-                board = self.get_board_without_current_piece(
-                    previous_rotated_piece if previous_rotated_piece else next_piece_position)
-            else:
-                board = self.__board
-            simulated_next_position_value = board[x][y]
-            if simulated_next_position_value != EMPTY_BLOCK:
-                return True
+        row = next_piece_position.row + 1 if down else next_piece_position.row
+        col = next_piece_position.col + 1 if right else (
+            next_piece_position.col - 1 if left else next_piece_position.col)
+        return self.__board.collides_shape(next_piece_position.shape, row, col)
 
-        return False
-
-    def move_down(self, piece: Piece):
+    def move_down(self, piece: ActivePiece):
         """Move the piece down"""
-        for block in piece.blocks:
-            self.__board[block.x][block.y] = EMPTY_BLOCK
-        piece.move_down()
+        piece.row += 1
         self.set_current_piece(piece)
         self.place_piece_in_board(self.get_current_piece())
 
-    def move_left(self, piece: Piece):
+    def get_landing_row(self, shape: Shape, row, col) -> int:
+        """Returns the row where the shape, with its matrix at (row, col), comes to rest by falling straight down
+
+        Above the highest block of each of its columns, the shape lands where its bottom profile first meets the
+        column heights, without scanning the rows. Under an overhang it falls row by row.
+        """
+        height = self.__height
+        heights = self.__board.heights
+        landing_row = height
+        for dy, dx in shape.bottom_profile:
+            top = height - heights[col + dy]
+            if row + dx >= top:
+                while not self.__board.collides_shape(shape, row + 1, col):
+                    row += 1
+                return row
+            landing_row = min(landing_row, top - 1 - dx)
+        return landing_row
+
+    def drop(self, piece: ActivePiece) -> int:
+        """Moves the piece down until it rests on the board (hard drop), returns the number of rows it fell"""
+        landing_row = self.get_landing_row(piece.shape, piece.row, piece.col)
+        rows = landing_row - piece.row
+        if rows > 0:
+            piece.row = landing_row
+            self.set_current_piece(piece)
+            self.place_piece_in_board(self.get_current_piece())
+        return rows
+
+    def move_left(self, piece: ActivePiece):
         """Move the piece left"""
-        for block in piece.blocks:
-            self.__board[block.x][block.y] = EMPTY_BLOCK
-        piece.move_left()
+        piece.col -= 1
         self.set_current_piece(piece)
         self.place_piece_in_board(self.get_current_piece())
 
-    def move_right(self, piece: Piece):
+    def move_right(self, piece: ActivePiece):
         """Move the piece right"""
-        for block in piece.blocks:
-            self.__board[block.x][block.y] = EMPTY_BLOCK
-        piece.move_right()
+        piece.col += 1
         self.set_current_piece(piece)
         self.place_piece_in_board(self.get_current_piece())
 
-    def rotate(self, previous_piece, next_rotated_piece: Piece) -> Piece:
+    def rotate(self, piece: ActivePiece, next_rotated_shape: Shape) -> ActivePiece:
         """Rotate the piece"""
-        self.__current_rotation = next_rotated_piece.rotation
-        for block in previous_piece.blocks:
-            self.__board[block.x][block.y] = EMPTY_BLOCK
-
-        for block in next_rotated_piece.blocks:
-            self.__board[block.x][block.y] = next_rotated_piece.grid_representation
-
-        self.set_current_piece(next_rotated_piece)
+        piece.set_shape(next_rotated_shape)
+        self.set_current_piece(piece)
+        self.place_piece_in_board(piece)
         return self.get_current_piece()
 
     def clear_lines(self) -> int:
         """Clears the lines"""
-        line_clear_count = 0
-        for row in self.__board:
-            if all(block != EMPTY_BLOCK for block in row):
-                self.__board.remove(row)
-                self.__board.insert(0, [EMPTY_BLOCK] * self.__width)
-                line_clear_count += 1
+        line_clear_count = self.__board.clear_lines()
+        self.__lines_cleared += line_clear_count
         return line_clear_count
 
-    def safe_move_left(self, current_piece: Piece) -> bool:
+    def get_placements(self):
+        """Returns every (rotation, row, column) where the current piece can land by moving and rotating it"""
+        piece = self.get_current_piece()
+        board = self.__board
+        shapes = self.__shapes.get_rotations(piece.index)
+
+        # Depth first search over (rotation // 90, row, column), with the same moves as the actions plus the fall
+        start = (piece.rotation // 90, piece.row, piece.col)
+        seen = {start}
+        stack = [start]
+        landed_cells = set()
+        placements = []
+        while stack:
+            step, row, col = stack.pop()
+            shape = shapes[step]
+            next_step = shape.next_rotation // 90
+            for next_position in ((step, row, col - 1), (step, row, col + 1), (next_step, row, col)):
+                if next_position not in seen and not board.collides_shape(shapes[next_position[0]], row,
+                                                                          next_position[2]):
+                    seen.add(next_position)
+                    stack.append(next_position)
+
+            if board.collides_shape(shape, row + 1, col):
+                # Rotations with the same blocks (like the O piece) land on the same cells
+                cells = frozenset((row + dx, col + dy) for dx, dy in shape.offsets)
+                if cells not in landed_cells:
+                    landed_cells.add(cells)
+                    placements.append((shape.rotation, row, col))
+            elif (step, row + 1, col) not in seen:
+                seen.add((step, row + 1, col))
+                stack.append((step, row + 1, col))
+
+        placements.sort()
+        return placements
+
+    def move_current_piece_to(self, placement):
+        """Move the current piece to the (rotation, row, column) placement"""
+        rotation, row, col = placement
+        piece = self.get_current_piece()
+        piece.set_shape(self.__shapes.get(piece.index, rotation))
+        piece.row = row
+        piece.col = col
+        self.place_piece_in_board(piece)
+
+    def preview_placement(self, placement):
+        """Returns the rewards, the column heights and the holes count if the current piece landed at the placement"""
+        rotation, row, col = placement
+        piece = self.get_current_piece()
+        shape = piece.shape
+        previous_row = piece.row
+        previous_col = piece.col
+
+        piece.set_shape(self.__shapes.get(piece.index, rotation))
+        piece.row = row
+        piece.col = col
+        rewards = self.compute_rewards()
+        heights = self.__board.get_column_heights_with(piece.cells)
+        holes_count = self.get_current_piece_preview()[1]
+
+        piece.set_shape(shape)
+        piece.row = previous_row
+        piece.col = previous_col
+        return rewards, heights, holes_count
+
+    def preview_placements(self, placements):
+        """Returns the rewards and the BoardFeatures of the boards if the current piece landed at each placement
+
+        Same rewards as compute_rewards, for all the placements at once from the features of a batch of boards.
+        """
+        piece = self.get_current_piece()
+        cells = np.array([[(row + dx, col + dy) for dx, dy in self.__shapes.get(piece.index, rotation).offsets]
+                          for rotation, row, col in placements]).reshape(len(placements), -1, 2)
+        boards = np.repeat(rows_to_filled(self.__board.rows, self.__width)[np.newaxis], len(placements), axis=0)
+        boards[np.arange(len(placements))[:, np.newaxis], cells[..., 0], cells[..., 1]] = True
+        piece_heights = np.floor((cells[..., 0] - self.height).sum(axis=1) * self.__reward_piece_height)
+
+        # The holes and the bumpiness of the current board are kept up to date by the BitBoard
+        after = extract_features(boards)
+        rewards = after.full_lines * self.__reward_clear_line + piece_heights \
+            + (after.holes - self.__board.holes_count) * self.__reward_new_holes \
+            + (after.bumpiness - self.__board.bumpiness) * self.__reward_bumpiness
+        return rewards, after
+
+    def safe_move_left(self, current_piece: ActivePiece) -> bool:
         """Move left if possible"""
         if self.entering_in_collision(current_piece, False, True, False) is False:
             self.move_left(current_piece)
             return True
         return False
 
-    def safe_move_right(self, current_piece: Piece) -> bool:
+    def safe_move_right(self, current_piece: ActivePiece) -> bool:
         """Move right if possible"""
         if self.entering_in_collision(current_piece, False, False, True) is False:
             self.move_right(current_piece)
             return True
         return False
 
-    def safe_rotate(self, current_piece: Piece) -> Piece:
+    def safe_rotate(self, current_piece: ActivePiece) -> ActivePiece:
         """Rotate if possible"""
-        next_rotated_piece = current_piece.get_next_rotated_piece(self.current_rotation,
-                                                                  self.pieces,
-                                                                  self.current_piece_index)
-        if self.entering_in_collision(next_rotated_piece, False, False, False, current_piece) is False:
-            return self.rotate(current_piece, next_rotated_piece)
+        next_rotated_shape = self.__shapes.get_next_rotation(current_piece.shape)
+        if self.__board.collides_shape(next_rotated_shape, current_piece.row, current_piece.col) is False:
+            return self.rotate(current_piece, next_rotated_shape)
         return current_piece
 
-    def compute_line_cleared_reward(self):
-        rewards = 0
-        # The more lines cleared, the more reward
-        for row in self.__board:
-            if all(block != EMPTY_BLOCK for block in row):
-                rewards += self.__reward_clear_line
-        # The height of the current piece reward
-        return rewards
+    def get_current_piece_preview(self):
+        """Returns the (full rows, holes, bumpiness) of the board with the current piece locked where it is"""
+        return self.__board.preview(self.get_current_piece().cells)
 
-    def get_column_height(self, col, board):
-        """Returns the height of the given column"""
-        height = 0
-        for row in range(self.__height):
-            if board[row][col] != EMPTY_BLOCK:
-                height = self.__height - row
-                break
-        return height
+    def compute_line_cleared_reward(self, preview=None):
+        preview = self.get_current_piece_preview() if preview is None else preview
+        # The more lines cleared, the more reward
+        return preview[0] * self.__reward_clear_line
 
     def get_previous_bumpiness(self):
         """Sum of the absolute differences between the heights of adjacent columns from board without current piece"""
-        total_bumpiness = 0
-
-        for col in range(self.__width - 1):
-            bumpiness = abs(
-                self.get_column_height(col, self.get_board_without_current_piece(
-                    self.get_current_piece())) - self.get_column_height(col + 1, self.get_board_without_current_piece(
-                    self.get_current_piece()))
-            )
-            total_bumpiness += bumpiness
+        return self.__board.bumpiness
 
-        return total_bumpiness
-
-    def get_current_bumpiness(self):
+    def get_current_bumpiness(self, preview=None):
         """Sum of the absolute differences between the heights of adjacent columns"""
-        total_bumpiness = 0
-
-        for col in range(self.__width - 1):
-            bumpiness = abs(self.get_column_height(col, self.__board) - self.get_column_height(col + 1, self.__board))
-            total_bumpiness += bumpiness
-
-        return total_bumpiness
+        preview = self.get_current_piece_preview() if preview is None else preview
+        return preview[2]
 
-    def compute_bumpiness_reward(self):
+    def compute_bumpiness_reward(self, preview=None):
         previous_bumpiness = self.get_previous_bumpiness()
-        bumpiness = self.get_current_bumpiness()
+        bumpiness = self.get_current_bumpiness(preview)
         return self.__reward_bumpiness * (bumpiness - previous_bumpiness)
 
     def compute_piece_height_reward(self):
         return math.floor(
-            sum([(block.x - self.height) for block in
-                 self.get_current_piece().blocks]) * self.__reward_piece_height)
+            sum([(block_x - self.height) for block_x, _ in
+                 self.get_current_piece().cells]) * self.__reward_piece_height)
 
     def get_old_holes_count(self):
-        old_board = self.get_board_without_current_piece(self.get_current_piece())
-        return self.get_holes_count(old_board)
+        return self.__board.holes_count
 
     def get_holes_count(self, board):
         """Returns the number of holes in the board (meaning empty spaces that are underneath at least one block)"""
-        holes = 0
-
-        # Iterate on each cell of the board by column, from top to bottom and left to right
-        for col in range(self.__width):
-            found_block = False
-            for row in range(self.__height):
-                # If a block is found, then the next empty spaces are holes
-                if board[row][col] != EMPTY_BLOCK:
-                    found_block = True
-                elif found_block and board[row][col] == EMPTY_BLOCK:
-                    holes += 1
-
-        return holes
+        return self.__board.get_holes_count(board)
 
-    def get_new_holes_count(self):
+    def get_new_holes_count(self, preview=None):
+        preview = self.get_current_piece_preview() if preview is None else preview
         old_holes_count = self.get_old_holes_count()
-        current_holes_count = self.get_holes_count(self.__board)
+        current_holes_count = preview[1]
         return current_holes_count - old_holes_count
 
-    def compute_holes_reward(self):
-        return self.__reward_new_holes * self.get_new_holes_count()
+    def compute_holes_reward(self, preview=None):
+        return self.__reward_new_holes * self.get_new_holes_count(preview)
 
     def compute_rewards(self):
         rewards = 0
+        # Lines, holes and bumpiness once the piece is locked, from the heights and holes kept by the board
+        preview = self.get_current_piece_preview()
 
-        line_cleared_reward = self.compute_line_cleared_reward()
+        line_cleared_reward = self.compute_line_cleared_reward(preview)
         # print("line_cleared_reward: ", line_cleared_reward)
         rewards += line_cleared_reward
 
@@ -384,11 +423,11 @@ class TetrisEnvironment:
         # print("piece_height_reward: ", piece_height_reward)
         rewards += piece_height_reward
 
-        holes_reward = self.compute_holes_reward()
+        holes_reward = self.compute_holes_reward(preview)
         # print("holes_reward: ", holes_reward)
         rewards += holes_reward
 
-        bumpiness_reward = self.compute_bumpiness_reward()
+        bumpiness_reward = self.compute_bumpiness_reward(preview)
         # print("bumpiness_reward: ", bumpiness_reward)
         rewards += bumpiness_reward
 
@@ -0,0 +1,60 @@
+import argparse
+import sys
+import time
+
+from src.game.tetrominos.tetrominos_factory import TetrominosFactory
+from src.reinforcement.agent import Agent, MICRO_STEP_MODE, PLACEMENT_MODE
+from src.reinforcement.environment import TetrisEnvironment
+from src.reinforcement.neural_agent import NeuralAgent
+
+LINE_COUNT = 20
+COLUMN_COUNT = 10
+EPISODES = 10
+
+
+def evaluate(agent, episodes=EPISODES):
+    """Plays greedy episodes with an evaluating agent, returns one (score, lines cleared, pieces placed) per episode"""
+    environment = agent.environment
+    results = []
+    for _ in range(episodes):
+        while not agent.is_over:
+            agent.step()
+        results.append((agent.score, environment.lines_cleared, environment.pieces_placed))
+        agent.reset()
+    return results
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Measure a checkpoint with greedy episodes, without learning")
+    parser.add_argument('filename', help="checkpoint to evaluate, it is not modified")
+    parser.add_argument('--episodes', type=int, default=EPISODES)
+    parser.add_argument('--mode', choices=(MICRO_STEP_MODE, PLACEMENT_MODE), default=MICRO_STEP_MODE)
+    parser.add_argument('--seed', type=int, default=0, help="seed of the pieces")
+    parser.add_argument('--mirror', action='store_true', help="the checkpoint was trained with mirrored states")
+    parser.add_argument('--hard-drop', action='store_true', help="the checkpoint was trained with hard drops")
+    parser.add_argument('--neural', action='store_true', help="the checkpoint is the network of a neural agent")
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    arguments = parse_arguments()
+    env = TetrisEnvironment(LINE_COUNT, COLUMN_COUNT, TetrominosFactory.create_tetrominos(), seed=arguments.seed)
+    if arguments.neural:
+        agent = NeuralAgent(env, seed=arguments.seed, evaluation=True)
+    else:
+        agent = Agent(env, mode=arguments.mode, seed=arguments.seed, mirror=arguments.mirror, evaluation=True,
+                      hard_drop=arguments.hard_drop)
+    if not agent.load(arguments.filename):
+        sys.exit("/!\\ {0} could not be loaded, there is nothing to evaluate".format(arguments.filename))
+
+    start = time.perf_counter()
+    results = evaluate(agent, arguments.episodes)
+    elapsed = time.perf_counter() - start
+
+    for episode, (score, lines, pieces) in enumerate(results):
+        print(f"#{episode:04d} Score : {score:.2f} Lines : {lines} Pieces : {pieces}")
+    total_lines = sum(lines for _, lines, _ in results)
+    total_pieces = sum(pieces for _, _, pieces in results)
+    print(f"{len(results)} episodes, mean score {sum(score for score, _, _ in results) / len(results):.2f}, "
+          f"{total_lines / len(results):.2f} lines and {total_pieces / len(results):.1f} pieces per episode, "
+          f"{total_pieces / elapsed if elapsed else 0:.1f} pieces/s")
@@ -0,0 +1,95 @@
+import numpy as np
+
+REPLAY_SIZE = 100_000
+BATCH_SIZE = 64
+# A minibatch is replayed every this many transitions
+UPDATE_INTERVAL = 4
+
+
+class ExperienceReplay:
+    """Ring buffers of the last transitions (state ids, action, reward, next state ids, done) of the agent
+
+    There is one state id per Q-table, so a minibatch updates every table with the same transitions.
+    """
+
+    def __init__(self, table_count, capacity=REPLAY_SIZE, batch_size=BATCH_SIZE, update_interval=UPDATE_INTERVAL,
+                 seed=None):
+        if capacity < 1 or batch_size < 1 or update_interval < 1:
+            raise ValueError("The replay size, batch size and update interval must be positive")
+        self.__capacity = capacity
+        self.__batch_size = batch_size
+        self.__update_interval = update_interval
+        self.__random = np.random.default_rng(seed)
+
+        self.__state_ids = np.zeros((capacity, table_count), dtype=np.int64)
+        self.__actions = np.zeros(capacity, dtype=np.int64)
+        self.__rewards = np.zeros(capacity, dtype=np.float32)
+        self.__next_state_ids = np.zeros((capacity, table_count), dtype=np.int64)
+        self.__dones = np.zeros(capacity, dtype=bool)
+        self.__position = 0
+        self.__size = 0
+        self.__added = 0
+
+    def __len__(self):
+        return self.__size
+
+    @property
+    def capacity(self):
+        return self.__capacity
+
+    @property
+    def batch_size(self):
+        return self.__batch_size
+
+    def clear(self):
+        """Forgets the transitions, their state ids are not valid anymore when the tables are replaced"""
+        self.__position = 0
+        self.__size = 0
+
+    def remap(self, table_index, new_ids):
+        """Renumbers the state ids of a table after an eviction, the transitions of evicted states are dropped"""
+        size = self.__size
+        # Oldest transition first
+        order = (np.arange(size) + self.__position - size) % self.__capacity
+        state_ids = new_ids[self.__state_ids[order, table_index]]
+        next_state_ids = new_ids[self.__next_state_ids[order, table_index]]
+        self.__state_ids[order, table_index] = state_ids
+        self.__next_state_ids[order, table_index] = next_state_ids
+        kept = order[(state_ids >= 0) & (next_state_ids >= 0)]
+        for buffer in (self.__state_ids, self.__actions, self.__rewards, self.__next_state_ids, self.__dones):
+            buffer[:len(kept)] = buffer[kept]
+        self.__size = len(kept)
+        self.__position = len(kept) % self.__capacity
+
+    def add(self, state_ids, action_index, reward, next_state_ids, done):
+        position = self.__position
+        self.__state_ids[position] = state_ids
+        self.__actions[position] = action_index
+        self.__rewards[position] = reward
+        self.__next_state_ids[position] = next_state_ids
+        self.__dones[position] = done
+        self.__position = (position + 1) % self.__capacity
+        self.__size = min(self.__size + 1, self.__capacity)
+        self.__added += 1
+
+    def is_update_due(self) -> bool:
+        return self.__added % self.__update_interval == 0 and self.__size >= self.__batch_size
+
+    def sample(self):
+        """Returns the indexes of a random minibatch of the stored transitions"""
+        return self.__random.integers(0, self.__size, self.__batch_size)
+
+    def update(self, qtables, alpha, gamma):
+        """Applies the TD update of a random minibatch to every table, the last write wins for duplicates"""
+        batch = self.sample()
+        actions = self.__actions[batch]
+        rewards = self.__rewards[batch]
+        # The value after the last action of an episode is 0
+        not_dones = ~self.__dones[batch]
+        for table_index, qtable in enumerate(qtables):
+            values = qtable.values
+            state_ids = self.__state_ids[batch, table_index]
+            next_max_values = values[self.__next_state_ids[batch, table_index]].max(axis=1) * not_dones
+            current_values = values[state_ids, actions]
+            qtable.set_values_at(state_ids, actions,
+                                 current_values + alpha * (rewards + gamma * next_max_values - current_values))
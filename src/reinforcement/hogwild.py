@@ -0,0 +1,157 @@
+import argparse
+import multiprocessing
+import os
+import queue
+import sys
+import time
+
+from src.game.tetrominos.tetrominos_factory import TetrominosFactory
+from src.reinforcement.agent import Agent, AGENT_PARAMETERS, ACTION_LIST, MICRO_STEP_MODE, PLACEMENT_MODE
+from src.reinforcement.checkpoint import CheckpointWriter
+from src.reinforcement.environment import TetrisEnvironment
+from src.reinforcement.shared_qtable import SharedQTableStore, SHARED_CAPACITY
+
+LINE_COUNT = 20
+COLUMN_COUNT = 10
+
+# The checkpoint is written every this many episodes (of all the workers)
+SAVE_INTERVAL = 1000
+LOG_INTERVAL = 100
+# Seconds between two checks that the workers are still running, a killed worker never sends its end
+POLL_INTERVAL = 1
+
+
+def run_worker(qtables, afterstate_values, scores, parameters, episodes, budget, mode, seed, height, width,
+               hard_drop=False, mirror=False):
+    """Trains an agent in the shared tables, and sends the score of every episode (None when done)"""
+    try:
+        env = TetrisEnvironment(height, width, TetrominosFactory.create_tetrominos(), seed=seed)
+        agent = Agent(env, mode=mode, seed=seed, hard_drop=hard_drop, mirror=mirror, **parameters)
+        agent.use_tables(qtables, afterstate_values)
+        start = time.monotonic()
+        iteration = 0
+        while (episodes <= 0 or iteration < episodes) and (budget <= 0 or time.monotonic() - start < budget):
+            while not agent.is_over:
+                agent.step()
+            scores.put(agent.score)
+            agent.reset()
+            iteration += 1
+    finally:
+        # The tables are freed by the process that created them
+        for qtable in qtables + [afterstate_values]:
+            qtable.detach()
+        scores.put(None)
+
+
+def save_snapshot(writer, qtables, afterstate_values, history):
+    """Queues a full checkpoint of a snapshot of the shared tables"""
+    writer.save([qtable.to_store() for qtable in qtables], afterstate_values.to_store(), history)
+
+
+def train_hogwild(agent, filename, workers, parameters=None, episodes=0, budget=0, save_interval=SAVE_INTERVAL,
+                  log_interval=LOG_INTERVAL, seed=None, capacity=SHARED_CAPACITY):
+    """Trains workers processes in Q-tables shared without locks, starting from the tables of the agent
+
+    Every worker has its own environment and an agent with the mode, hard drop and mirror options of the agent, and
+    plays episodes / workers episodes. The scores of all the workers are appended to the history of the agent, and
+    the snapshots of the shared tables are saved to the checkpoint of the agent. The agent gets the final tables.
+    The workers that fail are reported, the others keep training.
+    """
+    parameters = AGENT_PARAMETERS if parameters is None else parameters
+    environment = agent.environment
+    qtables = [SharedQTableStore(len(ACTION_LIST), capacity) for _ in agent.qtables]
+    afterstate_values = SharedQTableStore(1, capacity)
+    # The snapshots are new stores without changes to pop, so every save writes a full base
+    writer = CheckpointWriter(filename, compaction_interval=0, mirror=agent.mirror)
+    history = agent.history
+    start = time.monotonic()
+    try:
+        for qtable, store in zip(qtables, agent.qtables):
+            qtable.load(store)
+        afterstate_values.load(agent.afterstate_values)
+
+        scores = multiprocessing.Queue()
+        processes = [
+            multiprocessing.Process(target=run_worker, name='hogwild-{0}'.format(worker), args=(
+                qtables, afterstate_values, scores, parameters, -(-episodes // workers) if episodes > 0 else 0,
+                budget, agent.mode, None if seed is None else seed + worker, environment.height, environment.width,
+                agent.hard_drop, agent.mirror))
+            for worker in range(workers)
+        ]
+        for process in processes:
+            process.start()
+
+        running = workers
+        iteration = 0
+        log_start = start
+        while running:
+            try:
+                score = scores.get(timeout=POLL_INTERVAL)
+            except queue.Empty:
+                if not any(process.is_alive() for process in processes):
+                    break
+                continue
+            if score is None:
+                running -= 1
+                continue
+            history.append(score)
+            iteration += 1
+            if save_interval > 0 and iteration % save_interval == 0:
+                save_snapshot(writer, qtables, afterstate_values, history)
+            if log_interval > 0 and iteration % log_interval == 0:
+                now = time.monotonic()
+                mean = sum(history[-log_interval:]) / log_interval
+                print(f"#{iteration:04d} Score : {score:.2f} Mean : {mean:.2f} "
+                      f"States : {sum(len(qtable) for qtable in qtables + [afterstate_values])} "
+                      f"({log_interval / (now - log_start):.1f} episodes/s)")
+                log_start = now
+        for process in processes:
+            process.join()
+        failed = [process for process in processes if process.exitcode != 0]
+        for process in failed:
+            print(f"/!\\ The worker {process.name} failed (exit code {process.exitcode})")
+
+        save_snapshot(writer, qtables, afterstate_values, history)
+        writer.flush()
+        agent.use_tables([qtable.to_store() for qtable in qtables], afterstate_values.to_store())
+    finally:
+        writer.close()
+        for qtable in qtables + [afterstate_values]:
+            qtable.close()
+    if failed:
+        print(f"/!\\ {len(failed)} of the {workers} workers failed, only {iteration} episodes in "
+              f"{time.monotonic() - start:.1f}s, saved in {filename}")
+    else:
+        print(f"{iteration} episodes on {workers} workers in {time.monotonic() - start:.1f}s, saved in {filename}")
+    return iteration
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Train one agent on every core, in lock-free shared Q-tables")
+    parser.add_argument('filename', help="checkpoint to start from (if it exists) and to save to")
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--episodes', type=int, default=0, help="number of episodes of all the workers, "
+                                                                "0 for no limit")
+    parser.add_argument('--budget', type=float, default=0, help="wall-clock budget in seconds, 0 for no limit")
+    parser.add_argument('--save-interval', type=int, default=SAVE_INTERVAL, help="episodes between two saves")
+    parser.add_argument('--log-interval', type=int, default=LOG_INTERVAL, help="episodes between two log lines")
+    parser.add_argument('--capacity', type=int, default=SHARED_CAPACITY, help="number of slots of each table")
+    parser.add_argument('--mode', choices=(MICRO_STEP_MODE, PLACEMENT_MODE), default=MICRO_STEP_MODE)
+    parser.add_argument('--hard-drop', action='store_true', help="the piece falls to rest after the movements of a "
+                                                                 "step instead of one row")
+    parser.add_argument('--mirror', action='store_true', help="learn the mirrored board in the same states")
+    parser.add_argument('--seed', type=int, default=None)
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    arguments = parse_arguments()
+    agent = Agent(TetrisEnvironment(LINE_COUNT, COLUMN_COUNT, TetrominosFactory.create_tetrominos()),
+                  mode=arguments.mode, hard_drop=arguments.hard_drop, mirror=arguments.mirror, **AGENT_PARAMETERS)
+    if os.path.exists(arguments.filename):
+        print('Load file.')
+        if not agent.load(arguments.filename):
+            sys.exit("/!\\ {0} could not be loaded, it is left untouched".format(arguments.filename))
+    train_hogwild(agent, arguments.filename, arguments.workers, AGENT_PARAMETERS, arguments.episodes,
+                  arguments.budget, arguments.save_interval, arguments.log_interval, arguments.seed,
+                  arguments.capacity)
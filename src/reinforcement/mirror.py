@@ -0,0 +1,70 @@
+from src.game.tetrominos.shape import ActivePiece
+from src.reinforcement.radar import Radar
+
+# Boards up to this width mirror their rows with a lookup table
+MIRROR_TABLE_WIDTH = 16
+
+
+class MirrorCanonicalizer:
+    """Computes the radar states of the left/right mirror of the board and of the current piece
+
+    The mirror of a piece is the piece with the mirrored blocks (L and J, S and Z, the others are their own mirror).
+    Mirroring twice gives back the same board and piece, so choosing the smallest of the states and of the mirrored
+    states gives the same canonical states to a situation and to its mirror.
+    """
+
+    def __init__(self, shapes, board_width, encoder, radar_count, radar_width, radar_height):
+        self.__board_width = board_width
+        self.__encoder = encoder
+        self.__radar = Radar(board_width, radar_count, radar_width, radar_height)
+        self.__mirrors = self.create_mirror_table(shapes, board_width)
+        if board_width <= MIRROR_TABLE_WIDTH:
+            self.__mirrored_rows = [self.mirror_row(row, board_width) for row in range(1 << board_width)]
+        else:
+            self.__mirrored_rows = None
+
+    @staticmethod
+    def mirror_row(row, board_width) -> int:
+        return int(format(row, '0{0}b'.format(board_width))[::-1], 2)
+
+    @staticmethod
+    def normalize(offsets):
+        min_dx = min(dx for dx, _ in offsets)
+        min_dy = min(dy for _, dy in offsets)
+        return frozenset((dx - min_dx, dy - min_dy) for dx, dy in offsets)
+
+    @staticmethod
+    def create_mirror_table(shapes, board_width):
+        """Returns, for every [piece index][rotation // 90], the (mirror shape, row shift, column sum)
+
+        The mirror of a piece at (row, col) is the mirror shape at (row + row shift, column sum - col).
+        """
+        mirrors = [None] * (max(shapes.indexes) + 1)
+        for index in shapes.indexes:
+            mirrors[index] = []
+            for shape in shapes.get_rotations(index):
+                mirrored_cells = MirrorCanonicalizer.normalize([(dx, -dy) for dx, dy in shape.offsets])
+                mirror = next((other for other_index in shapes.indexes for other in shapes.get_rotations(other_index)
+                               if MirrorCanonicalizer.normalize(other.offsets) == mirrored_cells), None)
+                if mirror is None:
+                    raise ValueError("The piece {0} has no mirror piece".format(index))
+                mirrors[index].append((mirror, shape.min_dx - mirror.min_dx,
+                                       board_width - 1 - shape.max_dy - mirror.min_dy))
+        return mirrors
+
+    def mirror_piece(self, piece) -> ActivePiece:
+        mirror, row_shift, column_sum = self.__mirrors[piece.index][piece.rotation // 90]
+        return ActivePiece(mirror, piece.row + row_shift, column_sum - piece.col)
+
+    def mirror_rows(self, rows):
+        if self.__mirrored_rows is not None:
+            mirrored_rows = self.__mirrored_rows
+            return [mirrored_rows[row] for row in rows]
+        return [self.mirror_row(row, self.__board_width) for row in rows]
+
+    def get_mirrored_states(self, rows, piece):
+        """Returns the radar states of the mirrored board rows (without the piece) and piece"""
+        mirrored_piece = self.mirror_piece(piece)
+        self.__radar.update(self.mirror_rows(rows), mirrored_piece)
+        piece_bits = self.__encoder.encode_piece(mirrored_piece)
+        return [self.__encoder.encode(piece_bits, bits) for bits in self.__radar.bits]
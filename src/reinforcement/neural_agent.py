@@ -0,0 +1,186 @@
+import os
+import pickle
+from random import Random
+
+import numpy as np
+
+from src.reinforcement.agent import PLACEMENT_MODE
+from src.reinforcement.board_features import FEATURE_COUNT, to_vectors
+from src.reinforcement.checkpoint import write_atomically
+from src.reinforcement.value_network import ValueNetwork, HIDDEN_SIZES, LEARNING_RATE
+
+# The rewards are scaled so that the values learned by the network stay close to 1
+REWARD_SCALE = 1e-3
+REPLAY_SIZE = 50_000
+BATCH_SIZE = 64
+
+
+class AfterstateReplay:
+    """Ring buffers of the last (afterstate features, scaled reward, next afterstate features, done) transitions"""
+
+    def __init__(self, feature_count, capacity=REPLAY_SIZE, batch_size=BATCH_SIZE, seed=None):
+        if capacity < 1 or batch_size < 1:
+            raise ValueError("The replay size and batch size must be positive")
+        self.__capacity = capacity
+        self.__batch_size = batch_size
+        self.__random = np.random.default_rng(seed)
+        self.__features = np.zeros((capacity, feature_count), dtype=np.float32)
+        self.__rewards = np.zeros(capacity, dtype=np.float32)
+        self.__next_features = np.zeros((capacity, feature_count), dtype=np.float32)
+        self.__dones = np.zeros(capacity, dtype=bool)
+        self.__position = 0
+        self.__size = 0
+
+    def __len__(self):
+        return self.__size
+
+    def add(self, features, reward, next_features, done):
+        position = self.__position
+        self.__features[position] = features
+        self.__rewards[position] = reward
+        self.__next_features[position] = next_features
+        self.__dones[position] = done
+        self.__position = (position + 1) % self.__capacity
+        self.__size = min(self.__size + 1, self.__capacity)
+
+    def is_update_due(self) -> bool:
+        return self.__size >= self.__batch_size
+
+    def sample(self):
+        """Returns the (features, rewards, next features, dones) of a random minibatch"""
+        batch = self.__random.integers(0, self.__size, self.__batch_size)
+        return self.__features[batch], self.__rewards[batch], self.__next_features[batch], self.__dones[batch]
+
+
+class NeuralAgent:
+    """Places the pieces like Agent in placement mode, but the afterstate values come from a ValueNetwork
+
+    The features of the boards after every placement of a piece are extracted together and scored by one forward
+    pass, and the TD(0) targets of the afterstates r + gamma V(next afterstate) are learned by minibatches replayed
+    from an AfterstateReplay. The memory does not depend on the number of visited states.
+    """
+
+    def __init__(self, environment, learning_rate=LEARNING_RATE, gamma=0.9, exploration=0.1, cooling_rate=0.99,
+                 seed=None, hidden_sizes=HIDDEN_SIZES, replay_size=REPLAY_SIZE, batch_size=BATCH_SIZE,
+                 evaluation=False):
+        self.__environment = environment
+        self.__random = Random(seed)
+        self.__gamma = gamma
+        self.__exploration = exploration
+        self.__cooling_rate = cooling_rate
+        self.__evaluation = evaluation
+
+        feature_count = environment.width + FEATURE_COUNT
+        self.__network = ValueNetwork(feature_count, hidden_sizes, learning_rate, seed)
+        self.__replay = AfterstateReplay(feature_count, replay_size, batch_size, seed)
+
+        self.__history = []
+        self.reset(False)
+
+    @property
+    def environment(self):
+        return self.__environment
+
+    @property
+    def network(self):
+        return self.__network
+
+    @property
+    def score(self):
+        return self.__score
+
+    @property
+    def exploration(self):
+        return self.__exploration
+
+    @property
+    def history(self):
+        return self.__history
+
+    @property
+    def mode(self):
+        return PLACEMENT_MODE
+
+    @property
+    def evaluation(self):
+        return self.__evaluation
+
+    def reset(self, append_score=True):
+        if append_score:
+            self.__history.append(self.__score)
+        self.__afterstate = None
+        self.__score = 0
+        self.is_over = False
+        self.__environment.reset(self.__environment.height, self.__environment.width)
+
+    def heat(self):
+        self.__exploration = 1
+
+    def step(self):
+        """Land the current piece on the placement with the best reward plus discounted afterstate value"""
+        environment = self.__environment
+        placements = environment.get_placements()
+        rewards, board_features = environment.preview_placements(placements)
+        features = to_vectors(board_features, environment.height)
+
+        if not self.__evaluation and self.__random.random() < self.__exploration:
+            self.__exploration *= self.__cooling_rate
+            chosen = self.__random.randrange(len(placements))
+        else:
+            values = rewards * REWARD_SCALE + self.__gamma * self.__network.predict(features)
+            chosen = int(values.argmax())
+
+        if not self.__evaluation:
+            self.learn(rewards[chosen], features[chosen])
+        environment.move_current_piece_to(placements[chosen])
+        self.__score += rewards[chosen]
+
+        if environment.lock_and_next_piece() is False:
+            if not self.__evaluation:
+                self.learn(0, None)
+            self.is_over = True
+
+    def learn(self, rewards, afterstate):
+        """Stores the transition from the previous afterstate and trains the network on a replayed minibatch"""
+        # V(a t-1) <- r t + gamma V(a t), the value after the last piece is 0
+        if self.__afterstate is not None:
+            done = afterstate is None
+            self.__replay.add(self.__afterstate, rewards * REWARD_SCALE,
+                              self.__afterstate if done else afterstate, done)
+            if self.__replay.is_update_due():
+                features, batch_rewards, next_features, dones = self.__replay.sample()
+                targets = batch_rewards + self.__gamma * self.__network.predict(next_features) * ~dones
+                self.__network.train(features, targets)
+        self.__afterstate = afterstate
+
+    def print_board_if_needed(self, should_display_board):
+        if should_display_board:
+            self.__environment.print_board()
+
+    def save(self, filename, wait=False):
+        """Writes the network and the history, the file is small so it is written right away"""
+        if self.__evaluation:
+            return
+        write_atomically(filename, {'network': self.__network, 'history': self.__history})
+
+    def close_checkpoint(self):
+        pass
+
+    def load(self, filename) -> bool:
+        """Loads the checkpoint, returns False if it could not be loaded"""
+        with open(filename, 'rb') as file:
+            try:
+                saved = pickle.load(file)
+                if not isinstance(saved, dict) or 'network' not in saved:
+                    raise ValueError("{0} is not the checkpoint of a neural agent".format(os.path.basename(filename)))
+                if saved['network'].input_size != self.__network.input_size:
+                    raise ValueError("The network of the checkpoint is for another board width")
+                self.__network = saved['network']
+                self.__history = saved['history']
+            except EOFError:
+                print("/!\\ The file is empty")
+                return False
+            except Exception as e:
+                print(f"/!\\ Error while loading the file : {e}")
+                return False
+        return True
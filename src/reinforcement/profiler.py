@@ -0,0 +1,213 @@
+import argparse
+import json
+from time import perf_counter
+
+from src.game.tetrominos.tetrominos_factory import TetrominosFactory
+from src.reinforcement.agent import Agent, MICRO_STEP_MODE, PLACEMENT_MODE
+from src.reinforcement.environment import TetrisEnvironment
+
+LINE_COUNT = 20
+COLUMN_COUNT = 10
+
+# (method, phase) of the agent and of the environment that are timed
+AGENT_PHASES = (
+    ('step', 'step'),
+    ('update_current_states', 'state_encoding'),
+    ('get_afterstate', 'state_encoding'),
+    ('best_action', 'action_selection'),
+    ('best_placement', 'action_selection'),
+    ('learn_previous_transition', 'q_update'),
+    ('learn_last_transition', 'q_update'),
+    ('update_afterstate_value', 'q_update'),
+    ('greedy_step', 'step'),
+    ('greedy_action', 'action_selection'),
+)
+ENVIRONMENT_PHASES = (
+    ('do', 'environment_move'),
+    ('move_current_piece_to', 'environment_move'),
+    ('get_placements', 'placement_search'),
+    ('update_states_for_current_board', 'radar'),
+    ('entering_in_collision', 'collision'),
+    ('compute_rewards', 'rewards'),
+    ('lock_piece', 'lock'),
+    ('clear_lines', 'line_clear'),
+    ('next_piece', 'spawn'),
+)
+# Methods of the board of the environment, which is replaced when the environment is reset
+BOARD_PHASES = (
+    ('collides', 'collision'),
+    ('collides_shape', 'collision'),
+)
+
+
+class PhaseProfiler:
+    """Times the phases of Agent.step and TetrisEnvironment.do, and aggregates them per episode
+
+    The methods are replaced by timed wrappers on the instances only while attached, so a detached (or never
+    attached) agent runs its plain methods. The self time of a phase excludes the time of the phases it calls, and a
+    call made inside a call of the same phase (a board collision test of entering_in_collision) only adds its self
+    time.
+    """
+
+    def __init__(self):
+        self.__agent = None
+        self.__wrapped = []
+        self.__board_wrapped = []
+        self.__stack = []
+        self.__phases = {}
+        self.__counters = {}
+        self.__records = []
+        self.__episode_start = perf_counter()
+
+    @property
+    def records(self):
+        """One record per finished episode"""
+        return self.__records
+
+    def attach(self, agent):
+        self.detach()
+        self.__agent = agent
+        for name, phase in AGENT_PHASES:
+            self.wrap(agent, name, phase)
+        for name, phase in ENVIRONMENT_PHASES:
+            self.wrap(agent.environment, name, phase)
+        self.wrap_board(agent.environment)
+        self.wrap_reset(agent)
+        self.reset_episode()
+
+    def detach(self):
+        for owner, name in self.__wrapped + self.__board_wrapped:
+            delattr(owner, name)
+        self.__wrapped = []
+        self.__board_wrapped = []
+        self.__agent = None
+
+    def wrap(self, owner, name, phase, wrapped=None):
+        method = getattr(owner, name)
+        stack = self.__stack
+        entry = self.__phases.setdefault(phase, [0, 0.0, 0.0])
+        counters = self.__counters
+
+        def timed(*args, **kwargs):
+            # [phase, time of the phases called]
+            stack.append([phase, 0.0])
+            start = perf_counter()
+            try:
+                result = method(*args, **kwargs)
+            finally:
+                elapsed = perf_counter() - start
+                children = stack.pop()[1]
+                if stack:
+                    stack[-1][1] += elapsed
+                if not stack or stack[-1][0] != phase:
+                    entry[0] += 1
+                    entry[1] += elapsed
+                entry[2] += elapsed - children
+            if phase == 'line_clear':
+                counters['lines'] += result
+            elif phase == 'lock':
+                counters['pieces'] += 1
+            return result
+
+        setattr(owner, name, timed)
+        (self.__wrapped if wrapped is None else wrapped).append((owner, name))
+
+    def wrap_board(self, environment):
+        """Moves the wrappers of the board methods to the current board of the environment"""
+        for owner, name in self.__board_wrapped:
+            delattr(owner, name)
+        self.__board_wrapped = []
+        for name, phase in BOARD_PHASES:
+            self.wrap(environment.bitboard, name, phase, self.__board_wrapped)
+
+    def wrap_reset(self, agent):
+        reset = agent.reset
+
+        def reset_and_record(append_score=True):
+            if append_score:
+                self.finish_episode()
+            reset(append_score)
+            self.wrap_board(agent.environment)
+
+        agent.reset = reset_and_record
+        self.__wrapped.append((agent, 'reset'))
+
+    def reset_episode(self):
+        for entry in self.__phases.values():
+            entry[:] = [0, 0.0, 0.0]
+        self.__counters['lines'] = 0
+        self.__counters['pieces'] = 0
+        self.__episode_start = perf_counter()
+
+    def finish_episode(self):
+        """Records the phases of the current episode and starts a new one"""
+        self.__records.append({
+            'episode': len(self.__records),
+            'score': float(self.__agent.score),
+            'duration': perf_counter() - self.__episode_start,
+            'steps': self.__phases['step'][0],
+            'pieces': self.__counters['pieces'],
+            'lines': self.__counters['lines'],
+            'phases': {phase: {'calls': calls, 'total': total, 'self': self_time}
+                       for phase, (calls, total, self_time) in self.__phases.items() if calls},
+        })
+        self.reset_episode()
+
+    def write_jsonl(self, filename):
+        with open(filename, 'w') as file:
+            for record in self.__records:
+                file.write(json.dumps(record) + '\n')
+
+    def summary(self):
+        """Returns the {phase: {'calls', 'total', 'self'}} of every recorded episode"""
+        phases = {}
+        for record in self.__records:
+            for phase, entry in record['phases'].items():
+                total = phases.setdefault(phase, {'calls': 0, 'total': 0.0, 'self': 0.0})
+                for key in total:
+                    total[key] += entry[key]
+        return phases
+
+    def format_summary(self):
+        duration = sum(record['duration'] for record in self.__records)
+        pieces = sum(record['pieces'] for record in self.__records)
+        lines = [f"{len(self.__records)} episodes, {pieces} pieces in {duration:.2f}s "
+                 f"({pieces / duration if duration else 0:.1f} pieces/s)",
+                 f"{'phase':<20}{'calls':>12}{'total (s)':>12}{'self (s)':>12}{'self %':>8}{'µs/call':>10}"]
+        phases = sorted(self.summary().items(), key=lambda item: item[1]['self'], reverse=True)
+        for phase, entry in phases:
+            lines.append(f"{phase:<20}{entry['calls']:>12}{entry['total']:>12.3f}{entry['self']:>12.3f}"
+                         f"{entry['self'] / duration * 100 if duration else 0:>8.1f}"
+                         f"{entry['total'] / entry['calls'] * 1e6:>10.2f}")
+        return '\n'.join(lines)
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Train an agent and report where the time of an episode goes")
+    parser.add_argument('--episodes', type=int, default=10)
+    parser.add_argument('--mode', choices=(MICRO_STEP_MODE, PLACEMENT_MODE), default=MICRO_STEP_MODE)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--load', default=None, help="checkpoint to start from")
+    parser.add_argument('--output', default=None, help="JSONL file of the per episode records")
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    arguments = parse_arguments()
+    env = TetrisEnvironment(LINE_COUNT, COLUMN_COUNT, TetrominosFactory.create_tetrominos(), seed=arguments.seed)
+    agent = Agent(env, alpha=0.5, gamma=0.9, exploration=0.1, cooling_rate=0.99, mode=arguments.mode,
+                  seed=arguments.seed)
+    if arguments.load is not None:
+        agent.load(arguments.load)
+
+    profiler = PhaseProfiler()
+    profiler.attach(agent)
+    for _ in range(arguments.episodes):
+        while not agent.is_over:
+            agent.step()
+        agent.reset()
+    profiler.detach()
+
+    if arguments.output is not None:
+        profiler.write_jsonl(arguments.output)
+    print(profiler.format_summary())
@@ -0,0 +1,276 @@
+import numpy as np
+
+INITIAL_CAPACITY = 1024
+# A bounded store that holds more than its maximum evicts states down to this fraction of the maximum
+EVICTION_TARGET = 0.9
+# Estimated bytes of a state key in the id dict and in the key list, on top of its Q-values and visit counters
+STATE_KEY_BYTES = 120
+
+
+class QTableStore:
+    """Q-values of the states in one growable float32 array, the state keys are interned to contiguous row ids
+
+    The ids of the rows added or written since the last call to pop_changes are kept for delta checkpoints.
+
+    A store bounded by a number of states or of bytes counts the visits of its states, and evict() removes the
+    least recently used zero-valued states first, then the least visited ones. The remaining ids are renumbered.
+    """
+
+    def __init__(self, action_count, capacity=INITIAL_CAPACITY, max_states=None, max_bytes=None):
+        self.__action_count = action_count
+        self.__ids = {}
+        self.__keys = []
+        self.__values = np.zeros((max(capacity, 1), action_count), dtype=np.float32)
+        self.__changed = set()
+        self.__max_states = None
+        self.__visits = None
+        self.__last_visits = None
+        self.__clock = 0
+        self.__evicted = []
+        self.__eviction_stats = {'evictions': 0, 'evicted_states': 0, 'evicted_non_zero': 0}
+        self.set_limits(max_states, max_bytes)
+
+    def __len__(self):
+        return len(self.__ids)
+
+    def __contains__(self, state):
+        return state in self.__ids
+
+    @property
+    def action_count(self):
+        return self.__action_count
+
+    @property
+    def values(self):
+        """Q-values of the known states, one row per state id"""
+        return self.__values[:len(self.__ids)]
+
+    @property
+    def nbytes(self):
+        if self.__visits is None:
+            return self.__values.nbytes
+        return self.__values.nbytes + self.__visits.nbytes + self.__last_visits.nbytes
+
+    @property
+    def max_states(self):
+        """Maximum number of states kept by evict(), None if the store is not bounded"""
+        return self.__max_states
+
+    @property
+    def visits(self):
+        """Number of get_id calls of the known states, None if the store is not bounded"""
+        return None if self.__visits is None else self.__visits[:len(self.__ids)]
+
+    @property
+    def eviction_stats(self):
+        return dict(self.__eviction_stats)
+
+    @staticmethod
+    def get_state_bytes(action_count) -> int:
+        """Estimated memory of a state of a bounded store"""
+        return action_count * np.dtype(np.float32).itemsize + np.dtype(np.uint32).itemsize + \
+            np.dtype(np.int64).itemsize + STATE_KEY_BYTES
+
+    def set_limits(self, max_states=None, max_bytes=None):
+        """Bounds the store to the smallest of the limits (both None for no bound), the visits are counted from now"""
+        if max_bytes is not None:
+            max_bytes_states = max_bytes // self.get_state_bytes(self.__action_count)
+            max_states = max_bytes_states if max_states is None else min(max_states, max_bytes_states)
+        if max_states is not None and max_states < 1:
+            raise ValueError("The maximum number of states must be positive")
+        self.__max_states = max_states
+        if max_states is None:
+            self.__visits = None
+            self.__last_visits = None
+        elif self.__visits is None:
+            self.__visits = np.zeros(len(self.__values), dtype=np.uint32)
+            self.__last_visits = np.zeros(len(self.__values), dtype=np.int64)
+
+    def get_id(self, state) -> int:
+        """Returns the row id of the state, adding a row of zeros if the state is new, and counts a visit"""
+        state_id = self.__ids.get(state)
+        if state_id is None:
+            state_id = self.add(state)
+        if self.__visits is not None:
+            self.__clock += 1
+            self.__visits[state_id] += 1
+            self.__last_visits[state_id] = self.__clock
+        return state_id
+
+    def add(self, state) -> int:
+        state_id = len(self.__ids)
+        if state_id == len(self.__values):
+            self.grow()
+        self.__ids[state] = state_id
+        self.__keys.append(state)
+        self.__changed.add(state_id)
+        return state_id
+
+    def find_id(self, state) -> int:
+        """Returns the row id of the state, or -1 if the state is unknown"""
+        return self.__ids.get(state, -1)
+
+    def grow(self):
+        size = len(self.__values) * 2
+        if self.__max_states is not None:
+            # A bounded store only goes over its maximum until the next eviction
+            if len(self.__values) < self.__max_states:
+                size = min(size, self.__max_states)
+            else:
+                size = len(self.__values) + max(int(self.__max_states * (1 - EVICTION_TARGET)), 1)
+        values = np.zeros((size, self.__action_count), dtype=np.float32)
+        values[:len(self.__values)] = self.__values
+        self.__values = values
+        if self.__visits is not None:
+            self.__visits = np.concatenate((self.__visits, np.zeros(size - len(self.__visits), dtype=np.uint32)))
+            self.__last_visits = np.concatenate((self.__last_visits,
+                                                 np.zeros(size - len(self.__last_visits), dtype=np.int64)))
+
+    def get_values(self, state):
+        """Returns a copy of the Q-values of the state, zeros if the state is unknown (it is not added)"""
+        state_id = self.__ids.get(state)
+        if state_id is None:
+            return np.zeros(self.__action_count, dtype=np.float32)
+        return self.__values[state_id].copy()
+
+    def get_row(self, state_id):
+        """Returns the Q-values of the state id as a list of floats (faster than NumPy for a few values)"""
+        return self.__values[state_id].tolist()
+
+    def get_value(self, state_id, action_index):
+        return float(self.__values[state_id, action_index])
+
+    def set_value(self, state_id, action_index, value):
+        self.__values[state_id, action_index] = value
+        self.__changed.add(state_id)
+
+    def set_values(self, state, values):
+        """Overwrites the Q-values of the state, adding the state if it is new"""
+        state_id = self.__ids.get(state)
+        if state_id is None:
+            state_id = self.add(state)
+        self.__values[state_id] = values
+        self.__changed.add(state_id)
+
+    def set_values_at(self, state_ids, action_indexes, values):
+        """Writes one Q-value per (state id, action index) pair of the arrays"""
+        self.__values[state_ids, action_indexes] = values
+        self.__changed.update(state_ids.tolist())
+
+    def evict(self):
+        """Evicts states down to EVICTION_TARGET times the maximum if the store holds more than its maximum
+
+        Returns None if nothing is evicted, else the array of the new id of every old id (-1 for the evicted states).
+        """
+        count = len(self.__ids)
+        if self.__max_states is None or count <= self.__max_states:
+            return None
+        is_zero = ~self.values.any(axis=1)
+        visits = self.__visits[:count]
+        # The zero-valued states come first by last visit, then the others by number of visits and last visit
+        order = np.lexsort((self.__last_visits[:count], np.where(is_zero, 0, visits), ~is_zero))
+        evicted = order[:count - int(self.__max_states * EVICTION_TARGET)]
+
+        stats = self.__eviction_stats
+        stats['evictions'] += 1
+        stats['evicted_states'] += len(evicted)
+        stats['evicted_non_zero'] += int(np.count_nonzero(~is_zero[evicted]))
+        return self.remove_ids(evicted)
+
+    def remove(self, states):
+        """Removes the known states among the given ones, returns the new ids as evict() does"""
+        state_ids = [self.__ids[state] for state in states if state in self.__ids]
+        if not state_ids:
+            return None
+        return self.remove_ids(np.array(state_ids, dtype=np.int64))
+
+    def remove_ids(self, state_ids):
+        """Removes the rows of the state ids and renumbers the other states in the same order"""
+        count = len(self.__ids)
+        kept = np.ones(count, dtype=bool)
+        kept[state_ids] = False
+        kept_ids = np.flatnonzero(kept)
+        new_ids = np.full(count, -1, dtype=np.int64)
+        new_ids[kept_ids] = np.arange(len(kept_ids))
+
+        keys = self.__keys
+        self.__evicted.extend(keys[state_id] for state_id in state_ids.tolist())
+        self.__keys = [keys[state_id] for state_id in kept_ids.tolist()]
+        self.__ids = {key: state_id for state_id, key in enumerate(self.__keys)}
+        # The rows after the kept ones must be zeros again for the next states
+        self.__values[:len(kept_ids)] = self.__values[kept_ids]
+        self.__values[len(kept_ids):count] = 0
+        if self.__visits is not None:
+            self.__visits[:len(kept_ids)] = self.__visits[kept_ids]
+            self.__visits[len(kept_ids):count] = 0
+            self.__last_visits[:len(kept_ids)] = self.__last_visits[kept_ids]
+            self.__last_visits[len(kept_ids):count] = 0
+        changed = new_ids[sorted(self.__changed)] if self.__changed else new_ids[:0]
+        self.__changed = set(changed[changed >= 0].tolist())
+        return new_ids
+
+    def pop_evictions(self):
+        """Returns the keys of the states removed since the last call, and forgets them"""
+        evicted, self.__evicted = self.__evicted, []
+        return evicted
+
+    @property
+    def changed_count(self):
+        return len(self.__changed)
+
+    def pop_changes(self):
+        """Returns the (keys, Q-values copy) of the states changed since the last call, and forgets them"""
+        state_ids = sorted(self.__changed)
+        self.__changed = set()
+        return [self.__keys[state_id] for state_id in state_ids], self.__values[state_ids]
+
+    def forget_changes(self):
+        self.__changed = set()
+        self.__evicted = []
+
+    def copy(self):
+        """Returns an independent store with the same states and Q-values, without changes to pop nor bound"""
+        store = QTableStore(self.__action_count, 1)
+        store.__setstate__(self.__getstate__())
+        return store
+
+    def items(self):
+        """Yields the (state, Q-values) of every known state"""
+        for state, state_id in self.__ids.items():
+            yield state, self.__values[state_id]
+
+    @staticmethod
+    def from_dict(qtable, actions):
+        """Builds a store from a dict of {state: {action: Q-value}} tables"""
+        store = QTableStore(len(actions), len(qtable))
+        for state, values_by_action in qtable.items():
+            state_id = store.get_id(state)
+            for action_index, action in enumerate(actions):
+                store.set_value(state_id, action_index, values_by_action.get(action, 0.0))
+        return store
+
+    @staticmethod
+    def from_arrays(keys, values):
+        """Builds a store from a sequence of state keys and the matching (state count, action count) Q-values"""
+        store = QTableStore(values.shape[1], 1)
+        store.__setstate__((values.shape[1], dict(zip(keys, range(len(keys)))), values))
+        return store
+
+    def __getstate__(self):
+        return self.__action_count, self.__ids, self.values.copy()
+
+    def __setstate__(self, state):
+        self.__action_count, ids, values = state
+        self.__ids = dict(ids)
+        self.__keys = [None] * len(self.__ids)
+        for key, state_id in self.__ids.items():
+            self.__keys[state_id] = key
+        self.__values = np.zeros((max(len(values), INITIAL_CAPACITY), self.__action_count), dtype=np.float32)
+        self.__values[:len(values)] = values
+        self.__changed = set()
+        self.__max_states = None
+        self.__visits = None
+        self.__last_visits = None
+        self.__clock = 0
+        self.__evicted = []
+        self.__eviction_stats = {'evictions': 0, 'evicted_states': 0, 'evicted_non_zero': 0}
@@ -0,0 +1,75 @@
+RADAR_COUNT = 3
+RADAR_WIDTH = 3
+RADAR_HEIGHT = 3
+
+
+class Radar:
+    """Radars side by side around the current piece, each one is a fixed-size bitmask of its cells
+
+    The cell (line, column) of a radar is the bit line * width + column, set when the cell is a block or a wall.
+    The radars start on the top line of the piece, the middle one on the column of the piece matrix.
+    """
+
+    def __init__(self, board_width, count=RADAR_COUNT, width=RADAR_WIDTH, height=RADAR_HEIGHT):
+        if count < 1 or width < 1 or height < 1:
+            raise ValueError("The radar count, width and height must be positive")
+        self.__count = count
+        self.__width = width
+        self.__height = height
+        self.__bits = [0] * count
+
+        # Rows are shifted by the padding so that the radars never read a negative column (4 is the matrix width)
+        self.__padding = count * width + 4
+        self.__line_mask = (1 << width) - 1
+        board_row = ((1 << board_width) - 1) << self.__padding
+        self.__wall_row = ((1 << (board_width + 2 * self.__padding)) - 1) ^ board_row
+        self.__first_column_offset = self.__padding - (count // 2) * width
+
+    @property
+    def count(self):
+        return self.__count
+
+    @property
+    def width(self):
+        return self.__width
+
+    @property
+    def height(self):
+        return self.__height
+
+    @property
+    def cells_count(self):
+        return self.__width * self.__height
+
+    @property
+    def bits(self):
+        return self.__bits
+
+    def get_cells(self, radar_index):
+        """Returns the cells of a radar as lines of 0 (empty) and 1 (block or wall)"""
+        bits = self.__bits[radar_index]
+        return [[bits >> (line * self.__width + column) & 1 for column in range(self.__width)]
+                for line in range(self.__height)]
+
+    def update(self, rows, piece):
+        """Fill the radars around the piece from the board rows (bitmasks without the piece)"""
+        bits = self.__bits
+        for radar_index in range(self.__count):
+            bits[radar_index] = 0
+
+        width = self.__width
+        line_mask = self.__line_mask
+        first_column = piece.col + self.__first_column_offset
+        first_line = piece.row + piece.shape.min_dx
+        piece_left = piece.col + piece.shape.min_dy
+        piece_rows = {piece.row + dx: mask << piece_left for dx, mask in piece.shape.row_masks}
+        for line in range(self.__height):
+            x = first_line + line
+            if x < len(rows):
+                row = (rows[x] | piece_rows.get(x, 0)) << self.__padding | self.__wall_row
+            else:
+                row = -1
+            row >>= first_column
+            line_bit = line * width
+            for radar_index in range(self.__count):
+                bits[radar_index] |= (row >> (radar_index * width) & line_mask) << line_bit
@@ -0,0 +1,301 @@
+import argparse
+import os
+import struct
+import time
+from typing import NamedTuple
+
+from src.game.tetrominos.tetrominos_factory import TetrominosFactory
+from src.reinforcement.agent import ACTION_LIST, ACTION_INDEXES, MICRO_STEP_MODE, PLACEMENT_MODE
+from src.reinforcement.environment import TetrisEnvironment
+
+MAGIC = b'TRPL'
+VERSION = 1
+# Magic, version, board height and board width
+FILE_HEADER = struct.Struct('<4sBBB')
+# Episode seed, mode and number of actions, followed by the actions
+EPISODE_HEADER = struct.Struct('<QBI')
+MODES = (MICRO_STEP_MODE, PLACEMENT_MODE)
+# Set in the mode byte of the micro-step episodes of an agent with hard drop
+HARD_DROP_FLAG = 0x80
+
+# Micro actions take 2 bits (4 per byte), placements take 2 bytes : rotation (2 bits), row (6 bits), column (6 bits)
+ACTIONS_PER_BYTE = 4
+PLACEMENT = struct.Struct('<H')
+# The matrix of a piece can be on the left of the board, up to its empty columns
+PLACEMENT_COLUMN_OFFSET = 4
+
+
+class Episode(NamedTuple):
+    seed: int
+    mode: str
+    actions: list
+    hard_drop: bool = False
+
+
+def encode_placement(placement) -> int:
+    rotation, row, col = placement
+    return rotation // 90 | row << 2 | (col + PLACEMENT_COLUMN_OFFSET) << 8
+
+
+def decode_placement(code):
+    return (code & 3) * 90, code >> 2 & 63, (code >> 8) - PLACEMENT_COLUMN_OFFSET
+
+
+def encode_actions(mode, actions) -> bytes:
+    """Packs the action indexes (micro mode) or the placement codes (placement mode) of an episode"""
+    if mode == PLACEMENT_MODE:
+        return b''.join(PLACEMENT.pack(action) for action in actions)
+    payload = bytearray((len(actions) + ACTIONS_PER_BYTE - 1) // ACTIONS_PER_BYTE)
+    for index, action in enumerate(actions):
+        payload[index // ACTIONS_PER_BYTE] |= action << (index % ACTIONS_PER_BYTE * 2)
+    return bytes(payload)
+
+
+def decode_actions(mode, payload, count):
+    if mode == PLACEMENT_MODE:
+        return [code for code, in PLACEMENT.iter_unpack(payload)]
+    return [payload[index // ACTIONS_PER_BYTE] >> (index % ACTIONS_PER_BYTE * 2) & 3 for index in range(count)]
+
+
+def get_payload_size(mode, count) -> int:
+    if mode == PLACEMENT_MODE:
+        return count * PLACEMENT.size
+    return (count + ACTIONS_PER_BYTE - 1) // ACTIONS_PER_BYTE
+
+
+class EpisodeRecorder:
+    """Appends the seed and the actions of every episode of an agent to a binary file
+
+    The environment methods that receive the actions are wrapped on the instance while the recorder is attached,
+    an episode is written when the environment is reset or when the recorder is closed.
+    """
+
+    def __init__(self, filename, agent):
+        self.__agent = agent
+        self.__environment = agent.environment
+        self.__mode = agent.mode
+        self.__mode_code = MODES.index(agent.mode) | (HARD_DROP_FLAG if getattr(agent, 'hard_drop', False) else 0)
+        self.__seed = None
+        self.__actions = []
+        self.__wrapped = []
+
+        is_new_file = not os.path.exists(filename) or os.path.getsize(filename) == 0
+        self.__file = open(filename, 'ab')
+        if is_new_file:
+            self.__file.write(FILE_HEADER.pack(MAGIC, VERSION, self.__environment.height, self.__environment.width))
+
+    def attach(self):
+        environment = self.__environment
+        actions = self.__actions
+        do = environment.do
+        move_current_piece_to = environment.move_current_piece_to
+        reset = environment.reset
+
+        def recorded_do(action):
+            actions.append(ACTION_INDEXES[action])
+            return do(action)
+
+        def recorded_move_current_piece_to(placement):
+            actions.append(encode_placement(placement))
+            return move_current_piece_to(placement)
+
+        def recorded_reset(*args, **kwargs):
+            self.write_episode()
+            result = reset(*args, **kwargs)
+            self.__seed = environment.episode_seed
+            return result
+
+        if self.__mode == PLACEMENT_MODE:
+            environment.move_current_piece_to = recorded_move_current_piece_to
+            self.__wrapped.append('move_current_piece_to')
+        else:
+            environment.do = recorded_do
+            self.__wrapped.append('do')
+        environment.reset = recorded_reset
+        self.__wrapped.append('reset')
+        self.__seed = environment.episode_seed
+
+    def write_episode(self):
+        """Writes the current episode, if it has any action"""
+        if self.__actions:
+            self.__file.write(EPISODE_HEADER.pack(self.__seed, self.__mode_code, len(self.__actions)))
+            self.__file.write(encode_actions(self.__mode, self.__actions))
+            self.__actions.clear()
+
+    def close(self):
+        self.write_episode()
+        for name in self.__wrapped:
+            delattr(self.__environment, name)
+        self.__wrapped = []
+        self.__file.close()
+
+
+class EpisodeReader:
+    """Reads the episodes of a recording, by index, from an index of their offsets built when opening"""
+
+    def __init__(self, filename):
+        self.__filename = filename
+        self.__offsets = []
+        with open(filename, 'rb') as file:
+            magic, version, self.__height, self.__width = FILE_HEADER.unpack(file.read(FILE_HEADER.size))
+            if magic != MAGIC or version != VERSION:
+                raise ValueError("{0} is not a recording of version {1}".format(filename, VERSION))
+            offset = FILE_HEADER.size
+            file_size = os.path.getsize(filename)
+            while offset + EPISODE_HEADER.size <= file_size:
+                file.seek(offset)
+                _, mode, count = EPISODE_HEADER.unpack(file.read(EPISODE_HEADER.size))
+                next_offset = offset + EPISODE_HEADER.size + get_payload_size(MODES[mode & ~HARD_DROP_FLAG], count)
+                if next_offset > file_size:
+                    # Half-written last episode
+                    break
+                self.__offsets.append(offset)
+                offset = next_offset
+
+    @property
+    def height(self):
+        return self.__height
+
+    @property
+    def width(self):
+        return self.__width
+
+    def __len__(self):
+        return len(self.__offsets)
+
+    def __getitem__(self, index) -> Episode:
+        with open(self.__filename, 'rb') as file:
+            file.seek(self.__offsets[index])
+            seed, mode_code, count = EPISODE_HEADER.unpack(file.read(EPISODE_HEADER.size))
+            mode = MODES[mode_code & ~HARD_DROP_FLAG]
+            return Episode(seed, mode, decode_actions(mode, file.read(get_payload_size(mode, count)), count),
+                           bool(mode_code & HARD_DROP_FLAG))
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+
+class ReplayEngine:
+    """Re-simulates recorded episodes on an environment, without an agent, learning or rendering"""
+
+    def __init__(self, environment):
+        self.__environment = environment
+        self.__score = 0
+        self.__pieces = 0
+        self.__is_over = False
+
+    @property
+    def environment(self):
+        return self.__environment
+
+    @property
+    def score(self):
+        return self.__score
+
+    @property
+    def pieces(self):
+        """Number of pieces locked since the start of the episode"""
+        return self.__pieces
+
+    @property
+    def is_over(self):
+        return self.__is_over
+
+    def play(self, episode: Episode):
+        """Replays the episode from its start, yields the number of locked pieces after every locked piece"""
+        environment = self.__environment
+        environment.reset(environment.height, environment.width, episode.seed)
+        self.__score = 0
+        self.__pieces = 0
+        self.__is_over = False
+        if episode.mode == PLACEMENT_MODE:
+            steps = self.play_placements(episode.actions)
+        else:
+            steps = self.play_micro_actions(episode.actions, episode.hard_drop)
+        for _ in steps:
+            self.__pieces += 1
+            yield self.__pieces
+
+    def play_placements(self, placements):
+        """Same as Agent.placement_step"""
+        environment = self.__environment
+        for code in placements:
+            environment.move_current_piece_to(decode_placement(code))
+            self.__score += environment.compute_rewards()
+            if environment.lock_and_next_piece() is False:
+                self.__is_over = True
+            yield
+
+    def play_micro_actions(self, actions, hard_drop=False):
+        """Same as Agent.step, the piece falls after 10 actions or when it can not move anymore"""
+        environment = self.__environment
+        action_count = len(actions)
+        index = 0
+        while index < action_count:
+            current_piece = environment.get_current_piece()
+            for movement in range(10):
+                if index == action_count:
+                    return
+                current_piece, rewards = environment.do(ACTION_LIST[actions[index]])
+                index += 1
+                self.__score += rewards
+                environment.set_current_piece(current_piece)
+                if environment.entering_in_collision(current_piece, True, False, False) is True:
+                    break
+
+            if hard_drop:
+                has_fallen = environment.drop(current_piece) > 0
+            else:
+                has_fallen = environment.entering_in_collision(current_piece, True, False, False) is False
+                if has_fallen:
+                    environment.move_down(current_piece)
+            if not has_fallen:
+                if environment.lock_and_next_piece() is False:
+                    self.__is_over = True
+                yield
+
+    def seek(self, episode: Episode, piece):
+        """Replays the episode until the given number of pieces is locked, the environment is left in that state"""
+        for pieces in self.play(episode):
+            if pieces >= piece:
+                break
+        return self.__environment
+
+    def run(self, episode: Episode):
+        """Replays the whole episode and returns its (score, locked pieces, lines cleared)"""
+        for _ in self.play(episode):
+            pass
+        return self.__score, self.__pieces, self.__environment.lines_cleared
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Replay recorded episodes at full speed")
+    parser.add_argument('filename')
+    parser.add_argument('--episode', type=int, default=None, help="only replay this episode")
+    parser.add_argument('--piece', type=int, default=None, help="stop the episode after this many pieces and "
+                                                                "print the board")
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    arguments = parse_arguments()
+    reader = EpisodeReader(arguments.filename)
+    engine = ReplayEngine(TetrisEnvironment(reader.height, reader.width, TetrominosFactory.create_tetrominos()))
+
+    if arguments.episode is not None and arguments.piece is not None:
+        engine.seek(reader[arguments.episode], arguments.piece)
+        print(f"Episode #{arguments.episode:04d} after {engine.pieces} pieces, score : {engine.score:.2f}")
+        for row in engine.environment.board:
+            print(row)
+    else:
+        indexes = range(len(reader)) if arguments.episode is None else [arguments.episode]
+        total_pieces = 0
+        start = time.perf_counter()
+        for index in indexes:
+            score, pieces, lines = engine.run(reader[index])
+            total_pieces += pieces
+            print(f"#{index:04d} Score : {score:.2f} Pieces : {pieces} Lines : {lines}")
+        elapsed = time.perf_counter() - start
+        print(f"{len(indexes)} episodes, {total_pieces} pieces in {elapsed:.2f}s "
+              f"({total_pieces / elapsed if elapsed else 0:.1f} pieces/s)")
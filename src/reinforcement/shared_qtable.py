@@ -0,0 +1,201 @@
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from src.reinforcement.qtable import QTableStore
+
+# Number of slots of a shared table, rounded up to a power of two
+SHARED_CAPACITY = 1 << 21
+# New states are refused once this fraction of the slots is used, so that the probe sequences stay short
+MAX_LOAD = 0.75
+EMPTY_KEY = -1
+# Fibonacci hashing spreads the keys, which mostly differ in their high radar bits, over the slots
+HASH_MULTIPLIER = 0x9E3779B97F4A7C15
+HASH_MASK = (1 << 64) - 1
+COUNT_BYTES = 8
+KEY_BYTES = 8
+VALUE_BYTES = 4
+
+
+class SharedQTableStore:
+    """Q-values in shared memory: an open-addressing hash table (linear probing) of int64 keys to float32 rows
+
+    The memory holds the number of states, then the key of every slot, then the Q-values of every slot, and the
+    slot of a state is its id. Several processes read and write the table without locks (Hogwild): an update can
+    be lost when two processes write the same state, and two processes adding different states to the same empty
+    slot at the same time may share its row. Both are rare and only add noise to the Q-values.
+
+    The table has a fixed capacity, once it is full the new states are not added anymore: get_id gives -1 for them,
+    like find_id, and the known states are still read and updated.
+    """
+
+    def __init__(self, action_count, capacity=SHARED_CAPACITY, name=None):
+        capacity = 1 << max(capacity - 1, 1).bit_length()
+        self.__action_count = action_count
+        self.__capacity = capacity
+        self.__mask = capacity - 1
+        self.__shift = 64 - capacity.bit_length() + 1
+        self.__max_count = int(capacity * MAX_LOAD)
+
+        size = COUNT_BYTES + capacity * (KEY_BYTES + action_count * VALUE_BYTES)
+        self.__is_owner = name is None
+        if self.__is_owner:
+            self.__memory = shared_memory.SharedMemory(create=True, size=size)
+        else:
+            self.__memory = shared_memory.SharedMemory(name=name)
+        buffer = self.__memory.buf
+        keys_end = COUNT_BYTES + capacity * KEY_BYTES
+        # Memoryviews give Python ints and floats faster than NumPy for a single slot
+        self.__count_view = buffer[:COUNT_BYTES].cast('q')
+        self.__key_view = buffer[COUNT_BYTES:keys_end].cast('q')
+        self.__value_view = buffer[keys_end:size].cast('f')
+        self.__keys = np.ndarray(capacity, dtype=np.int64, buffer=buffer, offset=COUNT_BYTES)
+        self.__values = np.ndarray((capacity, action_count), dtype=np.float32, buffer=buffer, offset=keys_end)
+        if self.__is_owner:
+            self.__count_view[0] = 0
+            self.__keys.fill(EMPTY_KEY)
+            self.__values.fill(0)
+
+    def __len__(self):
+        return self.__count_view[0]
+
+    def __contains__(self, state):
+        return self.find_id(state) != -1
+
+    @property
+    def name(self):
+        """Name of the shared memory, to attach the table from another process"""
+        return self.__memory.name
+
+    @property
+    def action_count(self):
+        return self.__action_count
+
+    @property
+    def capacity(self):
+        return self.__capacity
+
+    @property
+    def values(self):
+        """Q-values of every slot, the row of a state is its id"""
+        return self.__values
+
+    @property
+    def nbytes(self):
+        return self.__memory.size
+
+    @property
+    def max_states(self):
+        """The shared tables are not bounded by evictions"""
+        return None
+
+    @property
+    def eviction_stats(self):
+        return {'evictions': 0, 'evicted_states': 0, 'evicted_non_zero': 0}
+
+    def evict(self):
+        return None
+
+    def get_id(self, state) -> int:
+        """Returns the slot of the state, claiming an empty slot with zeros if the state is new (-1 if it is full)"""
+        keys = self.__key_view
+        mask = self.__mask
+        slot = (state * HASH_MULTIPLIER & HASH_MASK) >> self.__shift
+        while True:
+            key = keys[slot]
+            if key == state:
+                return slot
+            if key == EMPTY_KEY:
+                if self.__count_view[0] >= self.__max_count:
+                    return -1
+                keys[slot] = state
+                # Another process may have claimed the slot at the same time, then the slot is checked again
+                if keys[slot] == state:
+                    self.__count_view[0] += 1
+                    return slot
+            else:
+                slot = (slot + 1) & mask
+
+    def find_id(self, state) -> int:
+        """Returns the slot of the state, or -1 if the state is unknown"""
+        keys = self.__key_view
+        mask = self.__mask
+        slot = (state * HASH_MULTIPLIER & HASH_MASK) >> self.__shift
+        while True:
+            key = keys[slot]
+            if key == state:
+                return slot
+            if key == EMPTY_KEY:
+                return -1
+            slot = (slot + 1) & mask
+
+    def get_values(self, state):
+        """Returns a copy of the Q-values of the state, zeros if the state is unknown (it is not added)"""
+        state_id = self.find_id(state)
+        if state_id == -1:
+            return np.zeros(self.__action_count, dtype=np.float32)
+        return self.__values[state_id].copy()
+
+    def get_row(self, state_id):
+        start = state_id * self.__action_count
+        return self.__value_view[start:start + self.__action_count].tolist()
+
+    def get_value(self, state_id, action_index):
+        return self.__value_view[state_id * self.__action_count + action_index]
+
+    def set_value(self, state_id, action_index, value):
+        self.__value_view[state_id * self.__action_count + action_index] = value
+
+    def set_values(self, state, values):
+        """Overwrites the Q-values of the state, adding the state if it is new and the table is not full"""
+        state_id = self.get_id(state)
+        if state_id != -1:
+            self.__values[state_id] = values
+
+    def set_values_at(self, state_ids, action_indexes, values):
+        self.__values[state_ids, action_indexes] = values
+
+    def items(self):
+        """Yields the (state, Q-values) of every used slot"""
+        for slot in np.flatnonzero(self.__keys != EMPTY_KEY).tolist():
+            yield self.__key_view[slot], self.__values[slot]
+
+    def load(self, store: QTableStore):
+        """Adds the states and the Q-values of a store"""
+        if len(store) > self.__max_count:
+            raise ValueError("The {0} states do not fit in the shared Q-table ({1} states), the capacity must be "
+                             "larger".format(len(store), self.__max_count))
+        for state, values in store.items():
+            self.set_values(state, values)
+
+    def to_store(self) -> QTableStore:
+        """Returns a snapshot of the table as a QTableStore, the other processes may be writing meanwhile"""
+        slots = np.flatnonzero(self.__keys != EMPTY_KEY)
+        return QTableStore.from_arrays(self.__keys[slots].tolist(), self.__values[slots])
+
+    def detach(self):
+        """Detaches the table from the shared memory, without freeing it"""
+        if self.__memory is None:
+            return
+        self.__keys = None
+        self.__values = None
+        for view in (self.__count_view, self.__key_view, self.__value_view):
+            view.release()
+        self.__memory.close()
+        self.__memory = None
+
+    def close(self):
+        """Detaches the table from the shared memory, which is freed if the table created it"""
+        memory = self.__memory
+        self.detach()
+        if memory is not None and self.__is_owner:
+            memory.unlink()
+        self.__memory = None
+
+    def __getstate__(self):
+        # A table sent to a spawned process is attached again by the name of its memory
+        return self.__action_count, self.__capacity, self.__memory.name
+
+    def __setstate__(self, state):
+        action_count, capacity, name = state
+        self.__init__(action_count, capacity, name)
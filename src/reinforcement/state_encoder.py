@@ -0,0 +1,55 @@
+PIECE_BITS = 3
+ROTATION_BITS = 2
+COLUMN_BITS = 5
+HEADER_BITS = PIECE_BITS + ROTATION_BITS + COLUMN_BITS
+
+# Keys fit in a signed 64 bits integer, so they can be stored in int64 arrays
+KEY_BITS = 63
+
+
+class StateEncoder:
+    """Packs the piece, its rotation, its column and the cells of a radar into one integer key
+
+    The key only depends on these values (unlike hash()), so it is the same across processes and Python versions.
+    """
+
+    def __init__(self, shapes, board_width, radar_cells_count):
+        if board_width > 1 << COLUMN_BITS:
+            raise ValueError("The board can not be wider than {0} columns".format(1 << COLUMN_BITS))
+        if HEADER_BITS + radar_cells_count > KEY_BITS:
+            raise ValueError("A radar can not have more than {0} cells".format(KEY_BITS - HEADER_BITS))
+        self.__radar_cells_count = radar_cells_count
+
+        # Rotations of a piece with the same blocks (like the O piece) share the same key
+        self.__headers = [None] * (max(shapes.indexes) + 1)
+        for index in shapes.indexes:
+            if index >= 1 << PIECE_BITS:
+                raise ValueError("The piece index {0} does not fit in {1} bits".format(index, PIECE_BITS))
+            rotations = shapes.get_rotations(index)
+            headers = []
+            for shape in rotations:
+                same_shape = next(other for other in rotations if set(other.offsets) == set(shape.offsets))
+                headers.append(index | (same_shape.rotation // 90) << PIECE_BITS)
+            self.__headers[index] = headers
+
+    @property
+    def radar_cells_count(self):
+        return self.__radar_cells_count
+
+    def encode_piece(self, piece) -> int:
+        """Returns the bits of the piece index, its rotation and its leftmost column"""
+        column = piece.col + piece.shape.min_dy
+        return self.__headers[piece.index][piece.rotation // 90] | column << (PIECE_BITS + ROTATION_BITS)
+
+    @staticmethod
+    def encode(piece_bits, radar_bits) -> int:
+        """Returns the key of a radar for the piece encoded by encode_piece"""
+        return piece_bits | radar_bits << HEADER_BITS
+
+    @staticmethod
+    def decode(key):
+        """Returns the (piece index, rotation, leftmost column, radar bits) of a key"""
+        return (key & ((1 << PIECE_BITS) - 1),
+                (key >> PIECE_BITS & ((1 << ROTATION_BITS) - 1)) * 90,
+                key >> (PIECE_BITS + ROTATION_BITS) & ((1 << COLUMN_BITS) - 1),
+                key >> HEADER_BITS)
@@ -0,0 +1,164 @@
+import argparse
+import csv
+import itertools
+import json
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from src.game.tetrominos.tetrominos_factory import TetrominosFactory
+from src.reinforcement.agent import Agent, MICRO_STEP_MODE, PLACEMENT_MODE
+from src.reinforcement.environment import TetrisEnvironment, REWARD_PIECE_HEIGHT, REWARD_CLEAR_LINE, \
+    REWARD_BUMPINESS, REWARD_NEW_HOLES
+
+LINE_COUNT = 20
+COLUMN_COUNT = 10
+
+# Parameters of the Agent and of the TetrisEnvironment rewards that a sweep can explore
+AGENT_PARAMETER_NAMES = ('alpha', 'gamma', 'exploration', 'cooling_rate')
+REWARD_PARAMETER_NAMES = ('reward_piece_height', 'reward_clear_line', 'reward_bumpiness', 'reward_new_holes')
+
+DEFAULT_SPACE = {
+    'alpha': [0.5],
+    'gamma': [0.9],
+    'exploration': [0.1],
+    'cooling_rate': [0.99],
+    'reward_piece_height': [REWARD_PIECE_HEIGHT],
+    'reward_clear_line': [REWARD_CLEAR_LINE],
+    'reward_bumpiness': [REWARD_BUMPINESS],
+    'reward_new_holes': [REWARD_NEW_HOLES],
+}
+
+# Scores of the last episodes averaged to rank the trials
+FINAL_SCORE_WINDOW = 10
+
+RESULT_COLUMNS = ('trial', 'mode', 'seed') + AGENT_PARAMETER_NAMES + REWARD_PARAMETER_NAMES + (
+    'episodes', 'best_score', 'mean_score', 'final_mean_score', 'duration', 'checkpoint')
+
+
+def grid_configs(space):
+    """Returns every combination of the values of the space ({parameter: [values]})"""
+    names = list(space)
+    return [dict(zip(names, values)) for values in itertools.product(*(space[name] for name in names))]
+
+
+def random_configs(space, count, seed=None):
+    """Returns count random combinations, a (low, high) tuple is sampled uniformly, a list is sampled from"""
+    generator = random.Random(seed)
+    configs = []
+    for _ in range(count):
+        config = {}
+        for name, values in space.items():
+            if isinstance(values, tuple):
+                config[name] = generator.uniform(*values)
+            else:
+                config[name] = generator.choice(values)
+        configs.append(config)
+    return configs
+
+
+def run_trial(trial, config, episodes, output_dir, mode=MICRO_STEP_MODE, seed=0,
+              height=LINE_COUNT, width=COLUMN_COUNT):
+    """Trains one agent for the given episodes and saves its checkpoint, returns its result row and score curve
+
+    The parameters missing from the config take the first value of DEFAULT_SPACE.
+    """
+    config = {**{name: values[0] for name, values in DEFAULT_SPACE.items()}, **config}
+    rewards = {name: config[name] for name in REWARD_PARAMETER_NAMES if name in config}
+    parameters = {name: config[name] for name in AGENT_PARAMETER_NAMES if name in config}
+    env = TetrisEnvironment(height, width, TetrominosFactory.create_tetrominos(), seed=seed, **rewards)
+    agent = Agent(env, mode=mode, seed=seed, **parameters)
+
+    start = time.perf_counter()
+    for _ in range(episodes):
+        while not agent.is_over:
+            agent.step()
+        agent.reset()
+    duration = time.perf_counter() - start
+
+    checkpoint = os.path.join(output_dir, 'trial_{0:04d}.pkl'.format(trial))
+    agent.save(checkpoint, wait=True)
+    agent.close_checkpoint()
+
+    scores = list(agent.history)
+    row = dict(config)
+    row.update(trial=trial, mode=mode, seed=seed, episodes=episodes,
+               best_score=max(scores) if scores else 0,
+               mean_score=sum(scores) / len(scores) if scores else 0,
+               final_mean_score=sum(scores[-FINAL_SCORE_WINDOW:]) / len(scores[-FINAL_SCORE_WINDOW:]) if scores else 0,
+               duration=duration, checkpoint=checkpoint)
+    return {column: row[column] for column in RESULT_COLUMNS}, scores
+
+
+def run_sweep(configs, episodes, output_dir, workers=None, mode=MICRO_STEP_MODE, seed=0,
+              height=LINE_COUNT, width=COLUMN_COUNT):
+    """Runs one trial per config on a pool of processes, writes results.csv and the score curves in curves.json"""
+    os.makedirs(output_dir, exist_ok=True)
+    rows = []
+    curves = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # Every trial plays the same pieces, so that the scores only differ by the parameters
+        futures = [executor.submit(run_trial, trial, config, episodes, output_dir, mode, seed, height, width)
+                   for trial, config in enumerate(configs)]
+        for future in as_completed(futures):
+            row, scores = future.result()
+            rows.append(row)
+            curves[row['trial']] = scores
+            print(f"Trial #{row['trial']:04d} done in {row['duration']:.1f}s : "
+                  f"final mean score {row['final_mean_score']:.2f}")
+
+    rows.sort(key=lambda row: row['final_mean_score'], reverse=True)
+    with open(os.path.join(output_dir, 'results.csv'), 'w', newline='') as file:
+        writer = csv.DictWriter(file, fieldnames=RESULT_COLUMNS)
+        writer.writeheader()
+        writer.writerows(rows)
+    with open(os.path.join(output_dir, 'curves.json'), 'w') as file:
+        json.dump({str(trial): curves[trial] for trial in sorted(curves)}, file)
+    return rows, curves
+
+
+def parse_value(text):
+    """Returns the float of a value, or the (low, high) tuple of a low:high range"""
+    if ':' in text:
+        low, high = text.split(':')
+        return float(low), float(high)
+    return float(text)
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Train one agent per hyperparameter combination on every core")
+    parser.add_argument('--episodes', type=int, default=100)
+    parser.add_argument('--workers', type=int, default=None, help="defaults to the number of cores")
+    parser.add_argument('--samples', type=int, default=0,
+                        help="number of random combinations, the whole grid is run when 0")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--mode', choices=(MICRO_STEP_MODE, PLACEMENT_MODE), default=MICRO_STEP_MODE)
+    parser.add_argument('--output-dir', default=os.path.join('save', 'sweep'))
+    for name, values in DEFAULT_SPACE.items():
+        parser.add_argument('--' + name.replace('_', '-'), dest=name, type=parse_value, nargs='+', default=values,
+                            help="values, or one low:high range sampled uniformly with --samples")
+    arguments = parser.parse_args()
+    for name in DEFAULT_SPACE:
+        values = getattr(arguments, name)
+        if any(isinstance(value, tuple) for value in values):
+            if len(values) != 1 or arguments.samples <= 0:
+                parser.error("a low:high range must be the only value of its parameter, and needs --samples")
+            setattr(arguments, name, values[0])
+    return arguments
+
+
+if __name__ == '__main__':
+    arguments = parse_arguments()
+    space = {name: getattr(arguments, name) for name in DEFAULT_SPACE}
+    if arguments.samples > 0:
+        configs = random_configs(space, arguments.samples, arguments.seed)
+    else:
+        configs = grid_configs(space)
+
+    print(f"{len(configs)} trials of {arguments.episodes} episodes")
+    results, _ = run_sweep(configs, arguments.episodes, arguments.output_dir, arguments.workers, arguments.mode,
+                           arguments.seed)
+    for result in results:
+        print(f"#{result['trial']:04d} " + " ".join(f"{name}={result[name]}" for name in DEFAULT_SPACE) +
+              f" : {result['final_mean_score']:.2f}")
@@ -0,0 +1,62 @@
+import numpy as np
+
+HIDDEN_SIZES = (64, 32)
+LEARNING_RATE = 0.001
+
+
+class ValueNetwork:
+    """Small multilayer perceptron in NumPy (ReLU hidden layers, linear output) that scores a batch of inputs
+
+    It is trained by minibatch stochastic gradient descent on the mean squared error, its memory only depends on
+    the layer sizes.
+    """
+
+    def __init__(self, input_size, hidden_sizes=HIDDEN_SIZES, learning_rate=LEARNING_RATE, seed=None):
+        generator = np.random.default_rng(seed)
+        sizes = (input_size,) + tuple(hidden_sizes) + (1,)
+        # He initialization, suited to the ReLU layers
+        self.__weights = [(generator.standard_normal((fan_in, fan_out)) * np.sqrt(2 / fan_in)).astype(np.float32)
+                          for fan_in, fan_out in zip(sizes[:-1], sizes[1:])]
+        self.__biases = [np.zeros(fan_out, dtype=np.float32) for fan_out in sizes[1:]]
+        self.__learning_rate = learning_rate
+
+    @property
+    def input_size(self):
+        return self.__weights[0].shape[0]
+
+    @property
+    def learning_rate(self):
+        return self.__learning_rate
+
+    @property
+    def nbytes(self):
+        return sum(array.nbytes for array in self.__weights + self.__biases)
+
+    def forward(self, inputs):
+        """Returns the activations of every layer for a (batch, input size) array, the last one is the output"""
+        activations = [np.asarray(inputs, dtype=np.float32)]
+        last_layer = len(self.__weights) - 1
+        for layer, (weights, biases) in enumerate(zip(self.__weights, self.__biases)):
+            outputs = activations[-1] @ weights + biases
+            activations.append(outputs if layer == last_layer else np.maximum(outputs, 0))
+        return activations
+
+    def predict(self, inputs):
+        """Returns the value of every row of the (batch, input size) array"""
+        return self.forward(inputs)[-1][:, 0]
+
+    def train(self, inputs, targets):
+        """Does one gradient descent step towards the targets of the batch, returns the mean squared error"""
+        activations = self.forward(inputs)
+        errors = activations[-1][:, 0] - np.asarray(targets, dtype=np.float32)
+        # Gradient of the half mean squared error with respect to the outputs of the last layer
+        gradient = errors[:, np.newaxis] / len(errors)
+        for layer in range(len(self.__weights) - 1, -1, -1):
+            weights = self.__weights[layer]
+            weight_gradient = activations[layer].T @ gradient
+            bias_gradient = gradient.sum(axis=0)
+            if layer > 0:
+                gradient = (gradient @ weights.T) * (activations[layer] > 0)
+            weights -= self.__learning_rate * weight_gradient
+            self.__biases[layer] -= self.__learning_rate * bias_gradient
+        return float(np.mean(errors ** 2))
@@ -0,0 +1,219 @@
+import numpy as np
+
+from src.game.tetrominos.tetrominos_factory import TetrominosFactory
+from src.reinforcement.agent import LEFT, RIGHT, ROTATE, NONE
+from src.reinforcement.bitboard import EMPTY_BLOCK
+from src.reinforcement.board_features import extract_features
+from src.reinforcement.environment import REWARD_PIECE_HEIGHT, REWARD_CLEAR_LINE, REWARD_BUMPINESS, \
+    REWARD_NEW_HOLES
+
+# Integer codes of the actions, in the order of the ACTION_CODES
+ACTION_CODES = (LEFT, RIGHT, ROTATE, NONE)
+LEFT_CODE, RIGHT_CODE, ROTATE_CODE, NONE_CODE = range(len(ACTION_CODES))
+
+# Same as Agent.step : the piece falls one row after this many actions if it did not land before
+MOVEMENTS_PER_ROW = 10
+
+# Columns of the pieces array
+PIECE_INDEX, PIECE_ROTATION, PIECE_ROW, PIECE_COLUMN = range(4)
+
+
+class VectorTetrisEnvironment:
+    """Steps several Tetris boards in lockstep with NumPy arrays, following TetrisEnvironment.do and Agent.step"""
+
+    def __init__(self, count, height, width, pieces, reward_piece_height=REWARD_PIECE_HEIGHT,
+                 reward_clear_line=REWARD_CLEAR_LINE, reward_bumpiness=REWARD_BUMPINESS,
+                 reward_new_holes=REWARD_NEW_HOLES, seed=None):
+        self.__count = count
+        self.__height = height
+        self.__width = width
+        self.__pieces = pieces
+
+        shapes = TetrominosFactory.create_shape_table(pieces, width)
+        self.__random = np.random.default_rng(seed)
+        self.__piece_indexes = np.array(sorted(shapes.indexes))
+        table_size = max(shapes.indexes) + 1
+        self.__offsets = np.zeros((table_size, 4, 4, 2), dtype=np.int64)
+        self.__next_rotation = np.zeros((table_size, 4), dtype=np.int64)
+        for index in shapes.indexes:
+            for shape in shapes.get_rotations(index):
+                self.__offsets[index, shape.rotation // 90] = shape.offsets
+                self.__next_rotation[index, shape.rotation // 90] = shape.next_rotation
+        self.__spawn_position = shapes.get(int(self.__piece_indexes[0]), 0).spawn_position
+
+        self.__reward_piece_height = reward_piece_height
+        self.__reward_clear_line = reward_clear_line
+        self.__reward_bumpiness = reward_bumpiness
+        self.__reward_new_holes = reward_new_holes
+
+        self.__boards = np.zeros((count, height, width), dtype=np.uint8)
+        self.__current_pieces = np.zeros((count, 4), dtype=np.int64)
+        self.__movements = np.zeros(count, dtype=np.int64)
+        self.__bags = np.tile(self.__piece_indexes, (count, 1))
+        self.__bag_positions = np.zeros(count, dtype=np.int64)
+        self.__scores = np.zeros(count, dtype=np.float64)
+        self.__final_scores = np.zeros(count, dtype=np.float64)
+        self.reset()
+
+    @property
+    def count(self):
+        return self.__count
+
+    @property
+    def height(self):
+        return self.__height
+
+    @property
+    def width(self):
+        return self.__width
+
+    @property
+    def boards(self):
+        """The locked blocks of every board, without the current pieces"""
+        return self.__boards
+
+    @property
+    def current_pieces(self):
+        """(index, rotation, row, column) of the current piece of every board"""
+        return self.__current_pieces
+
+    @property
+    def scores(self):
+        return self.__scores
+
+    @property
+    def final_scores(self):
+        """Score of the last finished episode of every board"""
+        return self.__final_scores
+
+    @staticmethod
+    def to_action_codes(actions):
+        """Converts an array of LEFT / RIGHT / ROTATE / NONE actions to their integer codes"""
+        actions = np.asarray(actions)
+        if actions.dtype.kind in 'iu':
+            return actions
+        codes = np.full(actions.shape, NONE_CODE, dtype=np.int64)
+        for code, action in enumerate(ACTION_CODES):
+            codes[actions == action] = code
+        return codes
+
+    def reset(self, mask=None):
+        """Resets the given boards (all of them by default) and returns the observations"""
+        self.reset_boards(np.ones(self.__count, dtype=bool) if mask is None else mask)
+        return self.observe()
+
+    def reset_boards(self, mask):
+        self.__boards[mask] = EMPTY_BLOCK
+        self.__movements[mask] = 0
+        self.__bag_positions[mask] = 0
+        self.__scores[mask] = 0
+        self.spawn(mask)
+
+    def spawn(self, mask):
+        """Brings the next piece of the bag on the given boards, the empty bags are shuffled again"""
+        board_indexes = np.flatnonzero(mask)
+        bag_positions = self.__bag_positions[board_indexes] % len(self.__piece_indexes)
+        new_bags = board_indexes[bag_positions == 0]
+        if len(new_bags):
+            self.__bags[new_bags] = self.__random.permuted(self.__bags[new_bags], axis=1)
+        self.__current_pieces[board_indexes, PIECE_INDEX] = self.__bags[board_indexes, bag_positions]
+        self.__current_pieces[mask, PIECE_ROTATION] = 0
+        self.__current_pieces[mask, PIECE_ROW] = self.__spawn_position[0]
+        self.__current_pieces[mask, PIECE_COLUMN] = self.__spawn_position[1]
+        self.__bag_positions[board_indexes] = bag_positions + 1
+
+    def get_cells(self, pieces):
+        """Returns the (row, column) cells of every piece, as an array of shape (count, 4, 2)"""
+        offsets = self.__offsets[pieces[:, PIECE_INDEX], pieces[:, PIECE_ROTATION] // 90]
+        return offsets + pieces[:, None, PIECE_ROW:PIECE_COLUMN + 1]
+
+    def entering_in_collision(self, boards, pieces):
+        """Checks, for every board, if its piece goes out of the board or overlaps a locked block"""
+        cells = self.get_cells(pieces)
+        rows = cells[..., 0]
+        columns = cells[..., 1]
+        outside = (rows >= self.__height) | (rows < 0) | (columns >= self.__width) | (columns < 0)
+        board_indexes = np.arange(len(boards))[:, None]
+        occupied = boards[board_indexes, np.clip(rows, 0, self.__height - 1),
+                          np.clip(columns, 0, self.__width - 1)] != EMPTY_BLOCK
+        return np.any(outside | occupied, axis=1)
+
+    def observe(self):
+        """Returns the boards with the current pieces drawn on them"""
+        observations = self.__boards.copy()
+        cells = self.get_cells(self.__current_pieces)
+        board_indexes = np.repeat(np.arange(self.__count), 4)
+        observations[board_indexes, cells[..., 0].ravel(), cells[..., 1].ravel()] = \
+            np.repeat(self.__current_pieces[:, PIECE_INDEX], 4)
+        return observations
+
+    def compute_rewards(self, boards, pieces):
+        """Rewards of TetrisEnvironment.compute_rewards for pieces that landed on the given boards"""
+        cells = self.get_cells(pieces)
+        board_indexes = np.arange(len(boards))[:, None]
+        boards_with_pieces = boards.copy()
+        boards_with_pieces[board_indexes, cells[..., 0], cells[..., 1]] = pieces[:, None, PIECE_INDEX]
+
+        before = extract_features(boards)
+        after = extract_features(boards_with_pieces)
+        piece_height = np.floor(np.sum(cells[..., 0] - self.__height, axis=1) * self.__reward_piece_height)
+        return after.full_lines * self.__reward_clear_line + piece_height \
+            + (after.holes - before.holes) * self.__reward_new_holes \
+            + (after.bumpiness - before.bumpiness) * self.__reward_bumpiness
+
+    def lock_pieces(self, mask):
+        """Locks the current pieces of the given boards and clears their full lines"""
+        board_indexes = np.flatnonzero(mask)
+        pieces = self.__current_pieces[board_indexes]
+        cells = self.get_cells(pieces)
+        self.__boards[board_indexes[:, None], cells[..., 0], cells[..., 1]] = pieces[:, None, PIECE_INDEX]
+
+        boards = self.__boards[board_indexes]
+        full = np.all(boards != EMPTY_BLOCK, axis=2)
+        cleared = full.any(axis=1)
+        if cleared.any():
+            boards = boards[cleared]
+            full = full[cleared]
+            # Full rows go to the top (then emptied), the other rows keep their order at the bottom
+            order = np.argsort(~full, axis=1, kind='stable')
+            boards = np.take_along_axis(boards, order[:, :, None], axis=1)
+            boards[np.arange(self.__height)[None, :] < full.sum(axis=1)[:, None]] = EMPTY_BLOCK
+            self.__boards[board_indexes[cleared]] = boards
+
+    def step(self, actions):
+        """Does one action on every board, returns (observations, rewards, dones) and resets the finished boards"""
+        actions = self.to_action_codes(actions)
+        pieces = self.__current_pieces
+        moved = pieces.copy()
+        moved[:, PIECE_COLUMN] += (actions == RIGHT_CODE).astype(np.int64) - (actions == LEFT_CODE)
+        rotating = actions == ROTATE_CODE
+        moved[rotating, PIECE_ROTATION] = self.__next_rotation[pieces[rotating, PIECE_INDEX],
+                                                               pieces[rotating, PIECE_ROTATION] // 90]
+        possible = ~self.entering_in_collision(self.__boards, moved)
+        pieces[possible] = moved[possible]
+
+        below = pieces.copy()
+        below[:, PIECE_ROW] += 1
+        landed = self.entering_in_collision(self.__boards, below)
+
+        rewards = np.zeros(self.__count, dtype=np.float64)
+        rewards[landed] = self.compute_rewards(self.__boards[landed], pieces[landed])
+        self.__scores += rewards
+
+        # The pieces that did not land fall one row every MOVEMENTS_PER_ROW actions
+        self.__movements[~landed] += 1
+        falling = self.__movements >= MOVEMENTS_PER_ROW
+        pieces[falling, PIECE_ROW] += 1
+        self.__movements[falling] = 0
+
+        dones = np.zeros(self.__count, dtype=bool)
+        if landed.any():
+            self.lock_pieces(landed)
+            self.__movements[landed] = 0
+            self.spawn(landed)
+            dones[landed] = self.entering_in_collision(self.__boards[landed], pieces[landed])
+            self.__final_scores[dones] = self.__scores[dones]
+            if dones.any():
+                self.reset_boards(dones)
+
+        return self.observe(), rewards, dones
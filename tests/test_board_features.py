@@ -0,0 +1,44 @@
+import random
+
+import numpy as np
+
+from src.reinforcement.bitboard import BitBoard
+from src.reinforcement.board_features import extract_features, rows_to_filled
+
+LINE_COUNT = 20
+COLUMN_COUNT = 10
+BOARD_COUNT = 200
+
+
+def random_board(generator):
+    """Fills random cells of a board in groups of 4 (like pieces), with the full lines cleared from time to time"""
+    board = BitBoard(LINE_COUNT, COLUMN_COUNT)
+    for _ in range(generator.randrange(40)):
+        empty = [(x, y) for x in range(LINE_COUNT // 3, LINE_COUNT) for y in range(COLUMN_COUNT)
+                 if not board.rows[x] >> y & 1]
+        board.place(generator.sample(empty, min(4, len(empty))), 1)
+        if generator.random() < 0.3:
+            board.clear_lines()
+    return board
+
+
+def test_features_match_the_bitboard():
+    generator = random.Random(0)
+    boards = [random_board(generator) for _ in range(BOARD_COUNT)]
+    for board in boards:
+        features = extract_features(rows_to_filled(board.rows, COLUMN_COUNT))
+        assert features.heights.tolist() == board.heights
+        assert features.aggregate_height == sum(board.heights)
+        assert features.holes == board.holes_count
+        assert features.bumpiness == board.bumpiness
+        assert features.full_lines == board.rows.count(board.full_row)
+
+
+def test_batch_matches_single_boards():
+    generator = random.Random(1)
+    rows = [random_board(generator).rows for _ in range(BOARD_COUNT)]
+    batch = extract_features(rows_to_filled(rows, COLUMN_COUNT))
+    for index, board_rows in enumerate(rows):
+        single = extract_features(rows_to_filled(board_rows, COLUMN_COUNT))
+        for name, value in single._asdict().items():
+            assert np.array_equal(getattr(batch, name)[index], value), name
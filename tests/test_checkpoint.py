@@ -0,0 +1,92 @@
+import shutil
+
+from src.game.tetrominos.tetrominos_factory import TetrominosFactory
+from src.reinforcement.agent import Agent, PLACEMENT_MODE
+from src.reinforcement.checkpoint import DELTAS_SUFFIX, write_atomically
+from src.reinforcement.environment import TetrisEnvironment
+
+LINE_COUNT = 20
+COLUMN_COUNT = 10
+
+
+def create_agent(**parameters):
+    environment = TetrisEnvironment(LINE_COUNT, COLUMN_COUNT, TetrominosFactory.create_tetrominos(), seed=1)
+    return Agent(environment, alpha=0.5, gamma=0.9, exploration=0.1, seed=1, **parameters)
+
+
+def play(agent, episodes):
+    for _ in range(episodes):
+        while not agent.is_over:
+            agent.step()
+        agent.reset()
+
+
+def table_contents(store):
+    return {state: values.tolist() for state, values in store.items()}
+
+
+def assert_same_tables(agent, loaded):
+    assert loaded.history == agent.history
+    for qtable, loaded_qtable in zip(agent.qtables + [agent.afterstate_values],
+                                     loaded.qtables + [loaded.afterstate_values]):
+        assert table_contents(loaded_qtable) == table_contents(qtable)
+
+
+def test_base_and_deltas_load_the_saved_tables(tmp_path):
+    filename = str(tmp_path / 'checkpoint')
+    agent = create_agent()
+    for _ in range(4):
+        play(agent, 3)
+        agent.save(filename, wait=True)
+    agent.close_checkpoint()
+    assert (tmp_path / ('checkpoint' + DELTAS_SUFFIX)).exists()
+
+    loaded = create_agent()
+    assert loaded.load(filename)
+    assert_same_tables(agent, loaded)
+
+
+def test_deltas_replay_the_evictions(tmp_path):
+    filename = str(tmp_path / 'checkpoint')
+    agent = create_agent(max_states=200, mode=PLACEMENT_MODE)
+    for _ in range(4):
+        play(agent, 2)
+        agent.save(filename, wait=True)
+    agent.close_checkpoint()
+    assert agent.eviction_stats['evictions'] > 0
+
+    loaded = create_agent(max_states=200, mode=PLACEMENT_MODE)
+    assert loaded.load(filename)
+    assert_same_tables(agent, loaded)
+
+
+def test_deltas_of_a_previous_base_are_skipped(tmp_path):
+    filename = str(tmp_path / 'checkpoint')
+    stale_deltas = str(tmp_path / 'stale')
+    agent = create_agent()
+    play(agent, 5)
+    agent.save(filename, wait=True)
+    play(agent, 5)
+    agent.save(filename, wait=True)
+    shutil.copy(filename + DELTAS_SUFFIX, stale_deltas)
+    agent.close_checkpoint()
+
+    # A new writer starts with a new base, as if the writing stopped before the old deltas were removed
+    play(agent, 10)
+    agent.save(filename, wait=True)
+    agent.close_checkpoint()
+    shutil.copy(stale_deltas, filename + DELTAS_SUFFIX)
+
+    loaded = create_agent()
+    assert loaded.load(filename)
+    assert len(loaded.history) == 20
+    assert_same_tables(agent, loaded)
+
+
+def test_a_neural_checkpoint_is_not_loaded(tmp_path):
+    filename = str(tmp_path / 'neural')
+    write_atomically(filename, {'network': None, 'history': []})
+    agent = create_agent()
+    assert not agent.load(filename)
+    assert all(len(qtable) == 0 for qtable in agent.qtables)
+
@@ -0,0 +1,49 @@
+import random
+
+from src.game.tetrominos.shape import ActivePiece
+from src.game.tetrominos.tetrominos_factory import TetrominosFactory
+from src.reinforcement.environment import TetrisEnvironment
+
+LINE_COUNT = 20
+COLUMN_COUNT = 10
+BOARD_COUNT = 10
+
+
+def fill_randomly(environment, generator):
+    """Fills random cells of the lower rows, which leaves holes and overhangs"""
+    board = environment.bitboard
+    top = generator.randrange(LINE_COUNT // 4, LINE_COUNT)
+    cells = [(x, y) for x in range(top, LINE_COUNT) for y in range(COLUMN_COUNT) if generator.random() < 0.45]
+    board.place(cells, 1)
+
+
+def fall_step_by_step(environment, piece):
+    while not environment.entering_in_collision(piece, True, False, False):
+        environment.move_down(piece)
+    return piece.row
+
+
+def test_landing_row_matches_falling_row_by_row():
+    generator = random.Random(0)
+    environment = TetrisEnvironment(LINE_COUNT, COLUMN_COUNT, TetrominosFactory.create_tetrominos(), seed=0)
+    shapes = environment.shapes
+    checked = 0
+    for _ in range(BOARD_COUNT):
+        environment.reset(LINE_COUNT, COLUMN_COUNT)
+        fill_randomly(environment, generator)
+        board = environment.bitboard
+        for index in shapes.indexes:
+            for shape in shapes.get_rotations(index):
+                for col in range(-shape.min_dy, COLUMN_COUNT - shape.max_dy):
+                    # Every free start row, including the ones under an overhang
+                    for row in range(-shape.min_dx, LINE_COUNT - shape.max_dx):
+                        if board.collides_shape(shape, row, col):
+                            continue
+                        expected = fall_step_by_step(environment, ActivePiece(shape, row, col))
+                        assert environment.get_landing_row(shape, row, col) == expected, (shape, row, col)
+
+                        piece = ActivePiece(shape, row, col)
+                        assert environment.drop(piece) == expected - row
+                        assert piece.row == expected
+                        checked += 1
+    assert checked > 0
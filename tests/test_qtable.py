@@ -0,0 +1,75 @@
+import pickle
+
+import numpy as np
+
+from src.reinforcement.qtable import QTableStore, EVICTION_TARGET
+
+ACTION_COUNT = 4
+
+
+def random_store(count, seed=0):
+    generator = np.random.default_rng(seed)
+    keys = generator.choice(1 << 40, count, replace=False).tolist()
+    return keys, generator.standard_normal((count, ACTION_COUNT)).astype(np.float32)
+
+
+def test_from_arrays_keeps_every_state():
+    keys, values = random_store(3000)
+    store = QTableStore.from_arrays(keys, values)
+    assert len(store) == len(keys)
+    for key, key_values in zip(keys, values):
+        assert np.array_equal(store.get_values(key), key_values)
+    # New states get the rows after the loaded ones, even past the initial capacity
+    state_id = store.get_id(-1)
+    assert state_id == len(keys)
+    assert np.array_equal(store.get_row(state_id), [0.0] * ACTION_COUNT)
+
+
+def test_copy_is_independent():
+    keys, values = random_store(100)
+    store = QTableStore.from_arrays(keys, values)
+    copy = store.copy()
+    store.set_value(store.find_id(keys[0]), 0, 42.0)
+    store.get_id(-1)
+    assert copy.get_values(keys[0])[0] == values[0, 0]
+    assert -1 not in copy
+    assert copy.changed_count == 0
+    assert dict((key, row.tolist()) for key, row in copy.items()) == \
+        dict((key, row.tolist()) for key, row in zip(keys, values))
+
+
+def test_pickle_round_trip():
+    keys, values = random_store(100)
+    store = pickle.loads(pickle.dumps(QTableStore.from_arrays(keys, values)))
+    assert all(np.array_equal(store.get_values(key), key_values) for key, key_values in zip(keys, values))
+
+
+def test_evict_renumbers_the_kept_states():
+    store = QTableStore(ACTION_COUNT, max_states=100)
+    generator = np.random.default_rng(1)
+    expected = {}
+    for state in range(130):
+        state_id = store.get_id(state)
+        # Every other state keeps zeros, they are evicted first
+        if state % 2:
+            values = generator.standard_normal(ACTION_COUNT).astype(np.float32)
+            for action_index, value in enumerate(values.tolist()):
+                store.set_value(state_id, action_index, value)
+            expected[state] = values
+    old_ids = {state: store.find_id(state) for state in range(130)}
+
+    new_ids = store.evict()
+    assert len(store) == int(100 * EVICTION_TARGET)
+    assert len(new_ids) == 130
+    assert sorted(store.pop_evictions()) == sorted(state for state in range(130) if state not in store)
+    for state, old_id in old_ids.items():
+        if state in store:
+            assert new_ids[old_id] == store.find_id(state)
+        else:
+            assert new_ids[old_id] == -1
+    # Only zero-valued states were evicted, the ids stay contiguous and keep their values
+    assert all(state in store for state in expected)
+    assert sorted(store.find_id(state) for state in range(130) if state in store) == list(range(len(store)))
+    for state, values in expected.items():
+        assert np.array_equal(store.get_values(state), values)
+    assert store.evict() is None
@@ -0,0 +1,59 @@
+import pytest
+
+from src.game.tetrominos.tetrominos_factory import TetrominosFactory
+from src.reinforcement.agent import Agent, MICRO_STEP_MODE, PLACEMENT_MODE
+from src.reinforcement.environment import TetrisEnvironment
+from src.reinforcement.replay import EpisodeRecorder, EpisodeReader, ReplayEngine
+
+LINE_COUNT = 20
+COLUMN_COUNT = 10
+EPISODE_COUNT = 3
+
+
+def create_environment(seed=None):
+    return TetrisEnvironment(LINE_COUNT, COLUMN_COUNT, TetrominosFactory.create_tetrominos(), seed=seed)
+
+
+def record(filename, mode, hard_drop=False):
+    """Trains an agent for a few episodes with a recorder attached, returns the scores and the lines cleared"""
+    agent = Agent(create_environment(seed=5), 0.5, 0.9, 0.3, mode=mode, seed=5, hard_drop=hard_drop)
+    recorder = EpisodeRecorder(filename, agent)
+    recorder.attach()
+    lines = []
+    for _ in range(EPISODE_COUNT):
+        while not agent.is_over:
+            agent.step()
+        lines.append(agent.environment.lines_cleared)
+        agent.reset()
+    recorder.close()
+    return list(agent.history), lines
+
+
+@pytest.mark.parametrize('mode, hard_drop', [(MICRO_STEP_MODE, False), (MICRO_STEP_MODE, True),
+                                             (PLACEMENT_MODE, False)])
+def test_replay_reproduces_the_scores(tmp_path, mode, hard_drop):
+    filename = tmp_path / 'episodes.bin'
+    scores, lines = record(str(filename), mode, hard_drop)
+    reader = EpisodeReader(str(filename))
+    assert len(reader) == EPISODE_COUNT
+    assert all(episode.hard_drop == hard_drop for episode in reader)
+
+    # The replay environment has no seed of its own, the pieces come from the recorded episode seeds
+    engine = ReplayEngine(create_environment())
+    results = []
+    for episode in reader:
+        results.append(engine.run(episode))
+        # Every recorded episode was played until the game over
+        assert engine.is_over
+    assert [score for score, _, _ in results] == scores
+    assert [lines_cleared for _, _, lines_cleared in results] == lines
+
+
+def test_seek_stops_after_the_given_piece(tmp_path):
+    filename = tmp_path / 'episodes.bin'
+    record(str(filename), PLACEMENT_MODE)
+    episode = EpisodeReader(str(filename))[0]
+    engine = ReplayEngine(create_environment())
+    environment = engine.seek(episode, 5)
+    assert engine.pieces == 5
+    assert environment.pieces_placed == 5
@@ -0,0 +1,83 @@
+import numpy as np
+import pytest
+
+from src.reinforcement.qtable import QTableStore
+from src.reinforcement.shared_qtable import SharedQTableStore, MAX_LOAD
+
+ACTION_COUNT = 4
+CAPACITY = 64
+
+
+@pytest.fixture
+def table():
+    table = SharedQTableStore(ACTION_COUNT, CAPACITY)
+    try:
+        yield table
+    finally:
+        table.close()
+
+
+def fill(table, count):
+    """Adds the states 0 to count - 1 with their own number as Q-values, returns their ids"""
+    state_ids = [table.get_id(state) for state in range(count)]
+    for state, state_id in enumerate(state_ids):
+        for action_index in range(ACTION_COUNT):
+            table.set_value(state_id, action_index, float(state))
+    return state_ids
+
+
+def test_get_id_refuses_new_states_when_full(table):
+    max_count = int(CAPACITY * MAX_LOAD)
+    state_ids = fill(table, max_count)
+    assert len(set(state_ids)) == max_count
+    assert -1 not in state_ids
+    assert len(table) == max_count
+
+    assert table.get_id(max_count) == -1
+    assert table.find_id(max_count) == -1
+    assert max_count not in table
+    assert len(table) == max_count
+    # The known states are still found and read
+    assert [table.get_id(state) for state in range(max_count)] == state_ids
+    assert table.get_row(state_ids[-1]) == [float(max_count - 1)] * ACTION_COUNT
+
+    table.set_values(max_count, np.ones(ACTION_COUNT, dtype=np.float32))
+    assert len(table) == max_count
+    assert np.array_equal(table.get_values(max_count), np.zeros(ACTION_COUNT))
+    table.set_values(0, np.ones(ACTION_COUNT, dtype=np.float32))
+    assert np.array_equal(table.get_values(0), np.ones(ACTION_COUNT))
+
+
+def test_capacity_is_rounded_to_a_power_of_two():
+    table = SharedQTableStore(ACTION_COUNT, CAPACITY - 10)
+    try:
+        assert table.capacity == CAPACITY
+    finally:
+        table.close()
+
+
+def test_load_and_to_store(table):
+    keys = list(range(100, 120))
+    values = np.arange(len(keys) * ACTION_COUNT, dtype=np.float32).reshape(len(keys), ACTION_COUNT)
+    table.load(QTableStore.from_arrays(keys, values))
+    store = table.to_store()
+    assert dict((key, row.tolist()) for key, row in store.items()) == \
+        dict((key, row.tolist()) for key, row in zip(keys, values))
+
+    too_many = list(range(int(CAPACITY * MAX_LOAD) + 1))
+    with pytest.raises(ValueError):
+        table.load(QTableStore.from_arrays(too_many, np.zeros((len(too_many), ACTION_COUNT), dtype=np.float32)))
+
+
+def test_attached_table_shares_the_values(table):
+    state_ids = fill(table, 10)
+    attached = SharedQTableStore(ACTION_COUNT, CAPACITY, name=table.name)
+    try:
+        assert len(attached) == 10
+        assert [attached.find_id(state) for state in range(10)] == state_ids
+        attached.set_value(state_ids[3], 0, -1.5)
+        assert table.get_value(state_ids[3], 0) == -1.5
+    finally:
+        attached.close()
+    # Closing an attached table does not free the memory of the owner
+    assert table.get_row(state_ids[3])[1] == 3.0
@@ -0,0 +1,72 @@
+import random
+
+import numpy as np
+
+from src.game.tetrominos.shape import ActivePiece
+from src.game.tetrominos.tetrominos_factory import TetrominosFactory
+from src.reinforcement.agent import LEFT, RIGHT, ROTATE, NONE
+from src.reinforcement.environment import TetrisEnvironment
+from src.reinforcement.vector_environment import VectorTetrisEnvironment, MOVEMENTS_PER_ROW
+
+LINE_COUNT = 20
+COLUMN_COUNT = 10
+BOARD_COUNT = 8
+STEP_COUNT = 3000
+# The bottom rows start full but for two columns on the side where the pieces go, so that they clear lines
+FILLED_ROWS = 2
+HOLES = ((4, 5), (0, 1), (8, 9))
+# Biased actions push the pieces towards the holes, and pile them up until the episodes end
+ACTION_CHOICES = ([LEFT, RIGHT, ROTATE, NONE, NONE], [LEFT, LEFT, ROTATE, NONE], [RIGHT, RIGHT, NONE])
+
+
+def spawn(environment, piece_index):
+    """Brings the piece the vector environment drew on the scalar environment"""
+    piece = ActivePiece(environment.shapes.get(piece_index, 0))
+    environment.place_piece_at_base_position(piece)
+    environment.set_current_piece(piece)
+    environment.place_piece_in_board(piece)
+
+
+def test_vector_environment_steps_like_the_scalar_environment():
+    pieces = TetrominosFactory.create_tetrominos()
+    vector = VectorTetrisEnvironment(BOARD_COUNT, LINE_COUNT, COLUMN_COUNT, pieces, seed=7)
+    environments = [TetrisEnvironment(LINE_COUNT, COLUMN_COUNT, pieces, seed=7) for _ in range(BOARD_COUNT)]
+    for index, environment in enumerate(environments):
+        environment.reset(LINE_COUNT, COLUMN_COUNT)
+        cells = [(row, col) for row in range(LINE_COUNT - FILLED_ROWS, LINE_COUNT) for col in range(COLUMN_COUNT)
+                 if col not in HOLES[index % len(HOLES)]]
+        environment.bitboard.place(cells, 1)
+        for row, col in cells:
+            vector.boards[index, row, col] = 1
+        spawn(environment, int(vector.current_pieces[index, 0]))
+    movements = [0] * BOARD_COUNT
+    generator = random.Random(7)
+    lines = episodes = 0
+
+    for step in range(STEP_COUNT):
+        actions = [generator.choice(ACTION_CHOICES[index % len(ACTION_CHOICES)]) for index in range(BOARD_COUNT)]
+        observations, rewards, dones = vector.step(np.array(actions))
+        for index, environment in enumerate(environments):
+            piece, reward = environment.do(actions[index])
+            environment.set_current_piece(piece)
+            assert reward == rewards[index], (step, index)
+            if environment.entering_in_collision(piece, True, False, False):
+                environment.lock_piece(piece)
+                lines += environment.clear_lines()
+                movements[index] = 0
+                if dones[index]:
+                    episodes += 1
+                    environment.reset(LINE_COUNT, COLUMN_COUNT)
+                spawn(environment, int(vector.current_pieces[index, 0]))
+                assert not environment.entering_in_collision(environment.get_current_piece(), False, False, False)
+            else:
+                assert not dones[index], (step, index)
+                movements[index] += 1
+                if movements[index] == MOVEMENTS_PER_ROW:
+                    movements[index] = 0
+                    environment.move_down(piece)
+            assert (np.array(environment.board) == observations[index]).all(), (step, index)
+
+    # The comparison covered line clears and finished episodes
+    assert lines > 0
+    assert episodes > 0